@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Keyword Index Benchmark
+Builds the BM25 keyword index the way the collector does (fargate/keyword_index)
+and queries it the way the chat handler does (lambda/chat-handler/keyword_index):
+build time, peak memory, index size, cold open and per-query latency.
+
+Corpus (one of):
+  --bucket NAME       every bills/ and newspapers/ document in the data bucket (the full corpus)
+  --corpus-dir DIR    every .txt file under a local directory
+  --synthetic N       N generated documents, bills and OCR-noisy newspaper pages
+  --index PATH        skip the build and benchmark an existing index file
+
+Usage: python benchmark_keyword_index.py --bucket my-data-bucket [--queries queries.txt] [--iterations 20]
+"""
+
+import argparse
+import importlib.util
+import itertools
+import os
+import random
+import resource
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'lambda', 'shared', 'python'))
+
+
+def load_module(name: str, path: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+builder = load_module('keyword_index_builder', os.path.join(HERE, 'fargate', 'keyword_index.py'))
+reader = load_module('keyword_index_reader', os.path.join(HERE, 'lambda', 'chat-handler', 'keyword_index.py'))
+
+DEFAULT_QUERIES = [
+    'Alien and Sedition Acts',
+    '"Matthew Lyon"',
+    'Matthew Lyon sedition trial Vermont',
+    'yellow fever Philadelphia',
+    'Louisiana purchase treaty',
+    'embargo act shipping merchants',
+    '"United States"',
+    'tariff on imported iron',
+    'Jay treaty Great Britain',
+    'Whiskey Rebellion Pennsylvania excise',
+    'runaway slave reward',
+    'Hamilton Burr duel',
+]
+
+WORDS = """
+congress senate house representatives bill act resolution committee amendment treaty tariff duty
+duties tax excise militia navy army war peace president governor state states united citizens
+law laws court judge trial jury sedition alien naturalization commerce trade merchants shipping
+vessel vessels port harbor cargo embargo france britain spain england french british spanish
+indian indians lands territory purchase louisiana ohio kentucky tennessee virginia massachusetts
+york pennsylvania philadelphia boston charleston baltimore gazette advertiser printer printed
+published week weekly price sale sold goods store street office notice reward subscriber
+election vote votes federalist republican party newspaper editor letter correspondent extract
+""".split()
+
+
+def synthetic_corpus(documents: int, seed: int = 1):
+    """
+    (key, text, metadata) documents: Zipf-distributed words, with ~5% OCR-garbled
+    tokens on newspaper pages (the corpus' vocabulary is mostly such noise)
+    """
+    rng = random.Random(seed)
+    # The real words spread over the first ranks of a 50,000-word vocabulary
+    vocabulary = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))) for _ in range(50000)]
+    for word, rank in zip(WORDS, rng.sample(range(20, 5000), len(WORDS))):
+        vocabulary[rank] = word
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    for doc_id in range(documents):
+        bill = doc_id % 10 == 0
+        words = rng.choices(vocabulary, cum_weights=weights, k=rng.randint(1500, 3000) if bill else rng.randint(2500, 6000))
+        if not bill:
+            for position in range(0, len(words), 20):
+                word = list(words[position])
+                word[rng.randrange(len(word))] = rng.choice(string.ascii_lowercase)
+                words[position] = ''.join(word)
+        if doc_id % 97 == 0:
+            words[100:100] = ['matthew', 'lyon']
+        if doc_id % 5 == 0:
+            words[200:200] = ['united', 'states']
+        key = (f"bills/congress_{1 + doc_id % 16}/hr_{doc_id}.txt" if bill
+               else f"newspapers/batch-1/newspaper_{doc_id}.txt")
+        metadata = ({'entity_type': 'bill', 'year': str(1789 + doc_id % 32)} if bill
+                    else {'entity_type': 'newspaper', 'year': str(1770 + doc_id % 41)})
+        yield key, ' '.join(words), metadata
+
+
+def local_corpus(directory: str):
+    for root, _, files in sorted(os.walk(directory)):
+        for name in sorted(files):
+            if name.endswith('.txt'):
+                path = os.path.join(root, name)
+                with open(path, encoding='utf-8', errors='replace') as f:
+                    yield os.path.relpath(path, directory), f.read(), {}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build(args, work_dir: str) -> tuple:
+    path = os.path.join(work_dir, 'keyword_index.bin')
+    if args.bucket:
+        # The collector's build: parallel S3 reads, no upload
+        import boto3
+        stats = builder.build_index_file(boto3.client('s3'), args.bucket, path, work_dir=work_dir)
+        return path, stats
+
+    started = time.perf_counter()
+    index_builder = builder.KeywordIndexBuilder(path, work_dir=work_dir,
+                                                segment_bytes=args.segment_mb * 1024 * 1024)
+    corpus = local_corpus(args.corpus_dir) if args.corpus_dir else synthetic_corpus(args.synthetic)
+    text_bytes = 0
+    for key, text, metadata in corpus:
+        text_bytes += len(text)
+        index_builder.add(key, text, metadata)
+    stats = index_builder.finish()
+    stats['text_bytes'] = text_bytes
+    stats['build_seconds'] = round(time.perf_counter() - started, 1)
+    return path, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--bucket')
+    source.add_argument('--corpus-dir')
+    source.add_argument('--synthetic', type=int)
+    source.add_argument('--index')
+    parser.add_argument('--segment-mb', type=int, default=builder.KEYWORD_INDEX_SEGMENT_MB)
+    parser.add_argument('--queries', help='file with one query per line')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='keyword-index-benchmark-')
+    path = args.index
+    if not path:
+        path, stats = build(args, work_dir)
+        print(f"Build: {stats['build_seconds']}s, peak RSS {peak_rss_mb():.0f}MB")
+        for name, value in stats.items():
+            print(f"  {name}: {value}")
+
+    started = time.perf_counter()
+    index = reader.KeywordIndex(path)
+    open_ms = (time.perf_counter() - started) * 1000
+    print(f"\nIndex: {index.documents} documents, {index.terms} terms, {index.size / (1024 * 1024):.1f}MB, "
+          f"{index.size / max(1, index.total_tokens):.2f} bytes per indexed token, opened in {open_ms:.1f}ms")
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    print(f"\n{'query':<40} {'hits':>5} {'first ms':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    all_timings = []
+    for query in queries:
+        timings = []
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            hits = index.search(query, args.limit)
+            timings.append((time.perf_counter() - started) * 1000)
+        all_timings.extend(timings[1:] or timings)
+        ordered = sorted(timings)
+        print(f"{query[:40]:<40} {len(hits):>5} {timings[0]:>9.1f} {statistics.median(ordered):>8.1f} "
+              f"{ordered[int(0.95 * (len(ordered) - 1))]:>8.1f}")
+
+    ordered = sorted(all_timings)
+    print(f"\nAll queries: p50 {statistics.median(ordered):.1f}ms, p95 {ordered[int(0.95 * (len(ordered) - 1))]:.1f}ms, "
+          f"max {ordered[-1]:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Logging Overhead Benchmark
+Compares the chat handler's old print/json.dumps(indent=2) logging with the
+structured logger on a synthetic retrieve_and_generate response
+
+Usage: python benchmark_logging.py [--citations 20] [--references 5] [--iterations 200]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'lambda', 'shared', 'python'))
+
+from structured_log import StructuredLogger  # noqa: E402
+
+
+def build_response(citations: int, references: int) -> dict:
+    """
+    A retrieve_and_generate response shaped like the Knowledge Base's
+    """
+    reference = {
+        'content': {'text': 'In the House of Representatives, a bill to regulate the collection of duties ' * 20},
+        'location': {'type': 'S3', 's3Location': {'uri': 's3://bucket/bills/congress_6/hr_1.txt'}},
+        'metadata': {'congress': '6', 'bill_type': 'HR', 'bill_number': '1', 'title': 'An Act'},
+    }
+    return {
+        'output': {'text': 'The answer. ' * 200},
+        'citations': [
+            {
+                'generatedResponsePart': {'textResponsePart': {'text': 'Part of the answer. ' * 10}},
+                'retrievedReferences': [reference] * references,
+            }
+            for _ in range(citations)
+        ],
+    }
+
+
+def build_event() -> dict:
+    return {
+        'httpMethod': 'POST',
+        'headers': {f'Header-{i}': 'x' * 40 for i in range(20)},
+        'requestContext': {'requestId': 'abc', 'identity': {'sourceIp': '1.2.3.4'}},
+        'body': json.dumps({'message': 'What did HR 1 in the 6th Congress do?', 'persona': 'general'}),
+    }
+
+
+def log_legacy(event: dict, response: dict):
+    """
+    What the chat handler printed per retrieve_and_generate request before
+    """
+    print(f"Event: {json.dumps(event)}")
+    print(f"Raw Knowledge Base response: {json.dumps(response, indent=2, default=str)}")
+    for i, citation in enumerate(response['citations']):
+        print(f"Citation {i}: {json.dumps(citation, indent=2, default=str)}")
+        for j, reference in enumerate(citation['retrievedReferences']):
+            print(f"  Reference {j}: {json.dumps(reference, indent=2, default=str)}")
+    print(f"Extracted answer: {response['output']['text']}")
+
+
+def log_structured(log: StructuredLogger, event: dict, response: dict):
+    """
+    What the chat handler logs now
+    """
+    log.debug("Event", event=event)
+    log.info("Chat request", question='What did HR 1 in the 6th Congress do?', language='en', persona='general')
+    log.debug("Raw Knowledge Base response", response=response)
+    for citation in response['citations']:
+        log.debug("Citation", citation=citation)
+    log.info("Knowledge Base returned answer", sources=len(response['citations']), entities=0)
+
+
+def measure(function, iterations: int) -> tuple:
+    """
+    Mean milliseconds per call and bytes written per call, with stdout captured
+    """
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            function()
+        elapsed = time.perf_counter() - started
+    return elapsed * 1000 / iterations, len(buffer.getvalue()) // iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark chat handler logging overhead')
+    parser.add_argument('--citations', type=int, default=20)
+    parser.add_argument('--references', type=int, default=5)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    event = build_event()
+    response = build_response(args.citations, args.references)
+    info_logger = StructuredLogger('benchmark', level='INFO', debug_sample_rate=0)
+    debug_logger = StructuredLogger('benchmark', level='DEBUG')
+    sampled_logger = StructuredLogger('benchmark', level='INFO', debug_sample_rate=0.01)
+
+    def sampled():
+        sampled_logger.bind(request_id='benchmark')
+        log_structured(sampled_logger, event, response)
+
+    cases = [
+        ('legacy print + json.dumps(indent=2)', lambda: log_legacy(event, response)),
+        ('structured, LOG_LEVEL=INFO', lambda: log_structured(info_logger, event, response)),
+        ('structured, INFO + 1% DEBUG sampling', sampled),
+        ('structured, LOG_LEVEL=DEBUG (truncated)', lambda: log_structured(debug_logger, event, response)),
+    ]
+
+    print(f"{args.citations} citations x {args.references} references, {args.iterations} iterations\n")
+    print(f"{'case':<42} {'ms/request':>10} {'bytes/request':>14}")
+    for name, function in cases:
+        ms, size = measure(function, args.iterations)
+        print(f"{name:<42} {ms:>10.3f} {size:>14,}")
+
+
+if __name__ == '__main__':
+    main()
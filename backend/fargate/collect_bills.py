@@ -8,6 +8,7 @@ Fetches data from:
 
 import os
 import sys
+import gzip
 import json
 import time
 import boto3
@@ -16,6 +17,8 @@ from datetime import datetime
 from typing import List, Dict, Any
 from datasets import load_dataset
 
+from keyword_index import build_keyword_index
+
 # Configuration
 CONGRESS_API_KEY = os.environ.get('CONGRESS_API_KEY', 'MThtRT5WkFu8I8CHOfiLLebG4nsnKcX3JnNv2N8A')
 BUCKET_NAME = os.environ.get('BUCKET_NAME')
@@ -29,6 +32,19 @@ BILL_TYPES = os.environ.get('BILL_TYPES', 'hr,s,hjres,sjres,hconres,sconres,hres
 HUGGINGFACE_DATASET = os.environ.get('HUGGINGFACE_DATASET', 'RevolutionCrossroads/loc_chronicling_america_1770-1810')
 MAX_NEWSPAPER_PAGES = int(os.environ.get('MAX_NEWSPAPER_PAGES', '0'))  # 0 = process ALL newspapers, or set a limit
 
+# Write Bedrock-native <key>.metadata.json sidecars next to every document so the
+# Knowledge Base picks up filterable metadata without the transformation Lambda
+WRITE_METADATA_SIDECARS = os.environ.get('WRITE_METADATA_SIDECARS', 'true').lower() == 'true'
+
+# Compact document-metadata index (S3 key -> public URL, title, date, type), gzipped JSON
+# the chat handler loads once per container to cite documents without per-source S3 calls
+DOCUMENT_INDEX_KEY = os.environ.get('DOCUMENT_INDEX_KEY', 'indexes/document_metadata.json.gz')
+DOCUMENT_INDEX_FIELDS = ['url', 'title', 'date', 'type']
+
+# BM25 positional inverted index over every document (see keyword_index), memory-mapped
+# by the chat handler for keyword and hybrid retrieval; '' disables it
+KEYWORD_INDEX_KEY = os.environ.get('KEYWORD_INDEX_KEY', 'indexes/keyword_index.bin')
+
 # AWS clients
 s3 = boto3.client('s3')
 textract = boto3.client('textract')
@@ -42,6 +58,7 @@ class DataCollector:
         self.errors = []
         self.congress_stats = {'total': 0, 'successful': 0, 'failed': 0, 'skipped': 0}
         self.newspaper_stats = {'total': 0, 'successful': 0, 'failed': 0, 'skipped': 0}
+        self.document_index = {}
     
     def log(self, message):
         """Log with timestamp"""
@@ -57,6 +74,146 @@ class DataCollector:
         except:
             return False
     
+    def save_metadata_sidecar(self, key: str, s3_metadata: Dict[str, str]) -> bool:
+        """
+        Write a Bedrock Knowledge Base metadata sidecar (<key>.metadata.json)
+        Uses the same unified schema as the S3 object metadata so every chunk of the
+        document carries the filterable fields directly at ingestion time
+        """
+        if not WRITE_METADATA_SIDECARS:
+            return False
+        
+        try:
+            sidecar = {'metadataAttributes': dict(s3_metadata)}
+            s3.put_object(
+                Bucket=BUCKET_NAME,
+                Key=f"{key}.metadata.json",
+                Body=json.dumps(sidecar).encode('utf-8'),
+                ContentType='application/json'
+            )
+            return True
+        except Exception as e:
+            self.log(f"  ⚠️  Could not write metadata sidecar for {key}: {e}")
+            return False
+    
+    def ensure_metadata_sidecar(self, key: str) -> bool:
+        """
+        Backfill the metadata sidecar for a document collected before sidecars existed
+        Copies the unified schema from the object's S3 metadata
+        """
+        if not WRITE_METADATA_SIDECARS or self.file_exists_in_s3(f"{key}.metadata.json"):
+            return False
+        
+        try:
+            response = s3.head_object(Bucket=BUCKET_NAME, Key=key)
+            s3_metadata = response.get('Metadata', {})
+            if not s3_metadata:
+                return False
+            if self.save_metadata_sidecar(key, s3_metadata):
+                self.log(f"  ✓ Backfilled metadata sidecar: {key}.metadata.json")
+                return True
+            return False
+        except Exception as e:
+            self.log(f"  ⚠️  Could not backfill metadata sidecar for {key}: {e}")
+            return False
+    
+    def load_document_index(self):
+        """
+        Start from the previous run's document index so skipped documents need no head_object
+        """
+        if not DOCUMENT_INDEX_KEY:
+            return
+        
+        try:
+            response = s3.get_object(Bucket=BUCKET_NAME, Key=DOCUMENT_INDEX_KEY)
+            index = json.loads(gzip.decompress(response['Body'].read()))
+            if index.get('fields') == DOCUMENT_INDEX_FIELDS:
+                self.document_index = index.get('documents', {})
+            self.log(f"✓ Loaded document index: {len(self.document_index)} documents")
+        except Exception as e:
+            self.log(f"ℹ️  No previous document index ({e}), building from scratch")
+    
+    def index_document(self, key: str, s3_metadata: Dict[str, str]):
+        """
+        Add a document to the index from its unified S3 metadata
+        """
+        if s3_metadata.get('entity_type') == 'bill':
+            title = s3_metadata.get('bill_title') or f"{s3_metadata.get('bill_type', '')} {s3_metadata.get('bill_number', '')}".strip()
+            self.document_index[key] = [
+                s3_metadata.get('bill_url', ''),
+                title,
+                s3_metadata.get('introduced_date') or s3_metadata.get('year', ''),
+                'bill'
+            ]
+        else:
+            self.document_index[key] = [
+                s3_metadata.get('pdf_url', ''),
+                s3_metadata.get('newspaper_title', ''),
+                s3_metadata.get('issue_date') or s3_metadata.get('year', ''),
+                s3_metadata.get('entity_type', 'newspaper')
+            ]
+    
+    def index_existing_document(self, key: str):
+        """
+        Index a skipped document, reading its S3 metadata only when the previous index lacks it
+        """
+        if not DOCUMENT_INDEX_KEY or key in self.document_index:
+            return
+        
+        try:
+            response = s3.head_object(Bucket=BUCKET_NAME, Key=key)
+            if response.get('Metadata'):
+                self.index_document(key, response['Metadata'])
+        except Exception as e:
+            self.log(f"  ⚠️  Could not index {key}: {e}")
+    
+    def save_document_index(self) -> bool:
+        """
+        Write the document index: {"fields": [...], "documents": {key: [url, title, date, type]}}
+        """
+        if not DOCUMENT_INDEX_KEY:
+            return False
+        
+        try:
+            index = {
+                'fields': DOCUMENT_INDEX_FIELDS,
+                'generated_at': datetime.now().isoformat(),
+                'documents': self.document_index
+            }
+            body = gzip.compress(json.dumps(index, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+            s3.put_object(
+                Bucket=BUCKET_NAME,
+                Key=DOCUMENT_INDEX_KEY,
+                Body=body,
+                ContentType='application/gzip'
+            )
+            self.log(f"✓ Document index saved: {len(self.document_index)} documents, "
+                     f"{len(body) / 1024:.0f}KB at s3://{BUCKET_NAME}/{DOCUMENT_INDEX_KEY}")
+            return True
+        except Exception as e:
+            self.log(f"⚠️  Failed to save document index: {e}")
+            return False
+    
+    def save_keyword_index(self, corpus_changed: bool) -> Dict[str, Any]:
+        """
+        Rebuild the keyword index over the whole corpus (skipped when nothing new was collected)
+        """
+        if not KEYWORD_INDEX_KEY:
+            return {}
+        if not corpus_changed and self.file_exists_in_s3(KEYWORD_INDEX_KEY):
+            self.log("ℹ️  No new documents, keeping the existing keyword index")
+            return {}
+        
+        try:
+            stats = build_keyword_index(s3, BUCKET_NAME, KEYWORD_INDEX_KEY, log=self.log)
+            self.log(f"✓ Saved keyword index: {stats['documents']} documents, {stats['terms']} terms, "
+                     f"{stats['size_bytes'] / (1024 * 1024):.1f}MB in {stats['build_seconds']}s "
+                     f"at s3://{BUCKET_NAME}/{KEYWORD_INDEX_KEY}")
+            return stats
+        except Exception as e:
+            self.log(f"⚠️  Failed to build keyword index: {e}")
+            return {}
+    
     def extract_text_with_textract(self, pdf_url: str, doc_id: str) -> str:
         """
         Extract text from PDF or image using Amazon Textract
@@ -468,7 +625,10 @@ BILL TEXT:
             )
             
             self.log(f"  ✓ Saved to S3: {key} ({size_mb:.2f}MB)")
+            self.index_document(key, s3_metadata)
             self.log(f"  ✓ Unified metadata: entity_type=bill, year={year}, congress={congress_num}")
+            if self.save_metadata_sidecar(key, s3_metadata):
+                self.log(f"  ✓ Metadata sidecar: {key}.metadata.json")
             self.log(f"  ✓ Document URL: {document_url}")
             return True
             
@@ -550,7 +710,9 @@ BILL TEXT:
             )
             
             self.log(f"  ✓ Saved to S3: {key} ({size_mb:.2f}MB)")
+            self.index_document(key, s3_metadata)
             self.log(f"  ✓ Unified metadata: entity_type=newspaper, year={year}, title={newspaper_title[:40]}")
+            self.save_metadata_sidecar(key, s3_metadata)
             return True
             
         except Exception as e:
@@ -597,6 +759,8 @@ BILL TEXT:
                 key = f"bills/congress_{congress_num}/{bill_type}_{bill_number}.txt"
                 if self.file_exists_in_s3(key):
                     self.log(f"  ⏭️  Already exists in S3, skipping")
+                    self.ensure_metadata_sidecar(key)
+                    self.index_existing_document(key)
                     self.congress_stats['skipped'] += 1
                     continue
                 
@@ -702,6 +866,8 @@ BILL TEXT:
                         key = f"newspapers/batch-{batch_num}/newspaper_{idx}_{safe_date}_{safe_title}.txt"
                         if self.file_exists_in_s3(key):
                             self.log(f"  ⏭️  Already exists in S3, skipping")
+                            self.ensure_metadata_sidecar(key)
+                            self.index_existing_document(key)
                             self.newspaper_stats['skipped'] += 1
                             continue
                         
@@ -748,6 +914,7 @@ BILL TEXT:
         self.log("="*60)
         
         start_time = time.time()
+        self.load_document_index()
         
         # Part 1: Collect Congress Bills
         self.log("\n" + "="*60)
@@ -802,6 +969,9 @@ BILL TEXT:
             if len(self.errors) > 10:
                 self.log(f"  ... and {len(self.errors) - 10} more")
         
+        self.save_document_index()
+        keyword_index_stats = self.save_keyword_index(total_successful > 0)
+        
         # Save summary to S3
         summary = {
             'congress_bills': self.congress_stats,
@@ -810,6 +980,8 @@ BILL TEXT:
             'total_successful': total_successful,
             'total_skipped': total_skipped,
             'total_failed': total_failed,
+            'indexed_documents': len(self.document_index),
+            'keyword_index': keyword_index_stats,
             'elapsed_seconds': elapsed_time,
             'config': {
                 'congress_range': f"{START_CONGRESS}-{END_CONGRESS}",
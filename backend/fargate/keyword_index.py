@@ -0,0 +1,320 @@
+"""
+Keyword (BM25) Index Builder
+Builds a positional inverted index over every collected document (bills/ and
+newspapers/), uploaded next to the document index for the chat handler to
+memory-map for keyword and hybrid retrieval. Exact names, rare OCR spellings
+and quoted phrases are what vector search misses; this index finds them.
+
+File layout (little-endian), read in place through mmap by the chat handler:
+
+    header      HEADER
+    postings    per term, per document: varint doc delta, varint tf,
+                varint byte length of the positions, varint position deltas
+    terms       TERM_ENTRY per term, sorted by UTF-8 bytes (binary search)
+    term bytes  the terms, concatenated
+    lengths     uint32 per document: indexed tokens (BM25 length normalization)
+    doc offsets uint32 per document + 1 into doc records
+    doc records per document: JSON [S3 key, *metadata values in FIELDS order]
+    info        JSON {"fields", "generated_at"}
+
+Stopwords are not indexed but still take a position, so phrase offsets stay exact.
+The build is segmented (sorted runs spilled to local disk, then merged) so memory
+stays bounded whatever the corpus size. Tokenization must match the chat
+handler's keyword_index.tokenize.
+"""
+
+import heapq
+import itertools
+import json
+import os
+import re
+import shutil
+import struct
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+KEYWORD_INDEX_MAGIC = b'CAKWIDX\x00'
+KEYWORD_INDEX_VERSION = 1
+# magic, version, documents, terms, indexed tokens, average length,
+# offsets of: postings, terms, term bytes, lengths, doc offsets, doc records, info
+HEADER = struct.Struct('<8sIIIQdQQQQQQQ')
+# term offset, term length, document frequency, postings offset, postings length
+TERM_ENTRY = struct.Struct('<IHIQI')
+# Spilled segment entry: term length, document frequency, last document, postings length
+SEGMENT_ENTRY = struct.Struct('<HIII')
+
+# Document metadata stored with each document (S3 object metadata, unified schema),
+# so keyword results carry the same filterable fields as Knowledge Base chunks
+KEYWORD_INDEX_FIELDS = ['entity_type', 'year', 'congress', 'bill_type', 'bill_number', 'bill_title',
+                        'introduced_date', 'bill_url', 'newspaper_title', 'issue_date',
+                        'place_of_publication', 'pdf_url']
+
+TOKEN_PATTERN = re.compile(r'\w+')
+# Longer tokens are OCR run-ons, not words
+MAX_TOKEN_CHARS = 32
+STOPWORDS = frozenset("""
+a an and are as at be but by for from had has have he her his i in is it its of on or
+our shall so that the their them they this to was were which with would ye you
+""".split())
+
+# Spill a sorted segment to disk once buffered postings reach this size
+KEYWORD_INDEX_SEGMENT_MB = int(os.environ.get('KEYWORD_INDEX_SEGMENT_MB', '256'))
+# Parallel S3 reads while building
+KEYWORD_INDEX_READ_WORKERS = int(os.environ.get('KEYWORD_INDEX_READ_WORKERS', '16'))
+# Rough per-term bookkeeping cost of the in-memory segment (dict entries, objects)
+TERM_OVERHEAD_BYTES = 200
+
+
+def tokenize(text: str) -> list:
+    """
+    (position, term) for each indexed token of a text
+    Lowercased, long s folded to s; stopwords and overlong tokens take a position
+    but are not returned.
+    """
+    tokens = TOKEN_PATTERN.findall(text.lower().replace('ſ', 's'))
+    return [(position, term) for position, term in enumerate(tokens)
+            if term not in STOPWORDS and len(term) <= MAX_TOKEN_CHARS]
+
+
+def encode_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, pos: int) -> tuple:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def read_segment(path: str):
+    """
+    (term bytes, df, last document, postings) entries of a spilled segment, in term order
+    """
+    with open(path, 'rb') as f:
+        while True:
+            head = f.read(SEGMENT_ENTRY.size)
+            if not head:
+                return
+            term_length, df, last_doc, size = SEGMENT_ENTRY.unpack(head)
+            yield f.read(term_length), df, last_doc, f.read(size)
+
+
+class KeywordIndexBuilder:
+    """
+    Add documents in order with add(), then finish() writes the index file
+    """
+
+    def __init__(self, path: str, work_dir: str = None, segment_bytes: int = KEYWORD_INDEX_SEGMENT_MB * 1024 * 1024):
+        self.path = path
+        self.work_dir = tempfile.mkdtemp(prefix='keyword-index-', dir=work_dir)
+        self.segment_bytes = segment_bytes
+        self.segments = []
+        self.doc_records = []
+        self.doc_lengths = []
+        self.total_tokens = 0
+        self._reset_segment()
+
+    def _reset_segment(self):
+        self.postings = {}   # term -> bytearray of encoded postings
+        self.last_doc = {}   # term -> last document added to its postings
+        self.doc_freq = {}   # term -> documents in this segment
+        self.buffered = 0
+
+    def add(self, key: str, text: str, metadata: dict = None) -> int:
+        """
+        Index a document; returns its document id
+        """
+        doc_id = len(self.doc_records)
+        positions = {}
+        for position, term in tokenize(text):
+            term_positions = positions.get(term)
+            if term_positions is None:
+                positions[term] = [position]
+            else:
+                term_positions.append(position)
+
+        length = 0
+        for term, term_positions in positions.items():
+            block = bytearray()
+            previous = 0
+            for position in term_positions:
+                encode_varint(position - previous, block)
+                previous = position
+            postings = self.postings.get(term)
+            if postings is None:
+                # A term's first entry in a segment holds the absolute document id
+                postings = self.postings[term] = bytearray()
+                self.doc_freq[term] = 0
+                self.buffered += TERM_OVERHEAD_BYTES
+                delta = doc_id
+            else:
+                delta = doc_id - self.last_doc[term]
+            self.last_doc[term] = doc_id
+            self.doc_freq[term] += 1
+            before = len(postings)
+            encode_varint(delta, postings)
+            encode_varint(len(term_positions), postings)
+            encode_varint(len(block), postings)
+            postings += block
+            self.buffered += len(postings) - before
+            length += len(term_positions)
+
+        metadata = metadata or {}
+        self.doc_records.append(json.dumps([key] + [metadata.get(field, '') for field in KEYWORD_INDEX_FIELDS],
+                                           separators=(',', ':')).encode('utf-8'))
+        self.doc_lengths.append(length)
+        self.total_tokens += length
+        if self.buffered >= self.segment_bytes:
+            self._spill()
+        return doc_id
+
+    def _spill(self):
+        if not self.postings:
+            return
+        path = os.path.join(self.work_dir, f"segment-{len(self.segments):05d}.bin")
+        with open(path, 'wb') as f:
+            for term in sorted(self.postings):
+                encoded = term.encode('utf-8')
+                postings = self.postings[term]
+                f.write(SEGMENT_ENTRY.pack(len(encoded), self.doc_freq[term], self.last_doc[term], len(postings)))
+                f.write(encoded)
+                f.write(postings)
+        self.segments.append(path)
+        self._reset_segment()
+
+    def finish(self) -> dict:
+        """
+        Merge the segments into the index file; returns build statistics
+        """
+        self._spill()
+        terms = bytearray()
+        term_bytes = bytearray()
+        with open(self.path, 'wb') as f:
+            f.write(bytes(HEADER.size))
+            postings_offset = f.tell()
+            written = 0
+            # heapq.merge keeps segment (document) order for equal terms
+            merged = heapq.merge(*(read_segment(path) for path in self.segments), key=lambda entry: entry[0])
+            for term, entries in itertools.groupby(merged, key=lambda entry: entry[0]):
+                start = written
+                df = 0
+                previous_last = None
+                for _, segment_df, last_doc, postings in entries:
+                    if previous_last is not None:
+                        # Rebase the segment's absolute first document onto the previous segment
+                        first, offset = decode_varint(postings, 0)
+                        rebased = bytearray()
+                        encode_varint(first - previous_last, rebased)
+                        f.write(rebased)
+                        f.write(memoryview(postings)[offset:])
+                        written += len(rebased) + len(postings) - offset
+                    else:
+                        f.write(postings)
+                        written += len(postings)
+                    previous_last = last_doc
+                    df += segment_df
+                terms += TERM_ENTRY.pack(len(term_bytes), len(term), df, start, written - start)
+                term_bytes += term
+
+            terms_offset = postings_offset + written
+            f.write(terms)
+            term_bytes_offset = f.tell()
+            f.write(term_bytes)
+            lengths_offset = f.tell()
+            f.write(struct.pack(f'<{len(self.doc_lengths)}I', *self.doc_lengths))
+            doc_offsets_offset = f.tell()
+            doc_offsets = list(itertools.accumulate((len(record) for record in self.doc_records), initial=0))
+            f.write(struct.pack(f'<{len(doc_offsets)}I', *doc_offsets))
+            doc_records_offset = f.tell()
+            for record in self.doc_records:
+                f.write(record)
+            info_offset = f.tell()
+            f.write(json.dumps({'fields': KEYWORD_INDEX_FIELDS, 'generated_at': datetime.now().isoformat()}).encode('utf-8'))
+            size = f.tell()
+
+            documents = len(self.doc_records)
+            term_count = len(terms) // TERM_ENTRY.size
+            f.seek(0)
+            f.write(HEADER.pack(
+                KEYWORD_INDEX_MAGIC, KEYWORD_INDEX_VERSION, documents, term_count, self.total_tokens,
+                self.total_tokens / documents if documents else 0.0,
+                postings_offset, terms_offset, term_bytes_offset, lengths_offset,
+                doc_offsets_offset, doc_records_offset, info_offset
+            ))
+
+        segments = len(self.segments)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        self.segments = []
+        return {
+            'documents': documents,
+            'terms': term_count,
+            'indexed_tokens': self.total_tokens,
+            'postings_bytes': written,
+            'size_bytes': size,
+            'segments': segments,
+        }
+
+
+def list_documents(s3, bucket: str, prefixes: tuple = ('bills/', 'newspapers/')) -> list:
+    """
+    Keys of every document (.txt) under the prefixes, sorted
+    """
+    keys = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for prefix in prefixes:
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            keys.extend(item['Key'] for item in page.get('Contents', []) if item['Key'].endswith('.txt'))
+    return sorted(keys)
+
+
+def build_index_file(s3, bucket: str, path: str, log=print, work_dir: str = None) -> dict:
+    """
+    Build the index file over every document in the bucket; returns build statistics
+    Documents are read in parallel, a bounded window at a time, and indexed in key order.
+    """
+    started = time.time()
+    keys = list_documents(s3, bucket)
+    log(f"Building keyword index over {len(keys)} documents")
+
+    def read(document_key):
+        try:
+            response = s3.get_object(Bucket=bucket, Key=document_key)
+            return response['Body'].read().decode('utf-8', errors='replace'), response.get('Metadata', {})
+        except Exception as e:
+            log(f"  ⚠️  Skipping {document_key} in keyword index: {e}")
+            return None
+
+    builder = KeywordIndexBuilder(path, work_dir=work_dir or os.path.dirname(path))
+    window = KEYWORD_INDEX_READ_WORKERS * 8
+    with ThreadPoolExecutor(max_workers=KEYWORD_INDEX_READ_WORKERS) as executor:
+        for start in range(0, len(keys), window):
+            batch = keys[start:start + window]
+            for document_key, document in zip(batch, executor.map(read, batch)):
+                if document is not None:
+                    builder.add(document_key, *document)
+            if (start // window) % 50 == 0:
+                log(f"  Keyword index: {min(start + window, len(keys))}/{len(keys)} documents read")
+    stats = builder.finish()
+    stats['build_seconds'] = round(time.time() - started, 1)
+    return stats
+
+
+def build_keyword_index(s3, bucket: str, key: str, log=print) -> dict:
+    """
+    Build the index over every document in the bucket and upload it to `key`
+    """
+    path = os.path.join(tempfile.gettempdir(), 'keyword_index.bin')
+    stats = build_index_file(s3, bucket, path, log=log)
+    s3.upload_file(path, bucket, key, ExtraArgs={'ContentType': 'application/octet-stream'})
+    os.remove(path)
+    return stats
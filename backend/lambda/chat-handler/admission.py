@@ -0,0 +1,256 @@
+"""
+Admission Control for Bedrock Generation
+Concurrent chat Lambdas otherwise all call Bedrock at once and get throttled
+together. Every request that needs a generation (cache misses only) first
+takes a token from one token bucket shared by all containers:
+
+- ADMISSION_CAPACITY tokens, refilled at ADMISSION_REFILL_PER_SECOND, so at most
+  capacity + refill x generation time generations are in flight
+- Priority lanes per persona: a lane may only take a token while more than its
+  reserve (a share of the capacity) is left, so under load `general` is turned
+  away first and `congressional_staffer` last
+- A rejected request gets an immediate 429 with Retry-After (when its lane will
+  have a token again) instead of queueing into Bedrock throttling and timeouts
+
+Storage:
+- DynamoDB item (ADMISSION_TABLE, the answer cache table) shared by all chat
+  Lambdas; tokens are only ever taken with an atomic conditional decrement, so
+  contention never turns a request away while tokens are left
+- In-memory stand-in when no table is configured (local testing, single container)
+
+Failures of the store never block a chat request: it is admitted and logged.
+Lanes can be overridden without a deploy through ADMISSION_LANES_JSON, e.g.
+{"law_student": 0.1}.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from decimal import Decimal
+
+import boto3
+from botocore.exceptions import ClientError
+from structured_log import get_logger
+
+log = get_logger('chat-handler')
+
+ADMISSION_CONTROL_ENABLED = os.environ.get('ADMISSION_CONTROL_ENABLED', 'true').lower() == 'true'
+ADMISSION_TABLE = os.environ.get('ADMISSION_TABLE', '')
+ADMISSION_CAPACITY = float(os.environ.get('ADMISSION_CAPACITY', '20'))
+ADMISSION_REFILL_PER_SECOND = float(os.environ.get('ADMISSION_REFILL_PER_SECOND', '4'))
+
+# Reserved item holding the shared bucket (numeric attributes, for atomic ADD)
+ADMISSION_BUCKET_KEY = '__admission_tokens__'
+
+# Share of the capacity a persona's lane must leave for higher-priority lanes
+DEFAULT_LANES = {
+    'congressional_staffer': 0.0,
+    'research_journalist': 0.2,
+    'law_student': 0.2,
+    'general': 0.4,
+    # POST /chat/batch questions, which wait and retry instead of getting a 429
+    'batch': 0.5,
+}
+
+
+def load_lanes() -> dict:
+    """
+    Lane reserves with ADMISSION_LANES_JSON applied on top of the defaults
+    """
+    lanes = dict(DEFAULT_LANES)
+    override = os.environ.get('ADMISSION_LANES_JSON', '')
+    if override:
+        try:
+            lanes.update({persona: float(reserve) for persona, reserve in json.loads(override).items()})
+        except (ValueError, TypeError, AttributeError) as e:
+            log.warning("Ignoring invalid ADMISSION_LANES_JSON: %s", e)
+    return lanes
+
+
+class AdmissionRejected(Exception):
+    """
+    No token for the request's lane; retry_after is in whole seconds
+    """
+
+    def __init__(self, persona: str, retry_after: int, tokens: float):
+        super().__init__(f"Admission rejected for {persona}, retry after {retry_after}s")
+        self.persona = persona
+        self.retry_after = retry_after
+        self.tokens = tokens
+
+
+def refill(tokens: float, updated_at: float, now: float, capacity: float, rate: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+
+def seconds_until(tokens: float, needed: float, rate: float) -> int:
+    """
+    Whole seconds until the bucket holds `needed` tokens (at least 1)
+    """
+    if rate <= 0:
+        return 60
+    return max(1, math.ceil((needed - tokens) / rate))
+
+
+class InMemoryBucketStore:
+    """
+    Local stand-in for the DynamoDB bucket (per container)
+    """
+
+    def __init__(self, capacity: float):
+        self._tokens = capacity
+        self._updated_at = time.time()
+        self._lock = threading.Lock()
+
+    def take(self, floor: float, capacity: float, rate: float) -> tuple:
+        """
+        Take one token if more than `floor` would be left; returns (admitted, tokens)
+        """
+        with self._lock:
+            now = time.time()
+            tokens = refill(self._tokens, self._updated_at, now, capacity, rate)
+            self._updated_at = now
+            if tokens - 1 < floor:
+                self._tokens = tokens
+                return False, tokens
+            self._tokens = tokens - 1
+            return True, self._tokens
+
+
+class DynamoDBBucketStore:
+    """
+    Bucket shared across containers
+    Item: {cache_key, tokens, refilled_at (epoch seconds)}. A take reads the item,
+    then refills and takes in one write conditioned on refilled_at being unchanged
+    and enough tokens being left. If another container refilled first, the token
+    is taken alone with an atomic decrement conditioned on the tokens left.
+    """
+
+    def __init__(self, table_name: str):
+        self.table = boto3.resource('dynamodb').Table(table_name)
+
+    def _create(self, tokens: float, now: float) -> bool:
+        try:
+            self.table.put_item(
+                Item={'cache_key': ADMISSION_BUCKET_KEY, 'tokens': number(tokens), 'refilled_at': number(now)},
+                ConditionExpression='attribute_not_exists(cache_key)',
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            return False
+
+    def _update(self, **kwargs):
+        """
+        The item's new tokens, or None when the condition failed
+        """
+        try:
+            response = self.table.update_item(Key={'cache_key': ADMISSION_BUCKET_KEY}, ReturnValues='UPDATED_NEW', **kwargs)
+            return float(response['Attributes']['tokens'])
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            return None
+
+    def take(self, floor: float, capacity: float, rate: float) -> tuple:
+        """
+        Take one token if more than `floor` would be left; returns (admitted, tokens)
+        """
+        needed = floor + 1
+        item = self.table.get_item(Key={'cache_key': ADMISSION_BUCKET_KEY}, ConsistentRead=True).get('Item')
+        now = time.time()
+        if item is None:
+            if capacity < needed:
+                return False, capacity
+            if self._create(capacity - 1, now):
+                return True, capacity - 1
+        else:
+            tokens = float(item['tokens'])
+            available = refill(tokens, float(item['refilled_at']), now, capacity, rate)
+            if available < needed:
+                return False, available
+            left = self._update(
+                UpdateExpression='SET refilled_at = :now ADD tokens :change',
+                ConditionExpression='refilled_at = :previous AND tokens >= :needed',
+                ExpressionAttributeValues={
+                    ':now': number(now), ':previous': item['refilled_at'],
+                    ':change': number(available - tokens - 1), ':needed': number(needed - (available - tokens)),
+                },
+            )
+            if left is not None:
+                return True, left
+
+        # Another container refilled (or created the bucket) since the read
+        left = self._update(
+            UpdateExpression='ADD tokens :minus_one',
+            ConditionExpression='tokens >= :needed',
+            ExpressionAttributeValues={':minus_one': -1, ':needed': number(needed)},
+        )
+        if left is not None:
+            return True, left
+        return False, needed - 1
+
+
+def number(value: float) -> Decimal:
+    return Decimal(str(round(value, 3)))
+
+
+class AdmissionController:
+    """
+    Priority-lane admission against a shared token bucket
+    """
+
+    def __init__(self, store, capacity: float = ADMISSION_CAPACITY, rate: float = ADMISSION_REFILL_PER_SECOND,
+                 lanes: dict = None):
+        self.store = store
+        self.capacity = capacity
+        self.rate = rate
+        self.lanes = lanes if lanes is not None else load_lanes()
+        self.admitted = 0
+        self.rejected = 0
+
+    def lane(self, persona: str) -> str:
+        """
+        The lane a persona is admitted in; unknown personas share the general lane
+        """
+        return persona if persona in self.lanes else 'general'
+
+    def floor(self, persona: str) -> float:
+        return self.lanes.get(self.lane(persona), 0.0) * self.capacity
+
+    def admit(self, persona: str) -> float:
+        """
+        Take a token for a generation or raise AdmissionRejected; returns the tokens left
+        """
+        persona = self.lane(persona)
+        floor = self.floor(persona)
+        try:
+            admitted, tokens = self.store.take(floor, self.capacity, self.rate)
+        except Exception as e:
+            log.warning("Admission store unavailable, admitting: %s", e, persona=persona)
+            return self.capacity
+        if admitted:
+            self.admitted += 1
+            return tokens
+        self.rejected += 1
+        retry_after = seconds_until(tokens, floor + 1, self.rate)
+        log.info("Admission rejected", persona=persona, tokens=round(tokens, 2), floor=floor,
+                 retry_after=retry_after, rejected=self.rejected)
+        raise AdmissionRejected(persona, retry_after, tokens)
+
+
+def create_admission_controller():
+    """
+    The container's admission controller, or None when admission control is disabled
+    """
+    if not ADMISSION_CONTROL_ENABLED:
+        return None
+    if ADMISSION_TABLE:
+        log.info("Admission control: DynamoDB bucket", table=ADMISSION_TABLE, capacity=ADMISSION_CAPACITY,
+                 refill_per_second=ADMISSION_REFILL_PER_SECOND)
+        return AdmissionController(DynamoDBBucketStore(ADMISSION_TABLE))
+    log.info("Admission control: in-memory bucket (no ADMISSION_TABLE)", capacity=ADMISSION_CAPACITY)
+    return AdmissionController(InMemoryBucketStore(ADMISSION_CAPACITY))
@@ -0,0 +1,186 @@
+"""
+Answer Cache for the Chat Handler
+Caches complete chat answers keyed by normalized question, persona, language and
+metadata filter, so repeated questions (e.g. the FAQ examples) skip Bedrock.
+
+Storage:
+- DynamoDB table (ANSWER_CACHE_TABLE) shared by all chat Lambdas, with TTL on `expires_at`
+- In-memory stand-in when no table is configured (local testing, single container)
+
+Invalidation:
+Every key includes the current corpus version. kb-sync-trigger's scheduled
+check_ingestion bumps the version once a Knowledge Base ingestion job completes,
+so all older entries stop matching and simply expire through TTL.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import boto3
+from structured_log import get_logger
+
+log = get_logger('chat-handler')
+
+ANSWER_CACHE_TABLE = os.environ.get('ANSWER_CACHE_TABLE', '')
+ANSWER_CACHE_TTL_SECONDS = int(os.environ.get('ANSWER_CACHE_TTL_SECONDS', '86400'))
+# How long a container trusts its copy of the corpus version before re-reading it
+CORPUS_VERSION_REFRESH_SECONDS = int(os.environ.get('CORPUS_VERSION_REFRESH_SECONDS', '60'))
+
+# Reserved item holding the corpus version
+CORPUS_VERSION_KEY = '__corpus_version__'
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a question for cache keys: lowercase, drop punctuation, collapse whitespace
+    """
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', question.lower()).split())
+
+
+class InMemoryCacheStore:
+    """
+    Local stand-in for the DynamoDB store (per container)
+    """
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+        self._corpus_version = 0
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item['expires_at'] < time.time():
+                del self._items[key]
+                return None
+            return item['value']
+
+    def put(self, key: str, value: dict, ttl_seconds: int):
+        with self._lock:
+            self._items[key] = {'value': value, 'expires_at': time.time() + ttl_seconds}
+
+    def get_corpus_version(self) -> int:
+        return self._corpus_version
+
+    def bump_corpus_version(self) -> int:
+        with self._lock:
+            self._corpus_version += 1
+            return self._corpus_version
+
+
+class DynamoDBCacheStore:
+    """
+    DynamoDB-backed store shared across containers
+    Items: {cache_key, value (JSON string), expires_at (epoch seconds, TTL attribute)}
+    """
+
+    def __init__(self, table_name: str):
+        self.table = boto3.resource('dynamodb').Table(table_name)
+
+    def get(self, key: str):
+        response = self.table.get_item(Key={'cache_key': key})
+        item = response.get('Item')
+        # TTL deletion is lazy, so check expiry ourselves
+        if not item or int(item.get('expires_at', 0)) < time.time():
+            return None
+        return json.loads(item['value'])
+
+    def put(self, key: str, value: dict, ttl_seconds: int):
+        self.table.put_item(Item={
+            'cache_key': key,
+            'value': json.dumps(value),
+            'expires_at': int(time.time() + ttl_seconds),
+        })
+
+    def get_corpus_version(self) -> int:
+        response = self.table.get_item(Key={'cache_key': CORPUS_VERSION_KEY})
+        return int(response.get('Item', {}).get('version', 0))
+
+    def bump_corpus_version(self) -> int:
+        response = self.table.update_item(
+            Key={'cache_key': CORPUS_VERSION_KEY},
+            UpdateExpression='ADD version :one',
+            ExpressionAttributeValues={':one': 1},
+            ReturnValues='UPDATED_NEW',
+        )
+        return int(response['Attributes']['version'])
+
+
+class AnswerCache:
+    """
+    Answer cache with corpus-version invalidation
+    Cache failures never break a chat request; they are logged and treated as misses.
+    """
+
+    def __init__(self, store, ttl_seconds: int = ANSWER_CACHE_TTL_SECONDS):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self._corpus_version = None
+        self._corpus_version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def corpus_version(self) -> int:
+        """
+        Current corpus version, re-read at most every CORPUS_VERSION_REFRESH_SECONDS
+        """
+        now = time.time()
+        if self._corpus_version is None or now - self._corpus_version_checked_at > CORPUS_VERSION_REFRESH_SECONDS:
+            try:
+                self._corpus_version = self.store.get_corpus_version()
+            except Exception as e:
+                log.warning("Answer cache: could not read corpus version: %s", e)
+                self._corpus_version = self._corpus_version or 0
+            self._corpus_version_checked_at = now
+        return self._corpus_version
+
+    def make_key(self, question: str, persona: str, language: str, metadata_filter) -> str:
+        key_material = json.dumps({
+            'q': normalize_question(question),
+            'persona': persona,
+            'language': language,
+            'filter': metadata_filter,
+            'corpus_version': self.corpus_version(),
+        }, sort_keys=True)
+        return hashlib.sha256(key_material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        try:
+            value = self.store.get(key)
+        except Exception as e:
+            log.warning("Answer cache: get failed: %s", e)
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: dict):
+        try:
+            self.store.put(key, value, self.ttl_seconds)
+        except Exception as e:
+            log.warning("Answer cache: put failed: %s", e)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+def create_answer_cache() -> AnswerCache:
+    """
+    Build the answer cache: DynamoDB when ANSWER_CACHE_TABLE is set, in-memory otherwise
+    """
+    if ANSWER_CACHE_TABLE:
+        return AnswerCache(DynamoDBCacheStore(ANSWER_CACHE_TABLE))
+    return AnswerCache(InMemoryCacheStore())
@@ -0,0 +1,196 @@
+"""
+Batch Chat Jobs
+POST /chat/batch takes a list of questions and returns a job ID right away; a
+worker invocation answers them asynchronously and GET /chat/batch/{jobId}
+reports progress, throughput (questions per minute) and where the results are.
+
+Each job is three objects under BATCH_PREFIX in the data bucket:
+
+    batches/{job_id}/request.json   questions as submitted
+    batches/{job_id}/status.json    progress, polled by GET /chat/batch/{jobId}
+    batches/{job_id}/results.jsonl  one JSON line per answered question, rewritten
+                                    at each checkpoint so partial results are readable
+
+Storage:
+- S3 (BATCH_BUCKET_NAME), shared by the API handler and the batch worker
+- In-memory stand-in when no bucket is configured (local testing, single container)
+"""
+
+import json
+import os
+import threading
+import time
+
+import boto3
+
+BATCH_BUCKET_NAME = os.environ.get('BATCH_BUCKET_NAME', '')
+BATCH_PREFIX = os.environ.get('BATCH_PREFIX', 'batches/')
+BATCH_MAX_QUESTIONS = int(os.environ.get('BATCH_MAX_QUESTIONS', '500'))
+BATCH_MAX_QUESTION_CHARS = int(os.environ.get('BATCH_MAX_QUESTION_CHARS', '2000'))
+# Lifetime of the presigned results URL returned by GET /chat/batch/{jobId}
+BATCH_RESULTS_URL_SECONDS = int(os.environ.get('BATCH_RESULTS_URL_SECONDS', '3600'))
+
+
+def parse_batch_request(body: dict) -> list:
+    """
+    Validate a batch body and return its questions as
+    [{"question", "persona", "language", "id"}, ...]
+
+    "questions" items are strings or {"question" (or "message"), "persona", "language", "id"};
+    top-level "persona" and "language" are the defaults. Raises ValueError when invalid.
+    """
+    items = body.get('questions')
+    if not isinstance(items, list) or not items:
+        raise ValueError('questions must be a non-empty list')
+    if len(items) > BATCH_MAX_QUESTIONS:
+        raise ValueError(f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+
+    persona = body.get('persona', 'general')
+    language = body.get('language', 'en')
+    questions = []
+    for position, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'question': item}
+        if not isinstance(item, dict):
+            raise ValueError(f"questions[{position}] must be a string or an object")
+        question = (item.get('question') or item.get('message') or '').strip()
+        if not question:
+            raise ValueError(f"questions[{position}] has no question")
+        if len(question) > BATCH_MAX_QUESTION_CHARS:
+            raise ValueError(f"questions[{position}] is longer than {BATCH_MAX_QUESTION_CHARS} characters")
+        questions.append({
+            'question': question,
+            'persona': item.get('persona', persona),
+            'language': item.get('language', language),
+            'id': item.get('id', position),
+        })
+    return questions
+
+
+def questions_per_minute(completed: int, elapsed_seconds: float) -> float:
+    if elapsed_seconds <= 0:
+        return 0.0
+    return round(completed * 60 / elapsed_seconds, 1)
+
+
+def new_status(job_id: str, questions: list) -> dict:
+    now = time.time()
+    return {
+        'job_id': job_id,
+        'status': 'queued',
+        'total': len(questions),
+        'completed': 0,
+        'failed': 0,
+        'cached': 0,
+        'created_at': now,
+        'started_at': None,
+        'updated_at': now,
+        'elapsed_seconds': 0.0,
+        'questions_per_minute': 0.0,
+        'invocations': 0,
+    }
+
+
+class InMemoryBatchStore:
+    """
+    Local stand-in for the S3 store (per container)
+    """
+
+    shared = False
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id: str, questions: list, status: dict):
+        with self._lock:
+            self._jobs[job_id] = {'questions': questions, 'status': dict(status), 'results': []}
+
+    def read_questions(self, job_id: str) -> list:
+        with self._lock:
+            return self._jobs[job_id]['questions']
+
+    def read_status(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job['status']) if job else None
+
+    def write_status(self, job_id: str, status: dict):
+        with self._lock:
+            self._jobs[job_id]['status'] = dict(status)
+
+    def read_results(self, job_id: str) -> list:
+        with self._lock:
+            return list(self._jobs[job_id]['results'])
+
+    def write_results(self, job_id: str, results: list):
+        with self._lock:
+            self._jobs[job_id]['results'] = list(results)
+
+    def results_location(self, job_id: str) -> dict:
+        return {'results': self.read_results(job_id)}
+
+
+class S3BatchStore:
+    """
+    S3-backed store shared by the API handler and the batch worker
+    """
+
+    shared = True
+
+    def __init__(self, bucket: str, prefix: str = BATCH_PREFIX):
+        self.s3 = boto3.client('s3')
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def key(self, job_id: str, name: str) -> str:
+        return f"{self.prefix}{job_id}/{name}"
+
+    def _put_json(self, job_id: str, name: str, value):
+        self.s3.put_object(Bucket=self.bucket, Key=self.key(job_id, name),
+                           Body=json.dumps(value).encode('utf-8'), ContentType='application/json')
+
+    def _get(self, job_id: str, name: str):
+        try:
+            return self.s3.get_object(Bucket=self.bucket, Key=self.key(job_id, name))['Body'].read().decode('utf-8')
+        except self.s3.exceptions.NoSuchKey:
+            return None
+
+    def create(self, job_id: str, questions: list, status: dict):
+        self._put_json(job_id, 'request.json', {'questions': questions})
+        self._put_json(job_id, 'status.json', status)
+
+    def read_questions(self, job_id: str) -> list:
+        return json.loads(self._get(job_id, 'request.json'))['questions']
+
+    def read_status(self, job_id: str):
+        body = self._get(job_id, 'status.json')
+        return json.loads(body) if body else None
+
+    def write_status(self, job_id: str, status: dict):
+        self._put_json(job_id, 'status.json', status)
+
+    def read_results(self, job_id: str) -> list:
+        body = self._get(job_id, 'results.jsonl')
+        return [json.loads(line) for line in body.splitlines() if line] if body else []
+
+    def write_results(self, job_id: str, results: list):
+        body = ''.join(json.dumps(line, separators=(',', ':')) + '\n' for line in results)
+        self.s3.put_object(Bucket=self.bucket, Key=self.key(job_id, 'results.jsonl'),
+                           Body=body.encode('utf-8'), ContentType='application/x-ndjson')
+
+    def results_location(self, job_id: str) -> dict:
+        key = self.key(job_id, 'results.jsonl')
+        url = self.s3.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': key}, ExpiresIn=BATCH_RESULTS_URL_SECONDS
+        )
+        return {'results_key': key, 'results_url': url}
+
+
+def create_batch_store():
+    """
+    Build the batch store: S3 when BATCH_BUCKET_NAME is set, in-memory otherwise
+    """
+    if BATCH_BUCKET_NAME:
+        return S3BatchStore(BATCH_BUCKET_NAME)
+    return InMemoryBatchStore()
@@ -0,0 +1,248 @@
+"""
+Bill Reference Parser for the Chat Handler
+Finds every bill a question refers to, in any common citation style, so the
+Knowledge Base filter (or the direct fetch) can target exactly those documents.
+
+Handles:
+- Abbreviations with or without dots and spaces: "HR 1", "H.R. 12", "S. 4", "S4",
+  "H. J. Res. 2", "S.Con.Res. 3", "H. Res. 7"
+- Spelled-out types: "House bill 5", "Senate joint resolution 2"
+- Congress numbers as digits, ordinals, words and roman numerals: "congress 6",
+  "6th congress", "the Sixth Congress", "Twenty-third Congress", "XVI Congress"
+- Several bills per question: "compare HR 1 and S 2 in the 6th congress"
+- A bare ordinal after a bill citation: "HR 1 of the 6th congress and S 2 of the 7th"
+
+Questions are tokenized once with a precompiled regex and scanned left to right;
+no pattern is built per call.
+"""
+
+import re
+
+# Words, numbers, ordinal numbers ("6th") and decades ("1790s"); apostrophes stay
+# inside words and decade suffixes on their number, so neither "it's 4" nor
+# "the 1790s 3 bills" reads as bill S 4 / S 3
+TOKEN_PATTERN = re.compile(r"\d+(?:st|nd|rd|th|s)\b|\d+|[a-z]+(?:'[a-z]+)?")
+ORDINAL_NUMBER_PATTERN = re.compile(r'^(\d+)(?:st|nd|rd|th)$')
+ROMAN_PATTERN = re.compile(r'^(?=[ivxlc]{2,}$|[vx]$)c{0,3}(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})$')
+
+# Abbreviated bill types, matched against consecutive tokens joined without spaces
+# ("h j res" -> "hjres"); values are the bill_type stored in S3 metadata
+BILL_TYPE_ABBREVIATIONS = {
+    'hr': 'HR',
+    's': 'S',
+    'hjres': 'HJRES',
+    'sjres': 'SJRES',
+    'hconres': 'HCONRES',
+    'sconres': 'SCONRES',
+    'hres': 'HRES',
+    'sres': 'SRES',
+}
+
+# Spelled-out bill types, matched against consecutive tokens joined with spaces
+BILL_TYPE_PHRASES = {
+    'house bill': 'HR',
+    'senate bill': 'S',
+    'house joint resolution': 'HJRES',
+    'senate joint resolution': 'SJRES',
+    'house concurrent resolution': 'HCONRES',
+    'senate concurrent resolution': 'SCONRES',
+    'house resolution': 'HRES',
+    'senate resolution': 'SRES',
+}
+
+MAX_TYPE_TOKENS = 4
+
+# Optional words between a bill type or "congress" and its number
+NUMBER_FILLERS = {'no', 'number', 'num'}
+
+# Words after "of the 7th" that make it something other than a congress
+NON_CONGRESS_ORDINAL_WORDS = {
+    'session', 'sessions', 'century', 'day', 'month', 'year', 'section', 'article', 'clause',
+    'amendment', 'of', 'instant', 'inst', 'ult', 'january', 'february', 'march', 'april', 'may',
+    'june', 'july', 'august', 'september', 'october', 'november', 'december',
+}
+
+UNITS = {
+    'first': 1, 'second': 2, 'third': 3, 'fourth': 4, 'fifth': 5, 'sixth': 6,
+    'seventh': 7, 'eighth': 8, 'ninth': 9,
+}
+TEENS = {
+    'tenth': 10, 'eleventh': 11, 'twelfth': 12, 'thirteenth': 13, 'fourteenth': 14,
+    'fifteenth': 15, 'sixteenth': 16, 'seventeenth': 17, 'eighteenth': 18, 'nineteenth': 19,
+}
+TENS_ORDINALS = {
+    'twentieth': 20, 'thirtieth': 30, 'fortieth': 40, 'fiftieth': 50,
+    'sixtieth': 60, 'seventieth': 70, 'eightieth': 80, 'ninetieth': 90,
+}
+TENS = {
+    'twenty': 20, 'thirty': 30, 'forty': 40, 'fifty': 50,
+    'sixty': 60, 'seventy': 70, 'eighty': 80, 'ninety': 90,
+}
+ROMAN_VALUES = {'i': 1, 'v': 5, 'x': 10, 'l': 50, 'c': 100}
+
+
+def tokenize(question: str) -> list:
+    return TOKEN_PATTERN.findall(question.lower())
+
+
+def roman_to_int(token: str):
+    if not ROMAN_PATTERN.match(token):
+        return None
+    total = 0
+    for current, following in zip(token, token[1:] + ' '):
+        value = ROMAN_VALUES[current]
+        total += -value if ROMAN_VALUES.get(following, 0) > value else value
+    return total
+
+
+def ordinal_before(tokens: list, end: int):
+    """
+    Parse an ordinal ending at tokens[end] ("6th", "sixth", "twenty third",
+    "twentieth", "xvi"); returns the number or None
+    """
+    if end < 0:
+        return None
+    token = tokens[end]
+    match = ORDINAL_NUMBER_PATTERN.match(token)
+    if match:
+        return int(match.group(1))
+    if token in UNITS:
+        if end > 0 and tokens[end - 1] in TENS:
+            return TENS[tokens[end - 1]] + UNITS[token]
+        return UNITS[token]
+    if token in TEENS:
+        return TEENS[token]
+    if token in TENS_ORDINALS:
+        return TENS_ORDINALS[token]
+    return roman_to_int(token)
+
+
+def number_after(tokens: list, start: int):
+    """
+    Parse a number starting at tokens[start], skipping "no"/"number"
+    """
+    while start < len(tokens) and tokens[start] in NUMBER_FILLERS:
+        start += 1
+    if start >= len(tokens):
+        return None
+    if tokens[start].isdigit():
+        return int(tokens[start])
+    return roman_to_int(tokens[start])
+
+
+def match_bill_type(tokens: list, start: int):
+    """
+    Match a bill type at tokens[start]; returns (bill_type, tokens consumed) or None
+    Longest match wins so "h j res" is HJRES, not HR.
+    """
+    for length in range(min(MAX_TYPE_TOKENS, len(tokens) - start), 0, -1):
+        window = tokens[start:start + length]
+        phrase = ' '.join(window)
+        if phrase in BILL_TYPE_PHRASES:
+            return BILL_TYPE_PHRASES[phrase], length
+        compact = ''.join(window)
+        if compact in BILL_TYPE_ABBREVIATIONS:
+            # Abbreviations may only be split into short pieces ("h r", "con res")
+            if length > 1 and any(len(token) > 3 for token in window):
+                continue
+            # "u s 483" (a U.S. Reports citation) is not bill S 483
+            if start > 0 and len(tokens[start - 1]) == 1 and tokens[start - 1].isalpha():
+                continue
+            return BILL_TYPE_ABBREVIATIONS[compact], length
+    return None
+
+
+def bare_congress_ordinal(tokens: list, i: int):
+    """
+    Congress number of a bare ordinal at tokens[i] in "of the 7th" (not followed
+    by "congress", a date or a session), or None
+    """
+    # Compound ordinals ("twenty third") start one token earlier
+    start = i - 1 if tokens[i] in UNITS and i > 0 and tokens[i - 1] in TENS else i
+    if start < 2 or tokens[start - 2:start] != ['of', 'the']:
+        return None
+    following = tokens[i + 1] if i + 1 < len(tokens) else None
+    if following in ('congress', 'congresses') or following in NON_CONGRESS_ORDINAL_WORDS:
+        return None
+    return ordinal_before(tokens, i)
+
+
+def find_congresses(tokens: list, bare_ordinals: bool = False) -> list:
+    """
+    (token position, congress number) for every congress mention
+    With bare_ordinals, "of the 7th" also counts (after a bill citation the
+    congress is often left implicit).
+    """
+    congresses = []
+    for i, token in enumerate(tokens):
+        if token in ('congress', 'congresses'):
+            number = ordinal_before(tokens, i - 1)
+            if number is None:
+                number = number_after(tokens, i + 1)
+        elif bare_ordinals:
+            number = bare_congress_ordinal(tokens, i)
+        else:
+            continue
+        if number:
+            congresses.append((i, number))
+    return congresses
+
+
+def find_bills(tokens: list) -> list:
+    """
+    (token position, bill_type, bill_number) for every bill citation
+    """
+    bills = []
+    i = 0
+    while i < len(tokens):
+        matched = match_bill_type(tokens, i)
+        if matched:
+            bill_type, length = matched
+            j = i + length
+            while j < len(tokens) and tokens[j] in NUMBER_FILLERS:
+                j += 1
+            if j < len(tokens) and tokens[j].isdigit():
+                bills.append((i, bill_type, str(int(tokens[j]))))
+                i = j + 1
+                continue
+        i += 1
+    return bills
+
+
+def extract_bill_references(question: str) -> list:
+    """
+    Every bill referenced in a question, in order of appearance
+
+    Examples:
+    - "what is bill HR 1 in congress 6?" -> [{"congress": "6", "bill_type": "HR", "bill_number": "1"}]
+    - "compare H.R. 12 and S. 4 of the Sixth Congress" -> HR 12 and S 4, both congress 6
+    - "Congress 6 bill H. J. Res. 2" -> [{"congress": "6", "bill_type": "HJRES", "bill_number": "2"}]
+
+    A bill binds to a congress mention: the only one if there is one, otherwise
+    the nearest following mention ("HR 1 of the 6th congress and S 2 of the 7th"),
+    or the preceding one when congresses are written first ("congress 6: HR 1").
+    Bills without any congress mention have no "congress" key.
+    """
+    tokens = tokenize(question)
+    bills = find_bills(tokens)
+    congresses = find_congresses(tokens, bare_ordinals=bool(bills))
+    congress_first = bool(congresses and bills and congresses[0][0] < bills[0][0])
+
+    references = []
+    for position, bill_type, bill_number in bills:
+        reference = {'bill_type': bill_type, 'bill_number': bill_number}
+        congress = None
+        if len(congresses) == 1:
+            congress = congresses[0][1]
+        elif congresses:
+            if congress_first:
+                preceding = [number for at, number in congresses if at < position]
+                congress = preceding[-1] if preceding else congresses[0][1]
+            else:
+                following = [number for at, number in congresses if at > position]
+                congress = following[0] if following else congresses[-1][1]
+        if congress:
+            reference['congress'] = str(congress)
+        if reference not in references:
+            references.append(reference)
+    return references
@@ -0,0 +1,10 @@
+"""
+pytest configuration for the chat handler's unit tests
+Makes the shared layer importable and gives boto3 clients created at import time a region.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared', 'python'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
@@ -0,0 +1,146 @@
+"""
+Context Selection for Two-Step Retrieval
+Prunes the raw Knowledge Base `retrieve` results before they reach the prompt:
+
+1. Noise filter - drops OCR garbage (mostly non-letters) and empty chunks
+2. Score cutoff - drops results below an absolute score or a fraction of the best score
+   (of each list before fusion: fused rank scores are not comparable that way)
+3. Per-document collapsing - keeps the best few chunks of each document
+4. MMR - picks chunks that are relevant but not redundant with what is already chosen
+   (similarity is word-set Jaccard, so no extra embedding calls are needed)
+5. Token budget - stops adding chunks once the context budget is spent
+
+A 50-result retrieval typically shrinks to a dozen distinct chunks.
+
+Results of several retrievals (per source type or per sub-question) are merged
+with reciprocal-rank fusion first, so they share one context budget.
+"""
+
+import os
+import re
+
+RERANK_MIN_SCORE = float(os.environ.get('RERANK_MIN_SCORE', '0.0'))
+RERANK_RELATIVE_CUTOFF = float(os.environ.get('RERANK_RELATIVE_CUTOFF', '0.5'))
+MAX_CHUNKS_PER_DOCUMENT = int(os.environ.get('MAX_CHUNKS_PER_DOCUMENT', '2'))
+MMR_LAMBDA = float(os.environ.get('MMR_LAMBDA', '0.7'))
+CONTEXT_MAX_CHUNKS = int(os.environ.get('CONTEXT_MAX_CHUNKS', '12'))
+CONTEXT_MAX_TOKENS = int(os.environ.get('CONTEXT_MAX_TOKENS', '6000'))
+# Chunks with fewer letters than this share of non-space characters are OCR noise
+MIN_LETTER_RATIO = float(os.environ.get('MIN_LETTER_RATIO', '0.6'))
+# Reciprocal-rank fusion constant (60 is the usual choice)
+RRF_K = int(os.environ.get('RRF_K', '60'))
+
+# Rough characters-per-token ratio for budgeting
+CHARS_PER_TOKEN = 4
+
+WORD_PATTERN = re.compile(r'[a-z]{3,}')
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def result_text(result: dict) -> str:
+    return result.get('content', {}).get('text', '')
+
+
+def result_document(result: dict) -> str:
+    return result.get('location', {}).get('s3Location', {}).get('uri', '')
+
+
+def is_noise(text: str) -> bool:
+    characters = [character for character in text if not character.isspace()]
+    if not characters:
+        return True
+    letters = sum(character.isalpha() for character in characters)
+    return letters / len(characters) < MIN_LETTER_RATIO
+
+
+def jaccard(words_a: frozenset, words_b: frozenset) -> float:
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def score_cutoff(results: list) -> list:
+    """
+    Results scoring at least RERANK_MIN_SCORE and RERANK_RELATIVE_CUTOFF of the best
+    """
+    if not results:
+        return []
+    top_score = max(result.get('score', 0) for result in results)
+    min_score = max(RERANK_MIN_SCORE, top_score * RERANK_RELATIVE_CUTOFF)
+    return [result for result in results if result.get('score', 0) >= min_score]
+
+
+def reciprocal_rank_fusion(ranked_lists: list, k: int = RRF_K) -> list:
+    """
+    Fuse ranked result lists: each chunk scores sum(1 / (k + rank)) over the lists
+    it appears in. Vector scores from different filtered searches are not
+    comparable, ranks are, so the score cutoff applies to each list on its own
+    first. The fused score replaces `score` (the original is kept as
+    `vector_score`); the result is sorted best first.
+    """
+    fused = {}
+    for results in ranked_lists:
+        for rank, result in enumerate(score_cutoff(results), 1):
+            chunk_id = (result_document(result), result_text(result))
+            if chunk_id not in fused:
+                fused[chunk_id] = {**result, 'vector_score': result.get('score', 0), 'score': 0.0}
+            fused[chunk_id]['score'] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda result: result['score'], reverse=True)
+
+
+def select_context(results: list, max_tokens: int = CONTEXT_MAX_TOKENS,
+                   max_chunks: int = CONTEXT_MAX_CHUNKS, fused: bool = False) -> tuple:
+    """
+    Select the chunks to put in the prompt
+    `fused` results come from reciprocal_rank_fusion, which already cut each list.
+
+    Returns: (selected results in prompt order, stats dict)
+    """
+    stats = {'retrieved': len(results)}
+
+    candidates = [result for result in results if not is_noise(result_text(result))]
+    stats['after_noise_filter'] = len(candidates)
+
+    if not fused:
+        candidates = score_cutoff(candidates)
+    stats['after_score_cutoff'] = len(candidates)
+
+    per_document = {}
+    collapsed = []
+    for result in sorted(candidates, key=lambda result: result.get('score', 0), reverse=True):
+        document = result_document(result)
+        if per_document.get(document, 0) < MAX_CHUNKS_PER_DOCUMENT:
+            per_document[document] = per_document.get(document, 0) + 1
+            collapsed.append(result)
+    stats['after_collapse'] = len(collapsed)
+
+    # MMR over the collapsed candidates, within the token budget
+    words = [frozenset(WORD_PATTERN.findall(result_text(result).lower())) for result in collapsed]
+    top_score = collapsed[0].get('score', 0) if collapsed else 0
+    relevance = [(result.get('score', 0) / top_score) if top_score else 0.0 for result in collapsed]
+
+    selected = []
+    remaining = list(range(len(collapsed)))
+    used_tokens = 0
+    while remaining and len(selected) < max_chunks:
+        best_index, best_value = None, None
+        for index in remaining:
+            redundancy = max((jaccard(words[index], words[chosen]) for chosen in selected), default=0.0)
+            value = MMR_LAMBDA * relevance[index] - (1 - MMR_LAMBDA) * redundancy
+            if best_value is None or value > best_value:
+                best_index, best_value = index, value
+        remaining.remove(best_index)
+
+        tokens = estimate_tokens(result_text(collapsed[best_index]))
+        if used_tokens + tokens > max_tokens:
+            # Too big for what is left of the budget; a smaller chunk may still fit
+            continue
+        used_tokens += tokens
+        selected.append(best_index)
+
+    stats['selected'] = len(selected)
+    stats['context_tokens'] = used_tokens
+    return [collapsed[index] for index in selected], stats
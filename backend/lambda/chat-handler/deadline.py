@@ -0,0 +1,135 @@
+"""
+Deadline Handling for the Chat Handler
+API Gateway gives up after 29 seconds, so every chat request gets a deadline and
+all Bedrock work is bounded by it instead of running into the Lambda timeout.
+
+- request_deadline() derives the deadline from context.get_remaining_time_in_millis(),
+  capped at the API Gateway limit and minus a safety margin for the response
+- call_with_retries() retries throttling errors with full-jitter exponential
+  backoff, but never sleeps past the deadline
+- run_hedged() starts the primary generation and, if it has not answered after
+  HEDGE_AFTER_FRACTION of the remaining budget (or fails early), starts a hedge on
+  a faster model with a reduced context; the first answer wins
+
+Deadlines are time.monotonic() timestamps; None means unbounded (local runs).
+"""
+
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from botocore.exceptions import ClientError
+from structured_log import get_logger
+
+log = get_logger('chat-handler')
+
+API_GATEWAY_TIMEOUT_MS = int(os.environ.get('API_GATEWAY_TIMEOUT_MS', '29000'))
+# Time kept back for building and returning the response
+DEADLINE_SAFETY_MS = int(os.environ.get('DEADLINE_SAFETY_MS', '1500'))
+HEDGE_AFTER_FRACTION = float(os.environ.get('HEDGE_AFTER_FRACTION', '0.5'))
+HEDGE_MAX_WORKERS = int(os.environ.get('HEDGE_MAX_WORKERS', '8'))
+
+THROTTLE_MAX_RETRIES = int(os.environ.get('THROTTLE_MAX_RETRIES', '3'))
+THROTTLE_BASE_DELAY_MS = int(os.environ.get('THROTTLE_BASE_DELAY_MS', '200'))
+THROTTLE_MAX_DELAY_MS = int(os.environ.get('THROTTLE_MAX_DELAY_MS', '2000'))
+
+RETRYABLE_ERROR_CODES = {
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException',
+    'ModelNotReadyException',
+}
+
+hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS)
+
+
+def request_deadline(context, cap_ms: int = API_GATEWAY_TIMEOUT_MS):
+    """
+    Deadline for a request: the Lambda's remaining time (capped at cap_ms unless
+    it is None) minus the safety margin
+    """
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return None
+    budget_ms = context.get_remaining_time_in_millis()
+    if cap_ms is not None:
+        budget_ms = min(budget_ms, cap_ms)
+    budget_ms -= DEADLINE_SAFETY_MS
+    return time.monotonic() + max(0, budget_ms) / 1000
+
+
+def remaining_ms(deadline):
+    if deadline is None:
+        return None
+    return max(0, int((deadline - time.monotonic()) * 1000))
+
+
+def call_with_retries(operation, deadline=None, **kwargs):
+    """
+    Call a boto3 operation, retrying throttling errors with full-jitter backoff
+    within the deadline
+    """
+    for attempt in range(THROTTLE_MAX_RETRIES + 1):
+        try:
+            return operation(**kwargs)
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code', '')
+            if code not in RETRYABLE_ERROR_CODES or attempt == THROTTLE_MAX_RETRIES:
+                raise
+            delay = random.uniform(0, min(THROTTLE_MAX_DELAY_MS, THROTTLE_BASE_DELAY_MS * 2 ** attempt)) / 1000
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            log.warning("%s from %s: retry %d/%d in %dms", code, getattr(operation, '__name__', 'bedrock'),
+                        attempt + 1, THROTTLE_MAX_RETRIES, delay * 1000)
+            time.sleep(delay)
+
+
+def run_hedged(primary, hedge, deadline, admit_hedge=None):
+    """
+    Run primary(); start hedge() if primary has not answered by HEDGE_AFTER_FRACTION
+    of the remaining budget or fails. First result wins. When given, admit_hedge()
+    is asked first and the hedge is skipped if it returns False; without a hedge
+    the primary alone runs within the deadline.
+
+    Returns (result or None, info) where info = {"winner", "hedged", "budget_ms"}
+    and winner is "primary", "hedge", "deadline_exceeded" or "failed".
+    """
+    start = time.monotonic()
+    info = {'winner': None, 'hedged': False, 'budget_ms': remaining_ms(deadline)}
+    hedge_at = start + (deadline - start) * HEDGE_AFTER_FRACTION
+    futures = {hedge_executor.submit(primary): 'primary'}
+    last_error = None
+    hedge_decided = False
+
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            info['winner'] = 'deadline_exceeded'
+            return None, info
+
+        wait_until = deadline if hedge_decided else hedge_at
+        done, _ = wait(list(futures), timeout=max(0.0, wait_until - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            label = futures.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                last_error = e
+                log.warning("%s generation failed: %s: %s", label, type(e).__name__, e)
+                continue
+            info['winner'] = label
+            return result, info
+
+        if not hedge_decided and (time.monotonic() >= hedge_at or not futures):
+            hedge_decided = True
+            if hedge is not None and (admit_hedge is None or admit_hedge()):
+                log.info("Hedging: primary has not answered after %dms", (time.monotonic() - start) * 1000)
+                futures[hedge_executor.submit(hedge)] = 'hedge'
+                info['hedged'] = True
+            elif hedge is not None:
+                log.info("Hedge not admitted, waiting for the primary")
+                info['hedge_skipped'] = True
+        if hedge_decided and not futures:
+            info['winner'] = 'failed'
+            info['error'] = f"{type(last_error).__name__}: {last_error}" if last_error else None
+            return None, info
@@ -0,0 +1,117 @@
+"""
+Document Metadata Index for Citations
+The collector writes a compact index of every document it stores
+(indexes/document_metadata.json.gz, keyed by S3 key):
+
+    {"fields": ["url", "title", "date", "type"], "documents": {"bills/congress_6/hr_1.txt": [...], ...}}
+
+The chat handler loads it once per container and enriches each cited source
+from memory with the document's public URL (bill_url / pdf_url), title, date
+and type, instead of exposing s3:// URIs or calling head_object per source.
+
+- Loaded on first use; requests in flight meanwhile wait for that one load
+- Reloaded when the corpus version changes (the collector rewrites the index
+  before ingestion, and kb-sync-trigger's check_ingestion bumps the version once
+  that ingestion completes); the reload is a conditional GET, done by one thread
+  while the others keep using the loaded index
+- A missing or unreadable index leaves sources as they were
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+
+from botocore.exceptions import ClientError
+from structured_log import get_logger
+
+log = get_logger('chat-handler')
+
+DOCUMENT_INDEX_KEY = os.environ.get('DOCUMENT_INDEX_KEY', 'indexes/document_metadata.json.gz')
+DOCUMENT_INDEX_FIELDS = ['url', 'title', 'date', 'type']
+
+
+class DocumentIndex:
+    """
+    In-memory S3 key -> {url, title, date, type}, loaded from the collector's index
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str = DOCUMENT_INDEX_KEY, corpus_version=None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.corpus_version = corpus_version
+        self._documents = None
+        self._etag = None
+        self._loaded_version = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.bucket and self.key)
+
+    def _version(self):
+        try:
+            return self.corpus_version() if self.corpus_version else None
+        except Exception:
+            return self._loaded_version
+
+    def _load(self, version):
+        started = time.perf_counter()
+        request = {'Bucket': self.bucket, 'Key': self.key}
+        if self._etag:
+            request['IfNoneMatch'] = self._etag
+        try:
+            response = self.s3_client.get_object(**request)
+            index = json.loads(gzip.decompress(response['Body'].read()))
+            if index.get('fields') != DOCUMENT_INDEX_FIELDS:
+                raise ValueError(f"unexpected fields {index.get('fields')}")
+            self._documents = index.get('documents', {})
+            self._etag = response.get('ETag')
+            log.info("Document index loaded", documents=len(self._documents), corpus_version=version,
+                     load_ms=round((time.perf_counter() - started) * 1000, 1))
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code != '304' and code != 'NotModified':
+                log.warning("Document index unavailable", key=self.key, error_code=code)
+        except Exception as e:
+            log.warning("Document index unreadable: %s", e, key=self.key)
+        if self._documents is None:
+            self._documents = {}
+        self._loaded_version = version
+
+    def documents(self) -> dict:
+        """
+        The loaded index, loading or reloading it when needed
+        """
+        if self._documents is None:
+            with self._lock:
+                if self._documents is None:
+                    self._load(self._version())
+            return self._documents
+        version = self._version()
+        if version != self._loaded_version and self._lock.acquire(blocking=False):
+            try:
+                self._load(version)
+            finally:
+                self._lock.release()
+        return self._documents
+
+    def get(self, key: str):
+        """
+        {url, title, date, type} for an S3 key, or None when it is not indexed
+        """
+        if not self.enabled:
+            return None
+        entry = self.documents().get(key)
+        return dict(zip(DOCUMENT_INDEX_FIELDS, entry)) if entry else None
+
+    def get_uri(self, uri: str):
+        """
+        Index entry for an s3:// URI in the data bucket, or None
+        """
+        prefix = f"s3://{self.bucket}/"
+        if not self.enabled or not uri.startswith(prefix):
+            return None
+        return self.get(uri[len(prefix):])
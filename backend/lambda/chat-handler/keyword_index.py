@@ -0,0 +1,406 @@
+"""
+Keyword (BM25) Retrieval over the Collector's Inverted Index
+The collector builds a positional inverted index over the whole corpus
+(indexes/keyword_index.bin, layout in backend/fargate/keyword_index.py). The chat
+handler downloads it to /tmp once per container and memory-maps it: term lookups
+are a binary search over the mapped term table and only the postings of the
+query's terms are read, so the index never has to fit in memory.
+
+- BM25 (k1, b) over the indexed terms of the query; terms (outside phrases) in more than
+  KEYWORD_MAX_DF_RATIO of the documents are too common to rank by and skipped,
+  unless every term is: then the rarest of them is ranked by
+- "Quoted phrases" must appear verbatim (checked from token positions)
+- Metadata filters (the Knowledge Base filter syntax) are applied to the
+  metadata stored with each document
+- Loaded in the background: until the index is ready (or when it is missing)
+  keyword retrieval reports itself unavailable and callers use vector search alone
+- Reloaded when the corpus version changes and the object's ETag differs
+"""
+
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from botocore.exceptions import ClientError
+from structured_log import get_logger
+
+log = get_logger('chat-handler')
+
+KEYWORD_INDEX_KEY = os.environ.get('KEYWORD_INDEX_KEY', 'indexes/keyword_index.bin')
+KEYWORD_INDEX_DIR = os.environ.get('KEYWORD_INDEX_DIR', '/tmp')
+KEYWORD_BM25_K1 = float(os.environ.get('KEYWORD_BM25_K1', '1.2'))
+KEYWORD_BM25_B = float(os.environ.get('KEYWORD_BM25_B', '0.75'))
+KEYWORD_MAX_DF_RATIO = float(os.environ.get('KEYWORD_MAX_DF_RATIO', '0.5'))
+# Characters of document text around the best match returned as a passage
+KEYWORD_PASSAGE_CHARS = int(os.environ.get('KEYWORD_PASSAGE_CHARS', '1200'))
+
+# Must match the builder (backend/fargate/keyword_index.py)
+KEYWORD_INDEX_MAGIC = b'CAKWIDX\x00'
+KEYWORD_INDEX_VERSION = 1
+HEADER = struct.Struct('<8sIIIQdQQQQQQQ')
+TERM_ENTRY = struct.Struct('<IHIQI')
+TOKEN_PATTERN = re.compile(r'\w+')
+MAX_TOKEN_CHARS = 32
+STOPWORDS = frozenset("""
+a an and are as at be but by for from had has have he her his i in is it its of on or
+our shall so that the their them they this to was were which with would ye you
+""".split())
+PHRASE_PATTERN = re.compile(r'"([^"]+)"')
+# Retry a failed load after this long (the index is otherwise reloaded per corpus version)
+KEYWORD_INDEX_RETRY_SECONDS = 300
+_NOT_LOADED = object()
+
+
+def tokenize(text: str) -> list:
+    """
+    (position, term) for each indexed token of a text (same rules as the builder)
+    """
+    tokens = TOKEN_PATTERN.findall(text.lower().replace('ſ', 's'))
+    return [(position, term) for position, term in enumerate(tokens)
+            if term not in STOPWORDS and len(term) <= MAX_TOKEN_CHARS]
+
+
+def parse_query(query: str) -> tuple:
+    """
+    (terms, phrases): the distinct indexed terms of the query, and each quoted
+    phrase as [(term, offset from the phrase's first indexed term)]
+    """
+    phrases = []
+    for phrase in PHRASE_PATTERN.findall(query):
+        tokens = tokenize(phrase)
+        if len(tokens) > 1:
+            phrases.append([(term, position - tokens[0][0]) for position, term in tokens])
+    terms = list(dict.fromkeys(term for _, term in tokenize(query)))
+    return terms, phrases
+
+
+def read_varint(data, pos: int) -> tuple:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def decode_positions(data, pos: int, end: int) -> list:
+    positions = []
+    value = 0
+    while pos < end:
+        delta = data[pos]
+        if delta < 0x80:
+            pos += 1
+        else:
+            delta, pos = read_varint(data, pos)
+        value += delta
+        positions.append(value)
+    return positions
+
+
+def decode_postings(data: bytes) -> tuple:
+    """
+    (doc ids, term frequencies, position block starts, position block ends) of a postings list
+    Single-byte varints (nearly all of them) take the fast path.
+    """
+    docs, tfs, starts, ends = [], [], [], []
+    pos = 0
+    doc = 0
+    size = len(data)
+    while pos < size:
+        delta = data[pos]
+        if delta < 0x80:
+            pos += 1
+        else:
+            delta, pos = read_varint(data, pos)
+        tf = data[pos]
+        if tf < 0x80:
+            pos += 1
+        else:
+            tf, pos = read_varint(data, pos)
+        length = data[pos]
+        if length < 0x80:
+            pos += 1
+        else:
+            length, pos = read_varint(data, pos)
+        doc += delta
+        docs.append(doc)
+        tfs.append(tf)
+        starts.append(pos)
+        pos += length
+        ends.append(pos)
+    return docs, tfs, starts, ends
+
+
+def filter_matches(metadata_filter, metadata: dict) -> bool:
+    """
+    Evaluate a Knowledge Base metadata filter against a document's metadata
+    Raises ValueError for operators keyword retrieval does not support.
+    """
+    if not metadata_filter:
+        return True
+    (operator, operand), = metadata_filter.items()
+    if operator == 'andAll':
+        return all(filter_matches(condition, metadata) for condition in operand)
+    if operator == 'orAll':
+        return any(filter_matches(condition, metadata) for condition in operand)
+    if operator == 'listContains':
+        # Chunk-level entity tags (persons, places) are not document metadata
+        items = metadata.get(operand['key'])
+        return isinstance(items, list) and str(operand['value']) in items
+    value = str(metadata.get(operand['key'], ''))
+    if operator == 'equals':
+        return value == str(operand['value'])
+    if operator == 'notEquals':
+        return value != str(operand['value'])
+    if operator == 'in':
+        return value in [str(item) for item in operand['value']]
+    if operator == 'notIn':
+        return value not in [str(item) for item in operand['value']]
+    if operator == 'stringContains':
+        return str(operand['value']) in value
+    raise ValueError(f"Unsupported filter operator {operator}")
+
+
+def best_passage(text: str, query: str, chars: int = KEYWORD_PASSAGE_CHARS) -> str:
+    """
+    The `chars`-long stretch of a document with the most distinct query terms
+    """
+    terms = set(term for _, term in tokenize(query))
+    matches = [(match.start(), match.group()) for match in TOKEN_PATTERN.finditer(text.lower().replace('ſ', 's'))
+               if match.group() in terms]
+    if not matches:
+        return text[:chars].strip()
+
+    best_start, best_count = matches[0][0], 0
+    counts = {}
+    left = 0
+    for start, term in matches:
+        counts[term] = counts.get(term, 0) + 1
+        while start - matches[left][0] > chars // 2:
+            left_term = matches[left][1]
+            counts[left_term] -= 1
+            if not counts[left_term]:
+                del counts[left_term]
+            left += 1
+        if len(counts) > best_count:
+            best_start, best_count = matches[left][0], len(counts)
+
+    begin = max(0, best_start - chars // 4)
+    # Start and end on word boundaries
+    if begin:
+        space = text.find(' ', begin)
+        begin = space + 1 if 0 <= space < best_start else begin
+    end = min(len(text), begin + chars)
+    if end < len(text):
+        space = text.rfind(' ', begin, end)
+        end = space if space > best_start else end
+    return text[begin:end].strip()
+
+
+class KeywordIndex:
+    """
+    A memory-mapped index file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.documents, self.terms, self.total_tokens, self.average_length,
+         self._postings, self._term_table, self._term_bytes, lengths, doc_offsets, self._doc_records,
+         info) = HEADER.unpack_from(self._map, 0)
+        if magic != KEYWORD_INDEX_MAGIC or version != KEYWORD_INDEX_VERSION:
+            raise ValueError(f"Not a version {KEYWORD_INDEX_VERSION} keyword index: {path}")
+        self.info = json.loads(self._map[info:])
+        self.fields = self.info['fields']
+        self.size = len(self._map)
+        # Per-document arrays are small (8 bytes a document) and read for every posting
+        self.lengths = array('I', self._map[lengths:lengths + 4 * self.documents])
+        self.doc_offsets = array('I', self._map[doc_offsets:doc_offsets + 4 * (self.documents + 1)])
+
+    def _term(self, index: int) -> bytes:
+        offset, length = struct.unpack_from('<IH', self._map, self._term_table + index * TERM_ENTRY.size)
+        start = self._term_bytes + offset
+        return self._map[start:start + length]
+
+    def lookup(self, term: str):
+        """
+        (document frequency, postings bytes) of a term, or None when it is not indexed
+        """
+        encoded = term.encode('utf-8')
+        low, high = 0, self.terms
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.terms or self._term(low) != encoded:
+            return None
+        _, _, df, offset, length = TERM_ENTRY.unpack_from(self._map, self._term_table + low * TERM_ENTRY.size)
+        start = self._postings + offset
+        return df, self._map[start:start + length]
+
+    def document(self, doc_id: int) -> tuple:
+        """
+        (S3 key, metadata) of a document
+        """
+        start = self._doc_records + self.doc_offsets[doc_id]
+        end = self._doc_records + self.doc_offsets[doc_id + 1]
+        key, *values = json.loads(self._map[start:end])
+        return key, {field: value for field, value in zip(self.fields, values) if value}
+
+    def _has_phrase(self, doc: int, phrase: list, postings: dict) -> bool:
+        """
+        Whether a document contains a phrase, from the positions of its terms
+        """
+        position_sets = []
+        for term, offset in phrase:
+            docs, _, starts, ends, data = postings[term]
+            index = bisect_left(docs, doc)
+            if index == len(docs) or docs[index] != doc:
+                return False
+            position_sets.append((offset, set(decode_positions(data, starts[index], ends[index]))))
+        first_offset, first_positions = position_sets[0]
+        return any(all(start - first_offset + offset in positions for offset, positions in position_sets[1:])
+                   for start in first_positions)
+
+    def search(self, query: str, limit: int = 10, accept=None) -> list:
+        """
+        Best documents for a query: [{"key", "score", "metadata"}], best first
+        `accept(metadata)` filters documents before they count against the limit.
+        """
+        terms, phrases = parse_query(query)
+        phrase_terms = {term for phrase in phrases for term, _ in phrase}
+        postings = {}
+        scores = {}
+        k1, b = KEYWORD_BM25_K1, KEYWORD_BM25_B
+        average_length = self.average_length or 1.0
+        lengths = self.lengths
+        scored = []
+        common = []
+        for term in terms:
+            entry = self.lookup(term)
+            if entry is None:
+                if term in phrase_terms:
+                    return []
+                continue
+            # Phrase terms are always read: their positions are needed however common they are
+            if entry[0] > self.documents * KEYWORD_MAX_DF_RATIO and term not in phrase_terms:
+                common.append((term, entry))
+            else:
+                scored.append((term, entry))
+        if not scored and common:
+            # Every term is common: rank by the rarest rather than return nothing
+            rarest = min(df for _, (df, _) in common)
+            scored = [(term, entry) for term, entry in common if entry[0] == rarest]
+
+        for term, (df, data) in scored:
+            docs, tfs, starts, ends = decode_postings(data)
+            postings[term] = (docs, tfs, starts, ends, data)
+            idf = math.log(1 + (self.documents - df + 0.5) / (df + 0.5))
+            for doc, tf in zip(docs, tfs):
+                norm = k1 * (1 - b + b * lengths[doc] / average_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        # Phrases and filters are checked in score order, only until the limit is reached
+        hits = []
+        for doc, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+            if not all(self._has_phrase(doc, phrase, postings) for phrase in phrases):
+                continue
+            key, metadata = self.document(doc)
+            if accept is not None and not accept(metadata):
+                continue
+            hits.append({'key': key, 'score': round(score, 4), 'metadata': metadata})
+            if len(hits) >= limit:
+                break
+        return hits
+
+
+class KeywordIndexLoader:
+    """
+    The container's KeywordIndex, downloaded and opened in a background thread
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str = KEYWORD_INDEX_KEY, directory: str = KEYWORD_INDEX_DIR,
+                 corpus_version=None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.directory = directory
+        self.corpus_version = corpus_version
+        self._index = None
+        self._etag = None
+        self._loaded_version = _NOT_LOADED
+        self._retry_at = 0.0
+        self._loading = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.bucket and self.key)
+
+    def _version(self):
+        try:
+            return self.corpus_version() if self.corpus_version else None
+        except Exception:
+            return None if self._loaded_version is _NOT_LOADED else self._loaded_version
+
+    def _load(self, version):
+        started = time.perf_counter()
+        try:
+            head = self.s3_client.head_object(Bucket=self.bucket, Key=self.key)
+            etag = head.get('ETag', '')
+            if etag != self._etag:
+                free = shutil.disk_usage(self.directory).free
+                if head['ContentLength'] > free:
+                    raise ValueError(f"{head['ContentLength']} bytes do not fit in {free} bytes of ephemeral storage")
+                path = os.path.join(self.directory, f"keyword_index-{etag.strip(chr(34))}.bin")
+                self.s3_client.download_file(self.bucket, self.key, path)
+                index = KeywordIndex(path)
+                previous, self._index, self._etag = self._index, index, etag
+                if previous is not None:
+                    # Readers still holding the previous index keep their mapping after the unlink
+                    os.remove(previous.path)
+                log.info("Keyword index loaded", documents=index.documents, terms=index.terms, size=index.size,
+                         corpus_version=version, load_ms=round((time.perf_counter() - started) * 1000, 1))
+            self._loaded_version = version
+        except ClientError as e:
+            log.warning("Keyword index unavailable", key=self.key, error_code=e.response['Error']['Code'])
+            self._retry_at = time.time() + KEYWORD_INDEX_RETRY_SECONDS
+        except Exception as e:
+            log.warning("Keyword index unreadable: %s", e, key=self.key)
+            self._retry_at = time.time() + KEYWORD_INDEX_RETRY_SECONDS
+        finally:
+            self._loading = False
+
+    def preload(self):
+        """
+        Start loading in the background when the corpus version changed; returns immediately
+        """
+        if not self.enabled or time.time() < self._retry_at:
+            return
+        with self._lock:
+            version = self._version()
+            if self._loading or version == self._loaded_version:
+                return
+            self._loading = True
+        threading.Thread(target=self._load, args=(version,), daemon=True).start()
+
+    def get(self):
+        """
+        The loaded index, or None while it is loading or unavailable
+        """
+        if self.enabled and not self._loading:
+            self.preload()
+        return self._index
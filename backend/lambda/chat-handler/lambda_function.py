@@ -6,123 +6,319 @@ Uses Neptune Analytics graph through Knowledge Base for entity extraction
 
 import json
 import os
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import boto3
+from botocore.config import Config
 
-bedrock_agent_runtime = boto3.client('bedrock-agent-runtime')
+from admission import AdmissionRejected, create_admission_controller
+from answer_cache import create_answer_cache, normalize_question
+from batch_jobs import create_batch_store, new_status, parse_batch_request, questions_per_minute
+from bill_parser import extract_bill_references
+from context_selection import CONTEXT_MAX_TOKENS, select_context, reciprocal_rank_fusion
+from document_index import DocumentIndex
+from keyword_index import KeywordIndexLoader, best_passage, filter_matches
+from deadline import call_with_retries, remaining_ms, request_deadline, run_hedged
+from retrieval_cache import RetrievalCache
+from prompt_cache import (CACHE_POINT, PROMPT_CACHE_ENABLED, PROMPT_CACHE_MIN_TOKENS, PromptCacheStats, estimate_tokens,
+                          supports_prompt_caching)
+from query_policy import FAST_MODEL_ID, choose_plan, load_policy, log_plan_outcome
+from query_router import extract_query_cues, build_cue_filter, decompose_question, person_filter, relax_cues
+from request_timing import NULL_TIMER, start_timer
+from structured_log import get_logger
+from source_index import (DocumentCache, SourceIndex, compact_sources, page_count, page_text,
+                          parse_page_range, parse_source_id)
+from search import (SEARCH_DEPTH, SEARCH_SNIPPET_CHARS, fuse_documents, group_documents, parse_search_request,
+                    search_page)
+from semantic_cache import SemanticCache, embed_question, quantize, partition_key
+from stream_store import create_stream_store, read_stream_page, now_ms
+
+from botocore.exceptions import ClientError
+
+# Shared JSON logger (Lambda layer); payload dumps are DEBUG and sampled
+log = get_logger('chat-handler')
+
+# Throttling retries are done by call_with_retries within the request deadline,
+# so the SDK's own retries (which know nothing about the deadline) are turned off
+bedrock_config = Config(retries={'mode': 'standard', 'total_max_attempts': 1})
+bedrock_agent_runtime = boto3.client('bedrock-agent-runtime', config=bedrock_config)
+bedrock_runtime = boto3.client('bedrock-runtime', config=bedrock_config)
+lambda_client = boto3.client('lambda')
+s3_client = boto3.client('s3')
 
 BEDROCK_MODEL_ID = os.environ.get('MODEL_ID', 'anthropic.claude-3-5-sonnet-20241022-v2:0')
 KNOWLEDGE_BASE_ID = os.environ.get('KNOWLEDGE_BASE_ID', '')
+DATA_BUCKET_NAME = os.environ.get('DATA_BUCKET_NAME', '')
+
+# Exact bill lookups read bills/congress_{n}/{type}_{num}.txt directly instead of vector search
+DIRECT_FETCH_ENABLED = os.environ.get('DIRECT_FETCH_ENABLED', 'true').lower() == 'true'
+DIRECT_FETCH_MAX_TOKENS = int(os.environ.get('DIRECT_FETCH_MAX_TOKENS', '12000'))
+# Rough characters-per-token ratio used to trim documents to the token budget
+CHARS_PER_TOKEN = 4
+
+# 'two_step': retrieve, prune the results locally, then generate from the pruned context
+# 'retrieve_and_generate': let the Knowledge Base pass all results to the model
+RETRIEVAL_MODE = os.environ.get('RETRIEVAL_MODE', 'two_step')
+RETRIEVE_RESULTS = int(os.environ.get('RETRIEVE_RESULTS', '50'))
+# Pick model tier, output tokens and retrieval depth per query (see query_policy)
+ADAPTIVE_QUERY_POLICY_ENABLED = os.environ.get('ADAPTIVE_QUERY_POLICY_ENABLED', 'true').lower() == 'true'
+
+# Federated retrieval: when a question does not pin the document type, search bills
+# and newspapers separately (and each side of a comparison) in parallel, then fuse
+FEDERATED_RETRIEVAL_ENABLED = os.environ.get('FEDERATED_RETRIEVAL_ENABLED', 'true').lower() == 'true'
+FEDERATED_RESULTS_PER_SEARCH = int(os.environ.get('FEDERATED_RESULTS_PER_SEARCH', '25'))
+FEDERATED_MAX_SEARCHES = int(os.environ.get('FEDERATED_MAX_SEARCHES', '6'))
+FEDERATED_SOURCE_TYPES = ['bill', 'newspaper']
+
+# Hybrid retrieval: BM25 results from the keyword index (exact names, OCR spellings) are
+# fused with the vector results, and answer alone when Knowledge Base retrieval fails; 0 disables
+HYBRID_KEYWORD_RESULTS = int(os.environ.get('HYBRID_KEYWORD_RESULTS', '5'))
+retrieval_executor = ThreadPoolExecutor(max_workers=FEDERATED_MAX_SEARCHES + 1)
+# Reads of keyword-matched documents for their passages
+passage_executor = ThreadPoolExecutor(max_workers=8)
+
+# Hedged generation: if the primary plan has not answered by HEDGE_AFTER_FRACTION of the
+# request deadline, race it against the fast model with a reduced context (see deadline)
+HEDGING_ENABLED = os.environ.get('HEDGING_ENABLED', 'true').lower() == 'true'
+HEDGE_MAX_TOKENS = int(os.environ.get('HEDGE_MAX_TOKENS', '800'))
+HEDGE_RETRIEVE_RESULTS = int(os.environ.get('HEDGE_RETRIEVE_RESULTS', '20'))
+HEDGE_CONTEXT_MAX_TOKENS = int(os.environ.get('HEDGE_CONTEXT_MAX_TOKENS', '3000'))
+# Plan budgets the hedge reduces
+HEDGE_BUDGETS = ('max_tokens', 'retrieve_results', 'context_max_tokens')
+
+ANSWER_CACHE_ENABLED = os.environ.get('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+SEMANTIC_CACHE_ENABLED = os.environ.get('SEMANTIC_CACHE_ENABLED', 'true').lower() == 'true'
+RETRIEVAL_CACHE_ENABLED = os.environ.get('RETRIEVAL_CACHE_ENABLED', 'true').lower() == 'true'
+
+# Shared answer cache (DynamoDB when ANSWER_CACHE_TABLE is set, in-memory otherwise)
+answer_cache = create_answer_cache() if ANSWER_CACHE_ENABLED else None
+
+# Shared token bucket with per-persona priority lanes in front of Bedrock generation
+admission = create_admission_controller()
+
+# Per-container nearest-neighbour cache for near-duplicate questions
+semantic_cache = SemanticCache() if SEMANTIC_CACHE_ENABLED else None
+
+# Per-container cache of retrieve results, shared by all personas and languages
+retrieval_cache = RetrievalCache() if RETRIEVAL_CACHE_ENABLED else None
+
+# Incremental output of streaming chats (DynamoDB when STREAM_TABLE is set, in-memory otherwise)
+stream_store = create_stream_store()
+# Flush generated text to the stream store at most this often (or when the buffer is large)
+STREAM_FLUSH_INTERVAL_MS = int(os.environ.get('STREAM_FLUSH_INTERVAL_MS', '150'))
+STREAM_FLUSH_CHARS = int(os.environ.get('STREAM_FLUSH_CHARS', '400'))
+
+# Batch chats (POST /chat/batch): answered asynchronously by the batch worker function
+batch_store = create_batch_store()
+BATCH_WORKER_FUNCTION = os.environ.get('BATCH_WORKER_FUNCTION', '')
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', '4'))
+# Stop starting questions with this much invocation time left; a new invocation continues
+BATCH_CONTINUE_MARGIN_MS = int(os.environ.get('BATCH_CONTINUE_MARGIN_MS', '180000'))
+# Longest one batch question may take (generation, hedge and retries); less than the margin,
+# so a question started just before it still finishes within the invocation
+BATCH_QUESTION_MAX_MS = int(os.environ.get('BATCH_QUESTION_MAX_MS', '120000'))
+# How often the worker rewrites results.jsonl and status.json
+BATCH_CHECKPOINT_SECONDS = int(os.environ.get('BATCH_CHECKPOINT_SECONDS', '15'))
+# Consecutive invocations without a new result before the batch is given up as incomplete
+BATCH_MAX_IDLE_INVOCATIONS = int(os.environ.get('BATCH_MAX_IDLE_INVOCATIONS', '3'))
+# Admission lane for batch questions, below the interactive personas
+BATCH_ADMISSION_LANE = 'batch'
+
+# Per-persona prompt cache savings (Converse usage)
+prompt_cache_stats = PromptCacheStats()
+
+# Full document text served by GET /sources/{id}, kept per container
+source_documents = DocumentCache()
+SOURCE_CACHE_MAX_AGE_SECONDS = int(os.environ.get('SOURCE_CACHE_MAX_AGE_SECONDS', '3600'))
+
+# Public URL, title, date and type of every document, from the collector's index;
+# reloaded when the corpus version changes
+document_index = DocumentIndex(s3_client, DATA_BUCKET_NAME,
+                               corpus_version=answer_cache.corpus_version if answer_cache else None)
+
+# BM25 inverted index over the corpus from the collector, memory-mapped from /tmp;
+# the download starts at cold start and keyword retrieval is skipped until it is ready
+keyword_index = KeywordIndexLoader(s3_client, DATA_BUCKET_NAME,
+                                   corpus_version=answer_cache.corpus_version if answer_cache else None)
+keyword_index.preload()
+
+# Resolved once per container (see get_resolved_config)
+_resolved_config = None
+_resolved_config_lock = threading.Lock()
+
+def api_response(status_code: int, payload: dict, timer=NULL_TIMER, headers: dict = None) -> dict:
+    """
+    Build an API Gateway proxy response with JSON body and CORS headers
+    With a request timer, serialization is timed, the phases are returned in a
+    Server-Timing header and emitted as an EMF metric record.
+    Bodies are gzip-compressed by API Gateway for clients that accept it.
+    """
+    with timer.phase('serialize'):
+        body = json.dumps(payload, separators=(',', ':'))
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        **(headers or {})
+    }
+    if timer.enabled:
+        headers['Server-Timing'] = timer.server_timing()
+        headers['Timing-Allow-Origin'] = '*'
+        timer.emit(status_code)
+    # Let the browser frontend read these headers (and the Resource Timing entries)
+    exposed = [name for name in ('Server-Timing', 'Retry-After') if name in headers]
+    if exposed:
+        headers['Access-Control-Expose-Headers'] = ', '.join(exposed)
+    return {
+        'statusCode': status_code,
+        'headers': headers,
+        'body': body
+    }
+
 
 def lambda_handler(event, context):
     """
     Handle chat requests
     
     GET /health - Health check
-    POST /chat - Chat query
+    POST /chat - Chat query ({"stream": true} starts a streaming chat)
+    GET /chat/stream/{streamId}?cursor=N&source_cursor=M - Poll a streaming chat
+    POST /chat/batch - Start a batch of questions
+    GET /chat/batch/{jobId} - Batch progress, throughput and results
+    POST /search - Ranked documents and facets, without generating an answer
+    GET /sources/{sourceId}?pages=2-4 - Full text of a cited document, by page
+    
+    Internal: {"stream_job": {...}} - Asynchronous streaming worker invocation
+              {"batch_job": {...}} - Batch worker invocation
     """
-    print(f"Event: {json.dumps(event)}")
+    log.bind(context)
+    
+    # Streaming worker (invoked asynchronously by POST /chat with stream: true)
+    if 'stream_job' in event:
+        return run_stream_job(event['stream_job'], context)
+    
+    # Batch worker (invoked asynchronously by POST /chat/batch, then by itself)
+    if 'batch_job' in event:
+        return run_batch_job(event['batch_job'], context)
+    
+    log.debug("Event", event=event)
     
+    # Phase timing for the Server-Timing header and EMF metrics
+    timer = start_timer()
     http_method = event.get('httpMethod', 'POST')
     
-    # Health check
+    # Poll a streaming chat
+    if http_method == 'GET' and (event.get('pathParameters') or {}).get('streamId'):
+        timer.dimension('Operation', 'stream_poll')
+        return handle_stream_poll(event, timer)
+    
+    # Batch progress
+    if http_method == 'GET' and (event.get('pathParameters') or {}).get('jobId'):
+        timer.dimension('Operation', 'batch_poll')
+        return handle_batch_poll(event, timer)
+    
+    # Start a batch
+    if http_method == 'POST' and (event.get('resource') or '').endswith('/chat/batch'):
+        timer.dimension('Operation', 'batch_start')
+        return start_batch(event, context, timer)
+    
+    # Retrieval-only search
+    if http_method == 'POST' and (event.get('resource') or '').endswith('/search'):
+        timer.dimension('Operation', 'search')
+        return handle_search(event, context, timer)
+    
+    # Full text of a cited document
+    if http_method == 'GET' and (event.get('pathParameters') or {}).get('sourceId'):
+        timer.dimension('Operation', 'source')
+        return handle_source_request(event, timer)
+    
+    # Health check (also warms the container's resolved configuration)
     if http_method == 'GET':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'status': 'healthy',
-                'service': 'chronicling-america-chat',
-                'knowledge_base_id': KNOWLEDGE_BASE_ID,
-                'model_id': BEDROCK_MODEL_ID
-            })
-        }
+        timer.dimension('Operation', 'health')
+        with timer.phase('config'):
+            config = warm_up(context)
+        return api_response(200, {
+            'status': 'healthy',
+            'service': 'chronicling-america-chat',
+            'knowledge_base_id': KNOWLEDGE_BASE_ID,
+            'model_id': BEDROCK_MODEL_ID,
+            'model_arn': config['model_arn'],
+            'prompt_caching': config['prompt_caching'],
+            'prompt_cache': prompt_cache_stats.summary(),
+            'warm': True
+        }, timer)
     
-    # Chat query
+    # Chat query: everything below has to finish before API Gateway gives up
+    deadline = request_deadline(context)
+    timer.dimension('Operation', 'chat')
     try:
-        body = json.loads(event.get('body', '{}'))
-        # Handle both 'message' (from frontend) and 'question' (legacy) fields
-        question = body.get('message', body.get('question', ''))
-        language = body.get('language', 'en')
-        persona = body.get('persona', 'general')  # congressional_staffer, research_journalist, law_student, general
+        with timer.phase('parse'):
+            body = json.loads(event.get('body', '{}'))
+            # Handle both 'message' (from frontend) and 'question' (legacy) fields
+            question = body.get('message', body.get('question', ''))
+            language = body.get('language', 'en')
+            # congressional_staffer, research_journalist, law_student, general (unknown -> general)
+            persona = normalize_persona(body.get('persona', 'general'))
         
         if not question:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'Message is required'})
-            }
+            return api_response(400, {'error': 'Message is required'}, timer)
+        timer.dimension('Persona', persona)
         
-        print(f"Question: {question}")
-        print(f"Language: {language}")
-        print(f"Persona: {persona}")
+        log.info("Chat request", question=question, language=language, persona=persona)
         
         # Check if Knowledge Base is configured
         if not KNOWLEDGE_BASE_ID:
-            print("ERROR: KNOWLEDGE_BASE_ID not set")
-            return {
-                'statusCode': 503,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'error': 'Knowledge Base not configured yet. Please run the deployment pipeline first.'
-                })
-            }
+            log.error("KNOWLEDGE_BASE_ID not set")
+            return api_response(503, {
+                'error': 'Knowledge Base not configured yet. Please run the deployment pipeline first.'
+            }, timer)
+        
+        # Resolve account/model ARN once per container (no STS call when the ARN is known)
+        with timer.phase('config'):
+            get_resolved_config(context)
+        
+        # Streaming chat: answer cached questions directly, otherwise start a stream
+        if body.get('stream'):
+            timer.dimension('Operation', 'stream_start')
+            return start_stream(question, persona, language, context, timer)
         
         # Query Knowledge Base (handles both specific bills and general queries)
-        response = query_knowledge_base(question, persona)
+        with timer.phase('route'):
+            route = route_query(question)
+        response = query_knowledge_base(question, persona, language, route, deadline, timer)
+        sources, citations = compact_sources(response.get('sources', []), response.get('citations'), DATA_BUCKET_NAME)
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'message': response['answer'],  # Frontend expects 'message' field
-                'answer': response['answer'],   # Keep 'answer' for compatibility
-                'sources': response.get('sources', []),
-                'entities': response.get('entities', [])
-            })
-        }
+        return api_response(200, {
+            'message': response['answer'],
+            'sources': sources,      # One entry per document; full text via GET /sources/{id}
+            'citations': citations,  # Answer spans or context markers -> indexes into sources
+            'entities': response.get('entities', []),
+            'route': route_summary(route),  # Metadata filter chosen for retrieval
+            'metrics': response.get('metrics'),  # Retrieval mode, prompt tokens and latency
+            'cached': response.get('cached', False)
+        }, timer)
         
+    except AdmissionRejected as e:
+        return busy_response(e, timer)
     except Exception as e:
         # Log detailed error for debugging
-        print(f"ERROR in lambda_handler: {type(e).__name__}: {str(e)}")
-        import traceback
-        print(f"Full traceback: {traceback.format_exc()}")
+        log.error("Unhandled error in lambda_handler: %s: %s", type(e).__name__, e, exc_info=True)
         
-        # Return user-friendly error message
-        return {
-            'statusCode': 200,  # Return 200 to avoid frontend errors
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'message': "I'm sorry, I encountered an unexpected error. Please try again in a moment.",
-                'answer': "I'm sorry, I encountered an unexpected error. Please try again in a moment.",
-                'sources': [],
-                'entities': [],
-                'error': True
-            })
-        }
+        # Return user-friendly error message (200 to avoid frontend errors)
+        return api_response(200, {
+            'message': "I'm sorry, I encountered an unexpected error. Please try again in a moment.",
+            'sources': [],
+            'entities': [],
+            'error': True
+        }, timer)
 
 
 
-def get_persona_prompt(persona: str) -> str:
-    """
-    Get system prompt based on user persona
-    """
-    prompts = {
-        'congressional_staffer': """You are an expert constitutional research assistant for Congressional staff. 
+PERSONA_PROMPTS = {
+    'congressional_staffer': """You are an expert constitutional research assistant for Congressional staff. 
 Your responses should be:
 - Precise and authoritative with specific citations
 - Focused on precedent and constitutional interpretation
@@ -131,8 +327,8 @@ Your responses should be:
 - Use formal, professional language suitable for briefing members of Congress
 - Cite specific articles, sections, and amendments
 - Reference relevant Supreme Court cases with case names and years""",
-        
-        'research_journalist': """You are a constitutional expert helping journalists research stories.
+    
+    'research_journalist': """You are a constitutional expert helping journalists research stories.
 Your responses should be:
 - Provide cultural and historical context from the era
 - Explain constitutional language in accessible terms
@@ -141,8 +337,8 @@ Your responses should be:
 - Explain the "why" behind constitutional decisions
 - Reference the social and political climate of the time
 - Use clear, engaging language suitable for news articles""",
-        
-        'law_student': """You are a constitutional law professor helping students learn.
+    
+    'law_student': """You are a constitutional law professor helping students learn.
 Your responses should be:
 - Educational and comprehensive
 - Explain legal reasoning and constitutional theory
@@ -152,8 +348,8 @@ Your responses should be:
 - Connect constitutional provisions to broader legal principles
 - Use precise legal terminology with explanations
 - Encourage critical thinking about constitutional questions""",
-        
-        'general': """You are a knowledgeable constitutional expert.
+    
+    'general': """You are a knowledgeable constitutional expert.
 Your responses should be:
 - Clear and informative
 - Balanced and objective
@@ -161,243 +357,997 @@ Your responses should be:
 - Cite specific constitutional provisions
 - Reference important court cases when relevant
 - Use accessible language while maintaining accuracy"""
-    }
+}
+
+
+def normalize_persona(persona) -> str:
+    """
+    The PERSONA_PROMPTS key for a requested persona; unknown ones are answered,
+    admitted and measured (a bounded EMF dimension) as general
+    """
+    return persona if isinstance(persona, str) and persona in PERSONA_PROMPTS else 'general'
+
+
+def get_persona_prompt(persona: str) -> str:
+    """
+    Get system prompt based on user persona
+    """
+    return PERSONA_PROMPTS.get(persona, PERSONA_PROMPTS['general'])
+
+
+def build_prompt_template(persona: str) -> str:
+    """
+    Build the full generation prompt template for a persona
+    $search_results$ and $query$ are filled in by the Knowledge Base
+    """
+    return f"""{get_persona_prompt(persona)}
+
+Use the following context to answer the question. Provide a well-formatted response.
+
+Context:
+$search_results$
+
+Question: $query$
+
+Answer:"""
+
+
+def build_system_prompt(persona: str) -> str:
+    """
+    Stable system prompt for Converse requests: persona prompt plus answering
+    instructions. Identical for every request of a persona, so it forms the
+    cacheable prompt prefix.
+    """
+    return f"""{get_persona_prompt(persona)}
+
+Answer the question using only the context provided with it. Provide a well-formatted response.
+If the context does not contain the answer, say so."""
+
+
+def build_model_arn(model_id: str, aws_region: str, account_id: str = None) -> str:
+    """
+    Build the model ARN for a foundation model or a cross-region inference profile
+    """
+    if model_id.startswith(('us.', 'eu.', 'global.')):
+        return f'arn:aws:bedrock:{aws_region}:{account_id}:inference-profile/{model_id}'
+    return f'arn:aws:bedrock:{aws_region}::foundation-model/{model_id}'
+
+
+def resolve_account_id(context=None) -> str:
+    """
+    Resolve the AWS account ID without a network call when possible
+    Order: AWS_ACCOUNT_ID env var, the invoked function ARN, then STS
+    """
+    account_id = os.environ.get('AWS_ACCOUNT_ID')
+    if account_id:
+        return account_id
+    
+    function_arn = getattr(context, 'invoked_function_arn', '') or ''
+    arn_parts = function_arn.split(':')
+    if len(arn_parts) > 4 and arn_parts[4]:
+        return arn_parts[4]
     
-    return prompts.get(persona, prompts['general'])
+    return boto3.client('sts').get_caller_identity()['Account']
 
 
-def extract_bill_info(question: str) -> dict:
+def get_resolved_config(context=None) -> dict:
     """
-    Extract bill information from user question for metadata filtering
+    Configuration resolved once per container: account, region, model ARN and
+    the per-persona prompt templates. Lazily initialized and thread-safe.
+    """
+    global _resolved_config
+    if _resolved_config is not None:
+        return _resolved_config
+    
+    with _resolved_config_lock:
+        if _resolved_config is None:
+            aws_region = os.environ.get("AWS_REGION", "us-east-1")
+            model_ids = {'strong': BEDROCK_MODEL_ID, 'fast': FAST_MODEL_ID}
+            # Only inference profile ARNs need the account ID
+            account_id = None
+            if any(model_id.startswith(('us.', 'eu.', 'global.')) for model_id in model_ids.values()):
+                account_id = resolve_account_id(context)
+            
+            model_tiers = {
+                tier: {
+                    'model_id': model_id,
+                    'model_arn': build_model_arn(model_id, aws_region, account_id),
+                    'prompt_caching': supports_prompt_caching(model_id),
+                }
+                for tier, model_id in model_ids.items()
+            }
+            if PROMPT_CACHE_ENABLED and not any(tier['prompt_caching'] for tier in model_tiers.values()):
+                log.info("Prompt caching is enabled but neither model supports it", models=list(model_ids.values()))
+            _resolved_config = {
+                'account_id': account_id,
+                'region': aws_region,
+                'model_id': BEDROCK_MODEL_ID,
+                'model_arn': model_tiers['strong']['model_arn'],
+                'prompt_templates': {persona: build_prompt_template(persona) for persona in PERSONA_PROMPTS},
+                'system_prompts': {persona: build_system_prompt(persona) for persona in PERSONA_PROMPTS},
+                'prompt_caching': model_tiers['strong']['prompt_caching'],
+                'model_tiers': model_tiers,
+                'query_policy': load_policy(),
+            }
+            log.info("Resolved config", region=aws_region, model_arn=_resolved_config['model_arn'])
+    
+    return _resolved_config
+
+
+def plan_query(question: str, persona: str, route: dict, deadline: float = None) -> dict:
+    """
+    Choose model tier, output token budget and retrieval depth for a request
+    With the adaptive policy disabled every request gets the strong model,
+    2000 output tokens and RETRIEVE_RESULTS results. The request deadline
+    travels with the plan so every Bedrock call can respect it.
+    """
+    config = get_resolved_config()
+    if ADAPTIVE_QUERY_POLICY_ENABLED:
+        plan = choose_plan(question, persona, route, config['query_policy'], config['model_tiers'])
+    else:
+        plan = {
+            'complexity': 'fixed',
+            'reasons': [],
+            'persona': persona,
+            'tier': 'strong',
+            **config['model_tiers']['strong'],
+            'max_tokens': 2000,
+            'retrieve_results': RETRIEVE_RESULTS,
+            'context_max_tokens': CONTEXT_MAX_TOKENS,
+        }
+    plan['deadline'] = deadline
+    log.info("Query plan", plan=lambda: {**plan_summary(plan), 'reasons': plan['reasons']},
+             budget_ms=lambda: remaining_ms(deadline))
+    return plan
+
+
+def build_hedge_plan(plan: dict) -> dict:
+    """
+    The hedge for a plan: the fast model with fewer output tokens and a reduced context
+    """
+    config = get_resolved_config()
+    return {
+        **plan,
+        'tier': 'fast',
+        **config['model_tiers']['fast'],
+        'max_tokens': min(plan['max_tokens'], HEDGE_MAX_TOKENS),
+        'retrieve_results': min(plan['retrieve_results'], HEDGE_RETRIEVE_RESULTS),
+        'context_max_tokens': min(plan['context_max_tokens'], HEDGE_CONTEXT_MAX_TOKENS),
+    }
+
+
+def plan_summary(plan: dict) -> dict:
+    """
+    The plan as reported in response metrics
+    """
+    return {key: plan[key] for key in ('complexity', 'tier', 'model_id', 'max_tokens', 'retrieve_results')}
+
+
+def warm_up(context=None) -> dict:
+    """
+    Warm-up hook for GET /health: resolves the container configuration so the
+    first chat request does not pay for it
+    """
+    return get_resolved_config(context)
+
+
+def extract_bill_info(question: str) -> list:
+    """
+    Extract every bill referenced in the user question for metadata filtering
+    See bill_parser.extract_bill_references for the supported citation styles.
     
     Examples:
-    - "what is bill HR 1 in congress 6?" -> {"congress": "6", "bill_type": "HR", "bill_number": "1"}
-    - "show me bill S 2 from congress 16" -> {"congress": "16", "bill_type": "S", "bill_number": "2"}
-    - "tell me about HR1 congress 6" -> {"congress": "6", "bill_type": "HR", "bill_number": "1"}
+    - "what is bill HR 1 in congress 6?" -> [{"congress": "6", "bill_type": "HR", "bill_number": "1"}]
+    - "compare H.R. 12 and S. 4 of the Sixth Congress" -> HR 12 and S 4, both congress 6
+    """
+    bill_info = extract_bill_references(question)
+    log.debug("Extracted bill info", bills=bill_info)
+    return bill_info
+
+
+def build_bill_filter(bill: dict) -> dict:
+    """
+    Filter matching one bill on the mapped S3 metadata attributes
+    """
+    filters = [
+        {"equals": {"key": key, "value": bill[key]}}
+        for key in ('congress', 'bill_type', 'bill_number')
+        if key in bill
+    ]
+    if len(filters) == 1:
+        return filters[0]
+    return {"andAll": filters}
+
+
+def build_metadata_filter(bill_info: list) -> dict:
     """
-    import re
+    Build metadata filter for Knowledge Base using mapped S3 metadata attributes
+    Several bills are combined with orAll so one retrieval covers all of them
+    """
+    if not bill_info:
+        return None
     
-    # Normalize question to lowercase for pattern matching
-    q = question.lower()
+    filters = [build_bill_filter(bill) for bill in bill_info]
+    if len(filters) == 1:
+        return filters[0]
+    return {"orAll": filters}
+
+
+def route_query(question: str) -> dict:
+    """
+    Decide how to narrow retrieval for a question
     
-    bill_info = {}
+    Bill references give the most precise filter; otherwise year, congress, place,
+    newspaper title and document-type cues are mapped onto the S3 metadata fields.
     
-    # Pattern 1: "bill HR 1 in congress 6" or "bill HR1 congress 6"
-    pattern1 = r'bill\s+([a-z]+)\s*(\d+).*congress\s+(\d+)'
-    match1 = re.search(pattern1, q)
-    if match1:
-        bill_info = {
-            "bill_type": match1.group(1).upper(),
-            "bill_number": match1.group(2),
-            "congress": match1.group(3)
+    Returns: {"bills": [...], "filter": metadata filter or None, "cues": {...}}
+    """
+    bill_info = extract_bill_info(question)
+    if bill_info:
+        route = {'bills': bill_info, 'filter': build_metadata_filter(bill_info), 'cues': {'bills': bill_info}}
+    else:
+        cues = extract_query_cues(question)
+        route = {'bills': [], 'filter': build_cue_filter(cues), 'cues': cues}
+    log.info("Query route", cues=route['cues'], filter=route['filter'])
+    return route
+
+
+def relaxed_route(route: dict):
+    """
+    The route to retry with when a cue-filtered search found nothing, or None
+    Bill references stay strict: a cited bill has no substitute.
+    """
+    if route['bills'] or not route['filter']:
+        return None
+    cues = relax_cues(route['cues'])
+    return {'bills': [], 'filter': build_cue_filter(cues), 'cues': cues}
+
+
+def route_summary(route: dict) -> dict:
+    """
+    The routing decision as reported in chat responses
+    """
+    return {'filter': route['filter'], 'cues': route['cues']}
+
+
+NO_SOURCES_ANSWER = "I don't have access to the historical documents yet. The Knowledge Base may still be syncing or needs to be populated with data. Please try again later or contact support."
+
+
+def build_retrieval_config(metadata_filter: dict, number_of_results: int = RETRIEVE_RESULTS) -> dict:
+    """
+    Build the vector search configuration shared by retrieve and retrieve_and_generate
+    """
+    retrieval_config = {
+        'vectorSearchConfiguration': {
+            'numberOfResults': number_of_results,
+            'overrideSearchType': 'SEMANTIC'
         }
+    }
     
-    # Pattern 2: "HR 1 from congress 6" or "S2 congress 16"
-    pattern2 = r'([a-z]+)\s*(\d+).*congress\s+(\d+)'
-    match2 = re.search(pattern2, q)
-    if match2 and not match1:  # Only if pattern1 didn't match
-        bill_info = {
-            "bill_type": match2.group(1).upper(),
-            "bill_number": match2.group(2),
-            "congress": match2.group(3)
-        }
+    # Add metadata filter only when bills or routing cues were detected
+    if metadata_filter:
+        retrieval_config['vectorSearchConfiguration']['filter'] = metadata_filter
+        log.debug("Applying metadata filter to narrow retrieval")
+    else:
+        log.debug("General query - searching all documents")
+    return retrieval_config
+
+
+def build_retrieve_and_generate_config(persona: str, metadata_filter: dict, plan: dict) -> dict:
+    """
+    Build the retrieveAndGenerateConfiguration shared by the blocking and streaming paths
+    """
+    # Model ARNs and prompt templates are resolved once per container
+    config = get_resolved_config()
+    model_arn = plan['model_arn']
+    prompt_template = config['prompt_templates'].get(persona, config['prompt_templates']['general'])
+    retrieval_config = build_retrieval_config(metadata_filter, plan['retrieve_results'])
     
-    # Pattern 3: "congress 6 bill HR 1"
-    pattern3 = r'congress\s+(\d+).*bill\s+([a-z]+)\s*(\d+)'
-    match3 = re.search(pattern3, q)
-    if match3 and not match1 and not match2:
-        bill_info = {
-            "congress": match3.group(1),
-            "bill_type": match3.group(2).upper(),
-            "bill_number": match3.group(3)
+    return {
+        'type': 'KNOWLEDGE_BASE',
+        'knowledgeBaseConfiguration': {
+            'knowledgeBaseId': KNOWLEDGE_BASE_ID,
+            'modelArn': model_arn,
+            'generationConfiguration': {
+                'promptTemplate': {
+                    'textPromptTemplate': prompt_template
+                },
+                'inferenceConfig': {
+                    'textInferenceConfig': {
+                        'temperature': 0.1,
+                        'maxTokens': plan['max_tokens']
+                    }
+                }
+            },
+            'retrievalConfiguration': retrieval_config
         }
+    }
+
+
+def lookup_cached_answer(question: str, persona: str, language: str, metadata_filter: dict):
+    """
+    Look the question up in the answer cache, then the semantic cache
     
-    print(f"Extracted bill info from '{question}': {bill_info}")
-    return bill_info
+    Returns: (cached_result or None, cache_state) - pass cache_state to store_answer()
+    after generating so both caches learn the new answer
+    """
+    cache_state = {'cache_key': None, 'semantic_partition': None, 'semantic_vector': None}
+    
+    # Serve repeated questions from the answer cache
+    if answer_cache:
+        cache_state['cache_key'] = answer_cache.make_key(question, persona, language, metadata_filter)
+        cached_answer = answer_cache.get(cache_state['cache_key'])
+        log.info("Answer cache %s", 'hit' if cached_answer else 'miss', stats=answer_cache.stats)
+        if cached_answer:
+            return {**cached_answer, 'cached': True}, cache_state
+    
+    # Serve near-duplicate phrasings from the semantic cache
+    if semantic_cache:
+        try:
+            corpus_version = answer_cache.corpus_version() if answer_cache else 0
+            semantic_partition = partition_key(persona, language, metadata_filter, question, corpus_version)
+            semantic_vector = quantize(embed_question(question))
+            similar_answer, similarity = semantic_cache.lookup(semantic_partition, semantic_vector)
+            log.info("Semantic cache %s", 'hit' if similar_answer else 'miss',
+                     similarity=round(similarity, 3), stats=semantic_cache.stats)
+            if similar_answer:
+                if cache_state['cache_key']:
+                    answer_cache.put(cache_state['cache_key'], similar_answer)
+                return {**similar_answer, 'cached': True}, cache_state
+            cache_state['semantic_partition'] = semantic_partition
+            cache_state['semantic_vector'] = semantic_vector
+        except Exception as e:
+            log.warning("Semantic cache lookup failed: %s", e)
+    
+    return None, cache_state
 
 
-def build_metadata_filter(bill_info: dict) -> dict:
+def store_answer(cache_state: dict, result: dict):
     """
-    Build metadata filter for Knowledge Base using mapped S3 metadata attributes
-    Now that we have proper metadata mapping, these filters will work
+    Store a freshly generated answer in the answer and semantic caches
+    Per-request metrics are not cached.
     """
-    if not bill_info:
+    result = {key: value for key, value in result.items() if key != 'metrics'}
+    if cache_state['cache_key']:
+        answer_cache.put(cache_state['cache_key'], result)
+    if cache_state['semantic_vector'] is not None:
+        semantic_cache.add(cache_state['semantic_partition'], cache_state['semantic_vector'], result)
+
+
+def encode_cache_state(cache_state: dict) -> dict:
+    """
+    JSON-safe cache state for an asynchronous job payload
+    """
+    vector = cache_state['semantic_vector']
+    return {**cache_state, 'semantic_vector': list(vector) if vector is not None else None}
+
+
+def decode_cache_state(encoded: dict) -> dict:
+    """
+    Cache state from encode_cache_state(); an empty state (nothing is stored) when missing
+    """
+    cache_state = {'cache_key': None, 'semantic_partition': None, 'semantic_vector': None, **(encoded or {})}
+    if cache_state['semantic_vector'] is not None:
+        cache_state['semantic_vector'] = array('b', cache_state['semantic_vector'])
+    return cache_state
+
+
+def extract_sources(citations: list) -> list:
+    """
+    Convert Knowledge Base citations into the sources returned to the frontend
+    """
+    sources = []
+    for citation in citations:
+        log.debug("Citation", citation=citation)
+        for reference in citation.get('retrievedReferences', []):
+            sources.append(reference_to_source(reference))
+    return sources
+
+
+def citation_spans(citations: list) -> list:
+    """
+    The answer span of each Knowledge Base citation and the positions of its
+    references in the flat list built by extract_sources
+    """
+    spans = []
+    position = 0
+    for citation in citations:
+        span = citation.get('generatedResponsePart', {}).get('textResponsePart', {}).get('span', {})
+        count = len(citation.get('retrievedReferences', []))
+        spans.append({'start': span.get('start'), 'end': span.get('end'),
+                      'references': list(range(position, position + count))})
+        position += count
+    return spans
+
+
+def reference_to_source(reference: dict) -> dict:
+    """
+    Convert a retrieved reference (citation or retrieve result) into a source
+    Cited by the document's public URL, title, date and type from the document
+    index, falling back to the chunk metadata and then the S3 URI.
+    """
+    uri = reference.get('location', {}).get('s3Location', {}).get('uri', '')
+    metadata = reference.get('metadata', {})
+    indexed = document_index.get_uri(uri) or {}
+    return {
+        'document_id': uri,
+        'content': reference.get('content', {}).get('text', '')[:200] + '...',
+        'score': reference.get('score', 0),
+        'title': (indexed.get('title') or metadata.get('bill_title') or metadata.get('newspaper_title')
+                  or metadata.get('title', '')),
+        'url': indexed.get('url') or metadata.get('bill_url') or metadata.get('pdf_url') or uri,
+        'date': indexed.get('date') or metadata.get('introduced_date') or metadata.get('issue_date', ''),
+        'type': indexed.get('type') or metadata.get('entity_type', '')
+    }
+
+
+def fetch_bill_document(bill_info: list) -> dict:
+    """
+    Read the bill for an exact lookup straight from the data bucket
+    
+    Returns None when the question is not an exact lookup of one bill or the
+    object does not exist, so the caller falls back to the Knowledge Base path.
+    """
+    if not DIRECT_FETCH_ENABLED or not DATA_BUCKET_NAME or len(bill_info) != 1:
+        return None
+    bill_info = bill_info[0]
+    if not all(bill_info.get(field) for field in ('congress', 'bill_type', 'bill_number')):
         return None
     
-    filters = []
+    key = f"bills/congress_{bill_info['congress']}/{bill_info['bill_type'].lower()}_{bill_info['bill_number']}.txt"
+    try:
+        response = s3_client.get_object(Bucket=DATA_BUCKET_NAME, Key=key)
+    except ClientError as e:
+        # Without s3:ListBucket a missing key surfaces as AccessDenied rather than NoSuchKey
+        log.info("Direct fetch miss - falling back to Knowledge Base", key=key, error_code=e.response['Error']['Code'])
+        return None
     
-    # Add congress filter (now mapped to KB metadata)
-    if 'congress' in bill_info:
-        filters.append({
-            "equals": {
-                "key": "congress",
-                "value": bill_info['congress']
-            }
-        })
+    text = response['Body'].read().decode('utf-8', errors='replace')
+    max_chars = DIRECT_FETCH_MAX_TOKENS * CHARS_PER_TOKEN
+    truncated = len(text) > max_chars
+    if truncated:
+        text = text[:max_chars] + "\n[... document truncated ...]"
+    log.info("Direct fetch hit", key=key, chars=len(text), truncated=truncated)
     
-    # Add bill type filter
-    if 'bill_type' in bill_info:
-        filters.append({
-            "equals": {
-                "key": "bill_type", 
-                "value": bill_info['bill_type']
-            }
-        })
+    return {
+        'uri': f"s3://{DATA_BUCKET_NAME}/{key}",
+        'text': text,
+        'metadata': response.get('Metadata', {})
+    }
+
+
+def build_converse_request(question: str, persona: str, context_text: str, context_label: str, plan: dict) -> dict:
+    """
+    Build a Converse request answering from context we selected ourselves
     
-    # Add bill number filter
-    if 'bill_number' in bill_info:
-        filters.append({
-            "equals": {
-                "key": "bill_number",
-                "value": bill_info['bill_number']
-            }
-        })
+    Laid out as a stable prefix (precomputed persona system prompt, then the
+    context) followed by the question, with prompt cache points after the
+    system prompt and after the context when the model supports caching and
+    the prefix is long enough to be cached.
+    """
+    config = get_resolved_config()
+    system_prompt = config['system_prompts'].get(persona, config['system_prompts']['general'])
+    system = [{'text': system_prompt}]
+    content = [{'text': f"{context_label}:\n{context_text}"}]
     
-    # Combine all filters with AND logic
-    if len(filters) == 1:
-        return filters[0]
-    elif len(filters) > 1:
-        return {"andAll": filters}
+    if plan['prompt_caching']:
+        prefix_tokens = estimate_tokens(system_prompt)
+        if prefix_tokens >= PROMPT_CACHE_MIN_TOKENS:
+            system.append(CACHE_POINT)
+        prefix_tokens += estimate_tokens(context_text)
+        if prefix_tokens >= PROMPT_CACHE_MIN_TOKENS:
+            content.append(CACHE_POINT)
     
-    return None
+    content.append({'text': f"Question: {question}\n\nAnswer:"})
+    return {
+        'modelId': plan['model_id'],
+        'system': system,
+        'messages': [{'role': 'user', 'content': content}],
+        'inferenceConfig': {'temperature': 0.1, 'maxTokens': plan['max_tokens']}
+    }
 
 
+def build_direct_request(question: str, persona: str, document: dict, plan: dict) -> dict:
+    """
+    Build the Converse request for answering from a single bill document
+    """
+    return build_converse_request(question, persona, document['text'], 'Bill document', plan)
 
 
+def bill_document_source(document: dict) -> dict:
+    """
+    Source entry for a directly fetched bill, citing its bill_url
+    """
+    metadata = document['metadata']
+    return {
+        'document_id': document['uri'],
+        'content': document['text'][:200] + '...',
+        'score': 1.0,
+        'title': metadata.get('bill_title', ''),
+        'url': metadata.get('bill_url') or document['uri'],
+        'date': metadata.get('introduced_date', ''),
+        'type': 'bill'
+    }
+
 
-def query_knowledge_base(question: str, persona: str = 'general') -> dict:
+def record_prompt_cache_usage(persona: str, usage: dict, latency_ms: int) -> dict:
     """
-    Query Knowledge Base - handles both specific bill queries and general questions
+    Record a generation's prompt cache usage for its persona and log the savings
     """
-    print(f"Querying Knowledge Base: {KNOWLEDGE_BASE_ID}")
+    savings = prompt_cache_stats.record(persona, usage, latency_ms)
+    if savings['cache_read_tokens'] or savings['cache_write_tokens']:
+        log.info("Prompt cache usage", persona=persona, savings=savings, per_persona=prompt_cache_stats.summary)
+    return savings
+
+
+def converse_answer(request: dict, persona: str, deadline: float = None) -> tuple:
+    """
+    Run a Converse request; returns (answer, metrics)
+    """
+    started = time.perf_counter()
+    response = call_with_retries(bedrock_runtime.converse, deadline, **request)
+    answer = ''.join(block.get('text', '') for block in response['output']['message']['content'])
+    usage = response.get('usage', {})
+    generation_ms = int((time.perf_counter() - started) * 1000)
+    metrics = {
+        'prompt_tokens': usage.get('inputTokens'),
+        'completion_tokens': usage.get('outputTokens'),
+        'generation_ms': generation_ms,
+        'prompt_cache': record_prompt_cache_usage(persona, usage, generation_ms)
+    }
+    return answer, metrics
+
+
+def converse_events(request: dict, sources: list, persona: str, deadline: float = None):
+    """
+    Stream a Converse request, yielding events in the retrieve_and_generate_stream
+    shape consumed by run_stream_job (sources first, then text, then usage)
+    """
+    for source in sources:
+        yield {'source': source}
+    response = call_with_retries(bedrock_runtime.converse_stream, deadline, **request)
+    for stream_event in response['stream']:
+        delta = stream_event.get('contentBlockDelta', {}).get('delta', {})
+        if delta.get('text'):
+            yield {'output': {'text': delta['text']}}
+        elif 'metadata' in stream_event:
+            usage = stream_event['metadata'].get('usage', {})
+            latency_ms = stream_event['metadata'].get('metrics', {}).get('latencyMs', 0)
+            yield {'usage': usage, 'prompt_cache': record_prompt_cache_usage(persona, usage, latency_ms)}
+
+
+def answer_from_bill_document(question: str, persona: str, document: dict, plan: dict) -> dict:
+    """
+    Exact bill lookup: one model call with the bill as context, no vector search
+    """
+    answer, metrics = converse_answer(build_direct_request(question, persona, document, plan), persona, plan['deadline'])
+    metrics = {'mode': 'direct_fetch', **metrics}
+    log.info("Direct fetch answered", metrics=metrics)
+    return {
+        'answer': answer,
+        'sources': [bill_document_source(document)],
+        'entities': [],
+        'metrics': metrics
+    }
+
+
+def retrieve_results(question: str, metadata_filter: dict, number_of_results: int = RETRIEVE_RESULTS,
+                     deadline: float = None) -> tuple:
+    """
+    Raw retrieve results for a question, served from the retrieval cache when
+    the same query and filter were retrieved in the current corpus version
+    Returns (results, retrieval_ms, cached)
+    """
+    cache_key = corpus_version = None
+    if retrieval_cache:
+        corpus_version = answer_cache.corpus_version() if answer_cache else 0
+        cache_key = retrieval_cache.make_key(question, metadata_filter, number_of_results)
+        cached = retrieval_cache.get(cache_key, corpus_version)
+        if cached:
+            log.info("Retrieval cache hit", saved_ms=cached['retrieval_ms'], stats=retrieval_cache.stats)
+            return cached['results'], 0, True
     
-    # Extract bill information for potential filtering
-    bill_info = extract_bill_info(question)
+    started = time.perf_counter()
+    response = call_with_retries(
+        bedrock_agent_runtime.retrieve, deadline,
+        knowledgeBaseId=KNOWLEDGE_BASE_ID,
+        retrievalQuery={'text': question},
+        retrievalConfiguration=build_retrieval_config(metadata_filter, number_of_results)
+    )
+    retrieval_ms = int((time.perf_counter() - started) * 1000)
+    results = response.get('retrievalResults', [])
     
-    # Get AWS context
-    aws_region = os.environ.get("AWS_REGION", "us-east-1")
-    sts_client = boto3.client('sts')
-    account_id = sts_client.get_caller_identity()['Account']
+    if retrieval_cache:
+        retrieval_cache.put(cache_key, corpus_version, results, retrieval_ms)
+        log.info("Retrieval cache miss", retrieval_ms=retrieval_ms, stats=retrieval_cache.stats)
+    return results, retrieval_ms, False
+
+
+def keyword_results(question: str, metadata_filter: dict, number_of_results: int, passages: bool = True):
+    """
+    BM25 results from the keyword index, shaped like retrieve results (one per
+    document, the passage with most query terms as content when `passages`)
+    Returns None when the index is not loaded or keyword retrieval fails.
+    """
+    index = keyword_index.get()
+    if index is None:
+        return None
+    started = time.perf_counter()
+    try:
+        accept = (lambda metadata: filter_matches(metadata_filter, metadata)) if metadata_filter else None
+        hits = index.search(question, number_of_results, accept)
+        results = [{
+            'content': {'text': ''},
+            'location': {'type': 'S3', 's3Location': {'uri': f"s3://{DATA_BUCKET_NAME}/{hit['key']}"}},
+            'metadata': hit['metadata'],
+            'score': hit['score'],
+        } for hit in hits]
+        if passages:
+            for result, document in zip(results, passage_executor.map(fetch_source_document, [hit['key'] for hit in hits])):
+                result['content']['text'] = best_passage(document['text'], question) if document else ''
+            results = [result for result in results if result['content']['text']]
+    except Exception as e:
+        log.warning("Keyword retrieval failed: %s: %s", type(e).__name__, e)
+        return None
+    log.info("Keyword retrieval", results=len(results),
+             keyword_ms=round((time.perf_counter() - started) * 1000, 1))
+    return results
+
+
+def combine_filters(metadata_filter: dict, extra_filter: dict) -> dict:
+    """
+    AND an extra condition onto a (possibly empty) metadata filter
+    """
+    if not metadata_filter:
+        return extra_filter
+    if 'andAll' in metadata_filter:
+        return {'andAll': metadata_filter['andAll'] + [extra_filter]}
+    return {'andAll': [metadata_filter, extra_filter]}
+
+
+def plan_searches(question: str, route: dict) -> list:
+    """
+    The (query, filter) searches for a question
     
+    One search when bills or a document type were identified; otherwise one per
+    source type, so newspapers (far more numerous) cannot crowd bills out of the
+    results. People the question names add a search over the chunks tagged with
+    them, and comparative questions a search per side of the comparison.
+    """
+    metadata_filter = route['filter']
+    if not FEDERATED_RETRIEVAL_ENABLED or route['bills']:
+        return [(question, metadata_filter)]
+    
+    filters = [metadata_filter]
+    if 'entity_type' not in route['cues']:
+        filters = [
+            combine_filters(metadata_filter, {'equals': {'key': 'entity_type', 'value': source_type}})
+            for source_type in FEDERATED_SOURCE_TYPES
+        ]
+    searches = [(question, search_filter) for search_filter in filters]
+    searches += [(question, combine_filters(metadata_filter, person_filter(person)))
+                 for person in route['cues'].get('persons', [])]
+    searches += [(query, search_filter) for query in decompose_question(question) for search_filter in filters]
+    return searches[:FEDERATED_MAX_SEARCHES]
+
+
+def retrieve_context(question: str, route: dict, plan: dict) -> tuple:
+    """
+    Two-step mode, step one: retrieve (in parallel when federated, alongside the
+    keyword index when hybrid), fuse and prune locally
+    Returns (selected results, metrics)
+    """
+    searches = plan_searches(question, route)
+    started = time.perf_counter()
+    keyword_future = None
+    if HYBRID_KEYWORD_RESULTS > 0:
+        keyword_future = retrieval_executor.submit(keyword_results, question, route['filter'], HYBRID_KEYWORD_RESULTS)
     try:
-        # Determine model ARN
-        if BEDROCK_MODEL_ID.startswith(('us.', 'eu.', 'global.')):
-            model_arn = f'arn:aws:bedrock:{aws_region}:{account_id}:inference-profile/{BEDROCK_MODEL_ID}'
+        if len(searches) == 1:
+            results, _, cached = retrieve_results(question, route['filter'], plan['retrieve_results'], plan['deadline'])
+            ranked_lists = [results]
+            cached_searches = int(cached)
         else:
-            model_arn = f'arn:aws:bedrock:{aws_region}::foundation-model/{BEDROCK_MODEL_ID}'
-        
-        # Get persona-specific system prompt
-        system_prompt = get_persona_prompt(persona)
-        
-        # Build retrieval configuration
-        retrieval_config = {
-            'vectorSearchConfiguration': {
-                'numberOfResults': 50,
-                'overrideSearchType': 'SEMANTIC'
-            }
-        }
-        
-        # Add metadata filter only if specific bill is detected
-        metadata_filter = build_metadata_filter(bill_info)
-        if metadata_filter:
-            retrieval_config['vectorSearchConfiguration']['filter'] = metadata_filter
-            print(f"Specific bill detected - applying metadata filter for precise targeting")
-        else:
-            print("General query - searching all documents")
-        
-        # Build the configuration
-        retrieve_and_generate_config = {
-            'type': 'KNOWLEDGE_BASE',
-            'knowledgeBaseConfiguration': {
-                'knowledgeBaseId': KNOWLEDGE_BASE_ID,
-                'modelArn': model_arn,
-                'generationConfiguration': {
-                    'promptTemplate': {
-                        'textPromptTemplate': f"""{system_prompt}
+            results_per_search = min(FEDERATED_RESULTS_PER_SEARCH, plan['retrieve_results'])
+            futures = [
+                retrieval_executor.submit(retrieve_results, query, search_filter, results_per_search, plan['deadline'])
+                for query, search_filter in searches
+            ]
+            retrieved = [future.result() for future in futures]
+            ranked_lists = [ranked[0] for ranked in retrieved]
+            cached_searches = sum(1 for ranked in retrieved if ranked[2])
+            log.info("Federated retrieval", searches=len(searches),
+                     results=[len(ranked[0]) for ranked in retrieved],
+                     slowest_ms=max(ranked[1] for ranked in retrieved))
+    except Exception as e:
+        keyword = keyword_future.result() if keyword_future else None
+        if not keyword:
+            raise
+        log.warning("Knowledge Base retrieval failed, using keyword results only: %s: %s", type(e).__name__, e)
+        ranked_lists, cached_searches = [], 0
+    
+    keyword = keyword_future.result() if keyword_future else None
+    if keyword:
+        ranked_lists.append(keyword)
+    ranked_lists = [results for results in ranked_lists if results]
+    # All lists fuse in one pass, so each is cut on its own scores and fused scores never are
+    fused = len(ranked_lists) > 1
+    results = reciprocal_rank_fusion(ranked_lists) if fused else (ranked_lists[0] if ranked_lists else [])
+    retrieval_ms = int((time.perf_counter() - started) * 1000)
+    
+    selected, selection_stats = select_context(results, max_tokens=plan['context_max_tokens'], fused=fused)
+    metrics = {
+        'retrieval_ms': retrieval_ms,
+        'searches': len(searches),
+        'retrieval_cached': cached_searches == len(searches),
+        'keyword_results': len(keyword) if keyword is not None else None,
+        'context': selection_stats
+    }
+    log.info("Retrieved and pruned context", metrics=metrics)
+    
+    relaxed = relaxed_route(route) if not selected else None
+    if relaxed is not None:
+        log.info("Cue filter found nothing, retrying relaxed", filter=route['filter'], relaxed_filter=relaxed['filter'])
+        selected, relaxed_metrics = retrieve_context(question, relaxed, plan)
+        relaxed_metrics['retrieval_ms'] += retrieval_ms
+        relaxed_metrics['relaxed_filters'] = [route['filter']] + relaxed_metrics.get('relaxed_filters', [])
+        return selected, relaxed_metrics
+    return selected, metrics
 
-Use the following context to answer the question. Provide a well-formatted response.
 
-Context:
-$search_results$
+def format_context(results: list) -> str:
+    """
+    Number the selected chunks for the prompt
+    """
+    blocks = []
+    for i, result in enumerate(results, 1):
+        metadata = result.get('metadata', {})
+        title = metadata.get('bill_title') or metadata.get('newspaper_title') or result.get('location', {}).get('s3Location', {}).get('uri', '')
+        blocks.append(f"[{i}] {title}\n{result.get('content', {}).get('text', '')}")
+    return '\n\n'.join(blocks)
 
-Question: $query$
 
-Answer:"""
-                    },
-                    'inferenceConfig': {
-                        'textInferenceConfig': {
-                            'temperature': 0.1,
-                            'maxTokens': 2000
-                        }
-                    }
-                },
-                'retrievalConfiguration': retrieval_config
-            }
-        }
-        
-        # Query Knowledge Base
-        print(f"Calling retrieve_and_generate with config: {json.dumps(retrieve_and_generate_config, indent=2)}")
-        
-        response = bedrock_agent_runtime.retrieve_and_generate(
-            input={'text': question},
-            retrieveAndGenerateConfiguration=retrieve_and_generate_config
-        )
-        
-        print(f"Raw Knowledge Base response: {json.dumps(response, indent=2, default=str)}")
-        
-        # Extract answer and sources
-        answer = response['output']['text']
-        print(f"Extracted answer: {answer}")
-        
-        sources = []
-        
-        if 'citations' in response:
-            print(f"Found {len(response['citations'])} citations")
-            for i, citation in enumerate(response['citations']):
-                print(f"Citation {i}: {json.dumps(citation, indent=2, default=str)}")
-                retrieved_refs = citation.get('retrievedReferences', [])
-                for j, reference in enumerate(retrieved_refs):
-                    print(f"  Reference {j}: {json.dumps(reference, indent=2, default=str)}")
-                    source_info = {
-                        'document_id': reference.get('location', {}).get('s3Location', {}).get('uri', ''),
-                        'content': reference.get('content', {}).get('text', '')[:200] + '...',
-                        'score': reference.get('score', 0),
-                        'title': reference.get('metadata', {}).get('title', ''),
-                        'url': reference.get('location', {}).get('s3Location', {}).get('uri', '')
-                    }
-                    sources.append(source_info)
-                    print(f"  Processed source: {source_info}")
-        else:
-            print("No citations found in response")
-        
-        # PREVENT HALLUCINATION: If no sources found, return appropriate message
-        if len(sources) == 0:
-            print("⚠️ WARNING: No sources found - Knowledge Base may be empty or not synced")
+def build_two_step_request(question: str, persona: str, results: list, plan: dict) -> dict:
+    """
+    Two-step mode, step two: the Converse request over the pruned context
+    """
+    return build_converse_request(question, persona, format_context(results), 'Search results', plan)
+
+
+def answer_two_step(question: str, persona: str, route: dict, plan: dict) -> dict:
+    """
+    Retrieve, prune locally (collapse, MMR, cutoffs, token budget), then generate
+    """
+    started = time.perf_counter()
+    selected, metrics = retrieve_context(question, route, plan)
+    if not selected:
+        return {'answer': None, 'sources': [], 'entities': [], 'metrics': {'mode': 'two_step', **metrics}}
+    
+    request = build_two_step_request(question, persona, selected, plan)
+    answer, generation_metrics = converse_answer(request, persona, plan['deadline'])
+    metrics = {
+        'mode': 'two_step',
+        **metrics,
+        **generation_metrics,
+        'latency_ms': int((time.perf_counter() - started) * 1000)
+    }
+    log.info("Two-step answer", metrics=metrics)
+    return {
+        'answer': answer,
+        'sources': [reference_to_source(result) for result in selected],
+        'entities': [],
+        'metrics': metrics
+    }
+
+
+def generate_answer(question: str, persona: str, route: dict, plan: dict) -> dict:
+    """
+    Generate an answer with the fastest applicable path: direct fetch for an exact
+    bill lookup, otherwise two-step retrieval or retrieve_and_generate
+    """
+    # Exact bill lookup: skip vector search and answer from the bill document
+    bill_document = fetch_bill_document(route['bills'])
+    if bill_document:
+        return answer_from_bill_document(question, persona, bill_document, plan)
+    
+    if RETRIEVAL_MODE == 'two_step':
+        result = answer_two_step(question, persona, route, plan)
+        if not result['sources']:
+            log.warning("No sources found - Knowledge Base may be empty or not synced")
             return {
-                'answer': "I don't have access to the historical documents yet. The Knowledge Base may still be syncing or needs to be populated with data. Please try again later or contact support.",
+                'answer': NO_SOURCES_ANSWER,
                 'sources': [],
                 'entities': [],
-                'warning': 'no_sources_found'
+                'warning': 'no_sources_found',
+                'metrics': result['metrics']
             }
+        return result
+    
+    # Build the configuration
+    retrieve_and_generate_config = build_retrieve_and_generate_config(persona, route['filter'], plan)
+    
+    # Query Knowledge Base
+    log.debug("Calling retrieve_and_generate", config=retrieve_and_generate_config)
+    
+    started = time.perf_counter()
+    response = call_with_retries(
+        bedrock_agent_runtime.retrieve_and_generate, plan['deadline'],
+        input={'text': question},
+        retrieveAndGenerateConfiguration=retrieve_and_generate_config
+    )
+    # retrieve_and_generate does not report token usage
+    metrics = {
+        'mode': 'retrieve_and_generate',
+        'prompt_tokens': None,
+        'completion_tokens': None,
+        'latency_ms': int((time.perf_counter() - started) * 1000)
+    }
+    log.debug("Raw Knowledge Base response", response=response)
+    
+    # Extract answer and sources
+    answer = response['output']['text']
+    
+    sources = []
+    citations = []
+    
+    if 'citations' in response:
+        sources = extract_sources(response['citations'])
+        citations = citation_spans(response['citations'])
+    else:
+        log.info("No citations found in response")
+    
+    # A cue filter (not a bill reference) that found nothing is relaxed and retried
+    relaxed = relaxed_route(route) if not sources else None
+    if relaxed is not None:
+        log.info("Cue filter found nothing, retrying relaxed", filter=route['filter'], relaxed_filter=relaxed['filter'])
+        result = generate_answer(question, persona, relaxed, plan)
+        result['metrics']['relaxed_filters'] = [route['filter']] + result['metrics'].get('relaxed_filters', [])
+        return result
+    
+    # PREVENT HALLUCINATION: If no sources found, return appropriate message
+    if len(sources) == 0:
+        log.warning("No sources found - Knowledge Base may be empty or not synced")
+        return {
+            'answer': NO_SOURCES_ANSWER,
+            'sources': [],
+            'entities': [],
+            'warning': 'no_sources_found',
+            'metrics': metrics
+        }
+    
+    # Extract entities
+    entities = []
+    if 'metadata' in response:
+        entities = response['metadata'].get('entities', [])
+        log.debug("Entities", entities=entities)
+    
+    log.info("Knowledge Base returned answer", sources=len(sources), entities=len(entities), metrics=metrics)
+    
+    result = {
+        'answer': answer,
+        'sources': sources,
+        'citations': citations,
+        'entities': entities,
+        'metrics': metrics
+    }
+    return result
+
+
+DEADLINE_ANSWER = "This question is taking longer than expected to answer. Please try again, or narrow it down (for example to a specific bill, year or newspaper)."
+
+
+def generate_within_deadline(question: str, persona: str, route: dict, plan: dict, lane: str = None) -> dict:
+    """
+    generate_answer bounded by the request deadline
+    
+    The primary plan runs first; if it has not answered by HEDGE_AFTER_FRACTION
+    of the remaining budget (or fails), a hedge on the fast model with a reduced
+    context is started and the first answer wins. The hedge takes its own token
+    from admission control (persona's lane, or `lane`) and is skipped without one,
+    or when it would not be smaller than a plan already on the fast tier.
+    When neither answers in time the user gets a timeout message instead of an
+    API Gateway error.
+    """
+    deadline = plan['deadline']
+    if deadline is None or not HEDGING_ENABLED:
+        return generate_answer(question, persona, route, plan)
+    
+    hedge_plan = build_hedge_plan(plan)
+    hedge = lambda: generate_answer(question, persona, route, hedge_plan)
+    if plan['tier'] == 'fast' and not any(hedge_plan[budget] < plan[budget] for budget in HEDGE_BUDGETS):
+        # The same model with the same budgets would only race a copy of the primary
+        hedge = None
+    
+    def admit_hedge():
+        # The hedge is a second generation and needs its own token
+        if not admission:
+            return True
+        try:
+            admission.admit(lane or persona)
+            return True
+        except AdmissionRejected:
+            return False
+    
+    result, hedge_info = run_hedged(
+        lambda: generate_answer(question, persona, route, plan),
+        hedge,
+        deadline,
+        admit_hedge
+    )
+    log.info("Deadline outcome", hedge=hedge_info)
+    if result is None:
+        return {
+            'answer': DEADLINE_ANSWER,
+            'sources': [],
+            'entities': [],
+            'warning': hedge_info['winner'],
+            'error': True,
+            'metrics': {'hedge': hedge_info}
+        }
+    result['metrics'] = {**result.get('metrics', {}), 'hedge': hedge_info}
+    return result
+
+
+def busy_response(rejection: AdmissionRejected, timer=NULL_TIMER) -> dict:
+    """
+    429 for a request turned away by admission control
+    """
+    timer.dimension('Mode', 'rejected')
+    return api_response(429, {
+        'message': "The assistant is busy right now. Please try again in a few seconds.",
+        'retry_after': rejection.retry_after,
+        'error': True
+    }, timer, {'Retry-After': str(rejection.retry_after)})
+
+
+def query_knowledge_base(question: str, persona: str = 'general', language: str = 'en', route: dict = None,
+                         deadline: float = None, timer=NULL_TIMER, lane: str = None) -> dict:
+    """
+    Query Knowledge Base - handles both specific bill queries and general questions
+    Answers are served from the answer cache when the same question was already
+    answered for this persona, language and filter in the current corpus version.
+    Generation is bounded by the request deadline (see generate_within_deadline)
+    and needs a token from admission control in the persona's lane, or `lane`
+    (AdmissionRejected otherwise).
+    Cache lookup, planning and answering are timed on the request timer, with the
+    answer's retrieval and generation times recorded as their own phases.
+    """
+    # Bill references and routing cues narrow the search
+    route = route or route_query(question)
+    
+    try:
+        metadata_filter = route['filter']
         
-        # Extract entities
-        entities = []
-        if 'metadata' in response:
-            entities = response['metadata'].get('entities', [])
-            print(f"Found {len(entities)} entities: {entities}")
-        else:
-            print("No metadata found in response")
+        with timer.phase('cache'):
+            cached_result, cache_state = lookup_cached_answer(question, persona, language, metadata_filter)
+        if cached_result:
+            timer.dimension('Mode', 'cached')
+            return cached_result
         
-        print(f"✓ Knowledge Base returned answer with {len(sources)} sources and {len(entities)} entities")
+        if admission:
+            with timer.phase('admission'):
+                admission.admit(lane or persona)
         
-        return {
-            'answer': answer,
-            'sources': sources,
-            'entities': entities
-        }
+        # Model tier, output tokens and retrieval depth for this question
+        with timer.phase('plan'):
+            plan = plan_query(question, persona, route, deadline)
+        with timer.phase('answer'):
+            result = generate_within_deadline(question, persona, route, plan, lane)
+        timer.add('retrieval', result['metrics'].get('retrieval_ms'))
+        timer.add('generation', result['metrics'].get('generation_ms'))
+        timer.dimension('Mode', result['metrics'].get('mode', 'none'))
+        winning_plan = build_hedge_plan(plan) if result['metrics'].get('hedge', {}).get('winner') == 'hedge' else plan
+        result['metrics'] = {**result['metrics'], 'plan': plan_summary(winning_plan)}
+        log_plan_outcome(winning_plan, result['metrics'])
         
+        if result['sources']:
+            store_answer(cache_state, result)
+        return result
+        
+    except AdmissionRejected:
+        raise
     except Exception as e:
-        print(f"ERROR querying Knowledge Base: {str(e)}")
+        log.error("Error querying Knowledge Base: %s: %s", type(e).__name__, e, exc_info=True)
         return {
             'answer': "I encountered an error while searching. Please try again.",
             'sources': [],
@@ -406,10 +1356,588 @@ Answer:"""
         }
 
 
+def start_stream(question: str, persona: str, language: str, context, timer=NULL_TIMER) -> dict:
+    """
+    Start a streaming chat
+    
+    Cached answers are returned immediately as a normal chat response. Otherwise,
+    once admission control lets the request through, a stream is created and generation runs in an asynchronous invocation of this
+    function (or a background thread when the stream store is not shared), and the
+    client polls GET /chat/stream/{streamId} for tokens and citations.
+    """
+    with timer.phase('route'):
+        route = route_query(question)
+    with timer.phase('cache'):
+        cached_result, cache_state = lookup_cached_answer(question, persona, language, route['filter'])
+    if cached_result:
+        sources, citations = compact_sources(cached_result.get('sources', []), cached_result.get('citations'),
+                                             DATA_BUCKET_NAME)
+        return api_response(200, {
+            'message': cached_result['answer'],
+            'sources': sources,
+            'citations': citations,
+            'entities': cached_result.get('entities', []),
+            'route': route_summary(route),
+            'cached': True
+        }, timer)
+    
+    if admission:
+        with timer.phase('admission'):
+            admission.admit(persona)
+    
+    stream_id = uuid.uuid4().hex
+    accepted_at_ms = now_ms()
+    with timer.phase('stream_create'):
+        stream_store.create(stream_id, accepted_at_ms)
+    
+    job = {
+        'stream_id': stream_id,
+        'question': question,
+        'persona': persona,
+        'language': language,
+        'accepted_at_ms': accepted_at_ms,
+        # The worker stores its answer under this miss instead of looking it up (and embedding) again
+        'cache_state': encode_cache_state(cache_state)
+    }
+    
+    with timer.phase('dispatch'):
+        if stream_store.shared and context is not None:
+            lambda_client.invoke(
+                FunctionName=context.invoked_function_arn,
+                InvocationType='Event',
+                Payload=json.dumps({'stream_job': job}).encode('utf-8')
+            )
+        else:
+            threading.Thread(target=run_stream_job, args=(job,), daemon=True).start()
+    
+    log.info("Started stream", stream_id=stream_id)
+    return api_response(202, {
+        'stream_id': stream_id,
+        'status': 'pending',
+        'poll_path': f"chat/stream/{stream_id}",
+        'route': route_summary(route)
+    }, timer)
+
+
+def handle_stream_poll(event: dict, timer=NULL_TIMER) -> dict:
+    """
+    Return text and sources generated since the client's cursors
+    """
+    stream_id = event['pathParameters']['streamId']
+    params = event.get('queryStringParameters') or {}
+    try:
+        cursor = int(params.get('cursor', 0))
+        source_cursor = int(params.get('source_cursor', 0))
+    except ValueError:
+        return api_response(400, {'error': 'cursor and source_cursor must be integers'}, timer)
+    
+    with timer.phase('stream_read'):
+        page = read_stream_page(stream_store, stream_id, cursor, source_cursor)
+    if page is None:
+        return api_response(404, {'error': f"Stream {stream_id} not found or expired"}, timer)
+    return api_response(200, page, timer)
+
+
+def add_keyword_snippets(documents: list, query: str):
+    """
+    Snippets for keyword-only documents on a page, from the passage with most query terms
+    """
+    missing = [document for document in documents if not document['snippet'] and parse_source_id(document['id'] or '')]
+    keys = [parse_source_id(document['id']) for document in missing]
+    for document, source in zip(missing, passage_executor.map(fetch_source_document, keys)):
+        if source:
+            document['snippet'] = best_passage(source['text'], query, SEARCH_SNIPPET_CHARS)
+
+
+def handle_search(event: dict, context, timer=NULL_TIMER) -> dict:
+    """
+    Ranked documents with snippets and facet counts for a query, one page at a time
+    (see search). No generation: one retrieve (served from the retrieval cache for
+    later pages of the same query) and/or one keyword index search, fused in hybrid mode.
+    """
+    try:
+        with timer.phase('parse'):
+            request = parse_search_request(json.loads(event.get('body') or '{}'))
+    except ValueError as e:
+        return api_response(400, {'error': str(e)}, timer)
+    
+    mode = request['mode']
+    if mode != 'semantic' and keyword_index.get() is None:
+        if mode == 'keyword':
+            return api_response(503, {'error': 'The keyword index is not loaded yet. Please try again shortly.'}, timer)
+        mode = 'semantic'
+    if mode != 'keyword' and not KNOWLEDGE_BASE_ID:
+        return api_response(503, {
+            'error': 'Knowledge Base not configured yet. Please run the deployment pipeline first.'
+        }, timer)
+    
+    results, retrieval_ms, cached, keyword = [], 0, False, None
+    try:
+        with timer.phase('retrieval'):
+            keyword_future = None
+            if mode != 'semantic':
+                keyword_future = retrieval_executor.submit(keyword_results, request['query'],
+                                                           request['metadata_filter'], SEARCH_DEPTH, False)
+            try:
+                if mode != 'keyword':
+                    results, retrieval_ms, cached = retrieve_results(request['query'], request['metadata_filter'],
+                                                                     SEARCH_DEPTH, request_deadline(context))
+            finally:
+                keyword = keyword_future.result() if keyword_future else None
+            if mode == 'keyword' and keyword is None:
+                return api_response(503, {'error': 'Keyword search is unavailable. Please try again shortly.'}, timer)
+        with timer.phase('rank'):
+            documents = group_documents(results, DATA_BUCKET_NAME, document_index)
+            if keyword is not None:
+                keyword_documents = group_documents(keyword, DATA_BUCKET_NAME, document_index)
+                documents = keyword_documents if mode == 'keyword' else fuse_documents([documents, keyword_documents])
+            page = search_page(request, documents)
+        if keyword:
+            with timer.phase('snippets'):
+                add_keyword_snippets(page['documents'], request['query'])
+    except Exception as e:
+        if not keyword:
+            log.error("Search failed: %s: %s", type(e).__name__, e, exc_info=True)
+            return api_response(502, {'error': 'Search failed. Please try again.'}, timer)
+        # Knowledge Base retrieval failed: answer from the keyword index alone
+        log.warning("Knowledge Base search failed, using keyword results only: %s: %s", type(e).__name__, e)
+        mode = 'keyword'
+        page = search_page(request, group_documents(keyword, DATA_BUCKET_NAME, document_index))
+        add_keyword_snippets(page['documents'], request['query'])
+    
+    timer.dimension('Mode', 'cached' if cached else 'retrieve' if mode == 'semantic' else mode)
+    page['mode'] = mode
+    page['metrics'] = {'retrieval_ms': retrieval_ms, 'retrieval_cached': cached,
+                       'keyword_results': len(keyword) if keyword is not None else None}
+    log.info("Search", query=request['query'], mode=mode, total=page['total'], offset=request['offset'],
+             retrieval_ms=retrieval_ms, retrieval_cached=cached)
+    return api_response(200, page, timer)
+
+
+def start_batch(event: dict, context, timer=NULL_TIMER) -> dict:
+    """
+    Store a batch of questions and hand it to the batch worker
+    Body: {"questions": ["...", {"question": "...", "persona": "...", "id": "..."}], "persona": "...", "language": "..."}
+    """
+    try:
+        with timer.phase('parse'):
+            questions = parse_batch_request(json.loads(event.get('body') or '{}'))
+    except ValueError as e:
+        return api_response(400, {'error': str(e)}, timer)
+    if not KNOWLEDGE_BASE_ID:
+        return api_response(503, {
+            'error': 'Knowledge Base not configured yet. Please run the deployment pipeline first.'
+        }, timer)
+    
+    job_id = uuid.uuid4().hex
+    status = new_status(job_id, questions)
+    with timer.phase('batch_create'):
+        batch_store.create(job_id, questions, status)
+    
+    job = {'job_id': job_id}
+    with timer.phase('dispatch'):
+        if batch_store.shared and BATCH_WORKER_FUNCTION:
+            lambda_client.invoke(
+                FunctionName=BATCH_WORKER_FUNCTION,
+                InvocationType='Event',
+                Payload=json.dumps({'batch_job': job}).encode('utf-8')
+            )
+        else:
+            threading.Thread(target=run_batch_job, args=(job,), daemon=True).start()
+    
+    log.info("Started batch", job_id=job_id, questions=len(questions))
+    return api_response(202, {
+        'job_id': job_id,
+        'status': status['status'],
+        'total': status['total'],
+        'poll_path': f"chat/batch/{job_id}"
+    }, timer)
+
+
+def handle_batch_poll(event: dict, timer=NULL_TIMER) -> dict:
+    """
+    Progress and throughput of a batch, with its results (a presigned URL to the
+    JSON Lines file, or the lines themselves for the in-memory store) once any exist
+    """
+    job_id = event['pathParameters']['jobId']
+    with timer.phase('batch_read'):
+        status = batch_store.read_status(job_id) if job_id.isalnum() else None
+        if status is not None and status['completed'] + status['failed']:
+            status.update(batch_store.results_location(job_id))
+    if status is None:
+        return api_response(404, {'error': f"Batch {job_id} not found"}, timer)
+    return api_response(200, status, timer)
+
 
+def answer_batch_question(item: dict, deadline: float = None):
+    """
+    One result line for a batch question, or None when admission control kept
+    it waiting past the invocation's time or it did not finish within its own
+    deadline (BATCH_QUESTION_MAX_MS, within the invocation's); a later invocation
+    retries it
+    """
+    question, persona, language = item['question'], normalize_persona(item['persona']), item['language']
+    started = time.perf_counter()
+    try:
+        route = route_query(question)
+        while True:
+            question_deadline = time.monotonic() + BATCH_QUESTION_MAX_MS / 1000
+            if deadline is not None:
+                question_deadline = min(deadline, question_deadline)
+            try:
+                response = query_knowledge_base(question, persona, language, route, deadline=question_deadline,
+                                                lane=BATCH_ADMISSION_LANE)
+                break
+            except AdmissionRejected as e:
+                left = remaining_ms(deadline)
+                if left is not None and left - e.retry_after * 1000 < BATCH_CONTINUE_MARGIN_MS / 2:
+                    return None
+                time.sleep(e.retry_after)
+        if response.get('metrics', {}).get('hedge', {}).get('winner') == 'deadline_exceeded':
+            log.warning("Batch question ran out of time, leaving it for a later invocation")
+            return None
+        sources, citations = compact_sources(response.get('sources', []), response.get('citations'), DATA_BUCKET_NAME)
+        return {
+            'question': question,
+            'persona': persona,
+            'language': language,
+            'answer': response['answer'],
+            'sources': sources,
+            'citations': citations,
+            'route': route_summary(route),
+            'metrics': response.get('metrics'),
+            'cached': response.get('cached', False),
+            'error': response.get('error', False),
+            'latency_ms': int((time.perf_counter() - started) * 1000)
+        }
+    except Exception as e:
+        log.error("Error answering batch question: %s: %s", type(e).__name__, e, exc_info=True)
+        return {
+            'question': question,
+            'persona': persona,
+            'language': language,
+            'answer': None,
+            'error': str(e),
+            'latency_ms': int((time.perf_counter() - started) * 1000)
+        }
 
 
+def run_batch_job(job: dict, context=None) -> dict:
+    """
+    Batch worker: answer the batch's outstanding questions, BATCH_CONCURRENCY at a time
+    
+    Identical questions (same normalized text, persona and language) are answered
+    once; answers go through the shared answer cache and the container's retrieval
+    cache like any chat. Results and status are checkpointed every
+    BATCH_CHECKPOINT_SECONDS. When fewer than BATCH_CONTINUE_MARGIN_MS remain, no new
+    questions are started and the function invokes itself to continue (at most
+    BATCH_MAX_IDLE_INVOCATIONS times in a row without progress).
+    """
+    job_id = job['job_id']
+    deadline = request_deadline(context, cap_ms=None)
+    try:
+        questions = batch_store.read_questions(job_id)
+        status = batch_store.read_status(job_id)
+        results = batch_store.read_results(job_id)
+        get_resolved_config(context)
+    except Exception as e:
+        log.error("Could not load batch: %s: %s", type(e).__name__, e, job_id=job_id, exc_info=True)
+        return {'job_id': job_id, 'status': 'error'}
+    
+    status['status'] = 'running'
+    status['started_at'] = status['started_at'] or time.time()
+    status['invocations'] += 1
+    
+    # Outstanding question indexes grouped by identical question
+    done = {line['index'] for line in results}
+    answered_before = len(results)
+    groups = OrderedDict()
+    for index, item in enumerate(questions):
+        if index not in done:
+            key = (normalize_question(item['question']), item['persona'], item['language'])
+            groups.setdefault(key, []).append(index)
+    pending = iter(list(groups))
+    
+    def checkpoint():
+        now = time.time()
+        status['updated_at'] = now
+        status['elapsed_seconds'] = round(now - status['started_at'], 1)
+        status['questions_per_minute'] = questions_per_minute(status['completed'] + status['failed'],
+                                                              status['elapsed_seconds'])
+        batch_store.write_results(job_id, sorted(results, key=lambda line: line['index']))
+        batch_store.write_status(job_id, status)
+        log.info("Batch progress", job_id=job_id, completed=status['completed'], failed=status['failed'],
+                 total=status['total'], questions_per_minute=status['questions_per_minute'])
+    
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY) as pool:
+        futures = {}
+        
+        def submit_next() -> bool:
+            left = remaining_ms(deadline)
+            if left is not None and left < BATCH_CONTINUE_MARGIN_MS:
+                return False
+            key = next(pending, None)
+            if key is None:
+                return False
+            futures[pool.submit(answer_batch_question, questions[groups[key][0]], deadline)] = key
+            return True
+        
+        for _ in range(BATCH_CONCURRENCY):
+            submit_next()
+        last_checkpoint = time.monotonic()
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                key = futures.pop(future)
+                line = future.result()
+                if line is not None:
+                    for index in groups.pop(key):
+                        results.append({'index': index, 'id': questions[index]['id'], **line})
+                        status['failed' if line['error'] else 'completed'] += 1
+                        status['cached'] += 1 if line.get('cached') else 0
+                submit_next()
+            if time.monotonic() - last_checkpoint >= BATCH_CHECKPOINT_SECONDS:
+                checkpoint()
+                last_checkpoint = time.monotonic()
+    
+    idle_invocations = job.get('idle_invocations', 0) + 1 if len(results) == answered_before else 0
+    if len(results) < len(questions) and context is not None and idle_invocations < BATCH_MAX_IDLE_INVOCATIONS:
+        checkpoint()
+        job = {**job, 'idle_invocations': idle_invocations}
+        lambda_client.invoke(
+            FunctionName=context.invoked_function_arn,
+            InvocationType='Event',
+            Payload=json.dumps({'batch_job': job}).encode('utf-8')
+        )
+        log.info("Batch continues in a new invocation", job_id=job_id, remaining=len(questions) - len(results))
+        return {'job_id': job_id, 'status': 'running'}
+    
+    status['status'] = 'complete' if len(results) == len(questions) else 'incomplete'
+    checkpoint()
+    log.info("Batch complete", job_id=job_id, total=status['total'], completed=status['completed'],
+             failed=status['failed'], cached=status['cached'], elapsed_seconds=status['elapsed_seconds'],
+             questions_per_minute=status['questions_per_minute'])
+    return {'job_id': job_id, 'status': status['status']}
 
 
+def fetch_source_document(key: str):
+    """
+    Text and metadata of a document in the data bucket, cached per container
+    Returns None when the object does not exist or cannot be read.
+    """
+    document = source_documents.get(key)
+    if document is not None:
+        return document
+    try:
+        response = s3_client.get_object(Bucket=DATA_BUCKET_NAME, Key=key)
+    except ClientError as e:
+        log.info("Source document unavailable", key=key, error_code=e.response['Error']['Code'])
+        return None
+    document = {
+        'text': response['Body'].read().decode('utf-8', errors='replace'),
+        'metadata': response.get('Metadata', {}),
+        'etag': response.get('ETag', '')
+    }
+    source_documents.put(key, document)
+    return document
 
 
+def handle_source_request(event: dict, timer=NULL_TIMER) -> dict:
+    """
+    Full text of a cited document, or a page range of it (?pages=3 or ?pages=2-5)
+    Pages are SOURCE_PAGE_CHARS characters; at most SOURCE_MAX_PAGES per request,
+    next_page says where to continue. Responses are cacheable by the browser.
+    """
+    source_id = event['pathParameters']['sourceId']
+    key = parse_source_id(source_id)
+    if key is None or not DATA_BUCKET_NAME:
+        return api_response(404, {'error': f"Source {source_id} not found"}, timer)
+    
+    with timer.phase('fetch'):
+        document = fetch_source_document(key)
+    if document is None:
+        return api_response(404, {'error': f"Source {source_id} not found"}, timer)
+    
+    cache_headers = {
+        'Cache-Control': f"public, max-age={SOURCE_CACHE_MAX_AGE_SECONDS}",
+        'ETag': document['etag']
+    }
+    request_headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+    params = event.get('queryStringParameters') or {}
+    if document['etag'] and request_headers.get('if-none-match') == document['etag']:
+        return {'statusCode': 304, 'headers': {'Access-Control-Allow-Origin': '*', **cache_headers}, 'body': ''}
+    
+    pages = page_count(document['text'])
+    page_range = parse_page_range(params.get('pages'), pages)
+    if page_range is None or page_range[0] > pages:
+        return api_response(400, {'error': f"pages must be N or N-M within 1-{pages}"}, timer)
+    first, last = page_range
+    
+    metadata = document['metadata']
+    return api_response(200, {
+        'id': source_id,
+        'title': metadata.get('bill_title') or metadata.get('newspaper_title') or metadata.get('title', ''),
+        'url': metadata.get('bill_url') or metadata.get('pdf_url') or '',
+        'metadata': metadata,
+        'page_count': pages,
+        'pages': [first, last],
+        'next_page': last + 1 if last < pages else None,
+        'text': page_text(document['text'], first, last)
+    }, timer, cache_headers)
+
+
+def run_stream_job(job: dict, context=None) -> dict:
+    """
+    Streaming worker: generate with converse_stream (exact bill lookups and two-step
+    mode) or retrieve_and_generate_stream, and append text and citations to the
+    stream store as they arrive
+    
+    Time to first token is measured from when the chat request was accepted and
+    reported separately from total latency. The worker is not behind API Gateway,
+    so its deadline is the invocation's own remaining time; throttling retries
+    stay within it.
+    """
+    deadline = request_deadline(context, cap_ms=None)
+    stream_id = job['stream_id']
+    question = job['question']
+    persona = job['persona']
+    language = job['language']
+    accepted_at_ms = job['accepted_at_ms']
+    log.info("Streaming worker started", stream_id=stream_id)
+    
+    try:
+        route = route_query(question)
+        metadata_filter = route['filter']
+        cache_state = decode_cache_state(job.get('cache_state'))
+        bill_document = fetch_bill_document(route['bills'])
+        plan = plan_query(question, persona, route, deadline)
+        
+        generation_started_ms = now_ms()
+        first_token_ms = None
+        answer_parts = []
+        all_sources = []
+        all_citations = []
+        # Polls receive each document once, in the order of the final citation indexes
+        source_index = SourceIndex(DATA_BUCKET_NAME)
+        pending_chunks = []
+        pending_sources = []
+        last_flush_ms = generation_started_ms
+        
+        def flush():
+            nonlocal pending_chunks, pending_sources, last_flush_ms
+            if pending_chunks or pending_sources:
+                stream_store.append(stream_id, pending_chunks, pending_sources)
+                pending_chunks, pending_sources = [], []
+            last_flush_ms = now_ms()
+        
+        generation_metrics = {}
+        if bill_document:
+            # Exact bill lookup: stream the single model call over the bill document
+            generation_metrics['mode'] = 'direct_fetch'
+            events = converse_events(build_direct_request(question, persona, bill_document, plan),
+                                     [bill_document_source(bill_document)], persona, deadline)
+        elif RETRIEVAL_MODE == 'two_step':
+            generation_metrics['mode'] = 'two_step'
+            selected, retrieval_metrics = retrieve_context(question, route, plan)
+            generation_metrics.update(retrieval_metrics)
+            events = []
+            if selected:
+                events = converse_events(build_two_step_request(question, persona, selected, plan),
+                                         [reference_to_source(result) for result in selected], persona, deadline)
+        elif hasattr(bedrock_agent_runtime, 'retrieve_and_generate_stream'):
+            retrieve_and_generate_config = build_retrieve_and_generate_config(persona, metadata_filter, plan)
+            response = call_with_retries(
+                bedrock_agent_runtime.retrieve_and_generate_stream, deadline,
+                input={'text': question},
+                retrieveAndGenerateConfiguration=retrieve_and_generate_config
+            )
+            # retrieve_and_generate does not report token usage
+            generation_metrics.update({'mode': 'retrieve_and_generate', 'prompt_tokens': None})
+            events = response['stream']
+        else:
+            # Older boto3 in the runtime: deliver the full answer as a single chunk
+            log.warning("retrieve_and_generate_stream unavailable - falling back to retrieve_and_generate")
+            retrieve_and_generate_config = build_retrieve_and_generate_config(persona, metadata_filter, plan)
+            response = call_with_retries(
+                bedrock_agent_runtime.retrieve_and_generate, deadline,
+                input={'text': question},
+                retrieveAndGenerateConfiguration=retrieve_and_generate_config
+            )
+            generation_metrics.update({'mode': 'retrieve_and_generate', 'prompt_tokens': None})
+            events = [{'output': {'text': response['output']['text']}}]
+            events += [{'citation': citation} for citation in response.get('citations', [])]
+        
+        for stream_event in events:
+            is_first_token = False
+            new_sources = []
+            if 'output' in stream_event:
+                text = stream_event['output'].get('text', '')
+                if text and first_token_ms is None:
+                    first_token_ms = now_ms()
+                    is_first_token = True
+                answer_parts.append(text)
+                pending_chunks.append(text)
+            elif 'citation' in stream_event:
+                citation = stream_event['citation']
+                # Newer responses nest the citation; older ones put references at the top
+                citation = citation.get('citation', citation)
+                new_sources = extract_sources([citation])
+                span = citation_spans([citation])[0]
+                all_citations.append({**span, 'references': [len(all_sources) + i for i in span['references']]})
+            elif 'source' in stream_event:
+                new_sources = [stream_event['source']]
+            elif 'usage' in stream_event:
+                generation_metrics['prompt_tokens'] = stream_event['usage'].get('inputTokens')
+                generation_metrics['completion_tokens'] = stream_event['usage'].get('outputTokens')
+                generation_metrics['prompt_cache'] = stream_event['prompt_cache']
+            
+            all_sources.extend(new_sources)
+            for source in new_sources:
+                index, is_new = source_index.add(source)
+                if is_new:
+                    pending_sources.append(source_index.sources[index])
+            
+            pending_chars = sum(len(chunk) for chunk in pending_chunks)
+            # Flush the first token right away so time to first token stays low
+            if (is_first_token or now_ms() - last_flush_ms >= STREAM_FLUSH_INTERVAL_MS
+                    or pending_chars >= STREAM_FLUSH_CHARS):
+                flush()
+        flush()
+        
+        completed_ms = now_ms()
+        metrics = {
+            'time_to_first_token_ms': (first_token_ms - accepted_at_ms) if first_token_ms else None,
+            'generation_time_to_first_token_ms': (first_token_ms - generation_started_ms) if first_token_ms else None,
+            'total_ms': completed_ms - accepted_at_ms,
+            **generation_metrics,
+            'plan': plan_summary(plan)
+        }
+        log.info("Stream complete", stream_id=stream_id, metrics=metrics)
+        log_plan_outcome(plan, metrics)
+        
+        answer = ''.join(answer_parts)
+        if not all_sources:
+            # PREVENT HALLUCINATION: tell the client to replace the streamed text
+            log.warning("No sources found - Knowledge Base may be empty or not synced")
+            final = {'metrics': metrics, 'warning': 'no_sources_found', 'answer': NO_SOURCES_ANSWER}
+        else:
+            # Answer spans for retrieve_and_generate; numbered context markers otherwise
+            citations = all_citations if generation_metrics['mode'] == 'retrieve_and_generate' else None
+            final = {'metrics': metrics, 'answer': answer,
+                     'citations': compact_sources(all_sources, citations, DATA_BUCKET_NAME)[1]}
+            result = {'answer': answer, 'sources': all_sources, 'entities': []}
+            if citations is not None:
+                result['citations'] = citations
+            store_answer(cache_state, result)
+        final['route'] = route_summary(route)
+        
+        stream_store.finish(stream_id, 'done', final)
+        return {'stream_id': stream_id, 'status': 'done', 'metrics': metrics}
+        
+    except Exception as e:
+        log.error("Error in streaming worker: %s: %s", type(e).__name__, e, stream_id=stream_id, exc_info=True)
+        stream_store.finish(stream_id, 'error', {
+            'answer': "I encountered an error while searching. Please try again.",
+            'error': True
+        })
+        return {'stream_id': stream_id, 'status': 'error'}
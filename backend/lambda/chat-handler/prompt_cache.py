@@ -0,0 +1,109 @@
+"""
+Prompt-Prefix Caching for Converse Requests
+Generation requests are laid out as a stable prefix followed by the variable part:
+
+    system:   persona prompt + answering instructions   <- cache point
+    user:     context (bill document / search results)  <- cache point
+              question
+
+so Bedrock prompt caching can reuse the prefix across requests: the system
+prompt is shared by every request of a persona, and the context by follow-ups
+on the same bill or retrieval. Cache points are only added for models that
+support prompt caching and once the prefix reaches the model's minimum
+cacheable length; shorter prefixes are not cached by Bedrock anyway.
+
+Neither model the stack deploys by default (Claude 3.5 Sonnet v2, and Claude 3
+Haiku as the fast tier) supports prompt caching, so no cache points are sent and
+the savings read zero until BEDROCK_MODEL_ID or FAST_MODEL_ID is set to one of
+PROMPT_CACHE_MODELS (for example a Claude Sonnet 4 inference profile).
+
+Savings are tracked per persona from the Converse usage (cacheReadInputTokens,
+cacheWriteInputTokens) and latency of requests with and without a cache read.
+"""
+
+import os
+import threading
+
+# Model ID substrings of models that support prompt caching on Bedrock
+PROMPT_CACHE_MODELS = [
+    model.strip() for model in os.environ.get(
+        'PROMPT_CACHE_MODELS',
+        'claude-3-7-sonnet,claude-3-5-haiku,claude-sonnet-4,claude-opus-4,claude-haiku-4,amazon.nova'
+    ).split(',') if model.strip()
+]
+PROMPT_CACHE_ENABLED = os.environ.get('PROMPT_CACHE_ENABLED', 'true').lower() == 'true'
+# Minimum cacheable prefix (tokens) for Claude models on Bedrock
+PROMPT_CACHE_MIN_TOKENS = int(os.environ.get('PROMPT_CACHE_MIN_TOKENS', '1024'))
+
+CHARS_PER_TOKEN = 4
+
+CACHE_POINT = {'cachePoint': {'type': 'default'}}
+
+
+def supports_prompt_caching(model_id: str) -> bool:
+    return PROMPT_CACHE_ENABLED and any(model in model_id for model in PROMPT_CACHE_MODELS)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+class PromptCacheStats:
+    """
+    Per-persona prompt cache usage, kept per container
+    """
+
+    def __init__(self):
+        self._personas = {}
+        self._lock = threading.Lock()
+
+    def record(self, persona: str, usage: dict, latency_ms: int) -> dict:
+        """
+        Record one generation; returns its savings for the response metrics
+        """
+        read_tokens = usage.get('cacheReadInputTokens', 0) or 0
+        write_tokens = usage.get('cacheWriteInputTokens', 0) or 0
+        with self._lock:
+            stats = self._personas.setdefault(persona, {
+                'requests': 0, 'cache_hits': 0, 'input_tokens': 0,
+                'cache_read_tokens': 0, 'cache_write_tokens': 0,
+                'hit_latency_ms': 0, 'miss_latency_ms': 0,
+            })
+            stats['requests'] += 1
+            stats['input_tokens'] += usage.get('inputTokens', 0) or 0
+            stats['cache_read_tokens'] += read_tokens
+            stats['cache_write_tokens'] += write_tokens
+            if read_tokens:
+                stats['cache_hits'] += 1
+                stats['hit_latency_ms'] += latency_ms
+            else:
+                stats['miss_latency_ms'] += latency_ms
+            latency_saved_ms = self._latency_saved_ms(stats) if read_tokens else 0
+        return {
+            'cache_read_tokens': read_tokens,
+            'cache_write_tokens': write_tokens,
+            'latency_saved_ms_estimate': latency_saved_ms,
+        }
+
+    @staticmethod
+    def _latency_saved_ms(stats: dict) -> int:
+        """
+        Average latency without a cache read minus average latency with one
+        """
+        misses = stats['requests'] - stats['cache_hits']
+        if not stats['cache_hits'] or not misses:
+            return 0
+        return max(0, int(stats['miss_latency_ms'] / misses - stats['hit_latency_ms'] / stats['cache_hits']))
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                persona: {
+                    'requests': stats['requests'],
+                    'cache_hits': stats['cache_hits'],
+                    'cache_read_tokens': stats['cache_read_tokens'],
+                    'cache_write_tokens': stats['cache_write_tokens'],
+                    'latency_saved_ms_estimate': self._latency_saved_ms(stats),
+                }
+                for persona, stats in self._personas.items()
+            }
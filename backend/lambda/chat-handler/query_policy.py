@@ -0,0 +1,151 @@
+"""
+Adaptive Query Policy for the Chat Handler
+Chooses the model tier, output token budget and retrieval depth per request
+instead of sending every question to the same model with maxTokens 2000 and
+50 results.
+
+1. classify_complexity() sorts a question into simple / standard / complex using
+   cheap features: exact bill lookups, length, comparative or analytical wording,
+   several bills or several questions in one message
+2. The per-persona policy maps the complexity to a plan:
+   tier ("fast" = Haiku, "strong" = the configured model), max output tokens,
+   retrieval results and context token budget
+3. The plan and the observed latency/token usage are logged as one structured
+   line with message "query_policy" so the policy can be tuned from CloudWatch Logs Insights
+
+The policy can be overridden without a deploy through QUERY_POLICY_JSON, e.g.
+{"general": {"simple": {"tier": "strong"}}}.
+"""
+
+import json
+import os
+import re
+
+from query_router import decompose_question
+from structured_log import get_logger
+
+log = get_logger('chat-handler')
+
+FAST_MODEL_ID = os.environ.get('FAST_MODEL_ID', 'anthropic.claude-3-haiku-20240307-v1:0')
+
+ANALYTICAL_CUES = re.compile(
+    r'\b(why|explain|analy[sz]e|analysis|compare|comparison|contrast|impact|significance|'
+    r'evolution|evolve|discuss|essay|implications?|interpret|argue|arguments?|debate|'
+    r'in detail|detailed|history of|how did .+ change)\b',
+    re.IGNORECASE
+)
+FACTUAL_OPENERS = re.compile(r'^\s*(who|what|when|where|which|is|was|did|does|list|show|name)\b', re.IGNORECASE)
+
+SIMPLE_MAX_WORDS = 14
+COMPLEX_MIN_WORDS = 30
+
+DEFAULT_POLICY = {
+    'simple': {'tier': 'fast', 'max_tokens': 800, 'retrieve_results': 20, 'context_max_tokens': 3000},
+    'standard': {'tier': 'strong', 'max_tokens': 1500, 'retrieve_results': 40, 'context_max_tokens': 6000},
+    'complex': {'tier': 'strong', 'max_tokens': 2500, 'retrieve_results': 50, 'context_max_tokens': 9000},
+}
+
+# Persona adjustments on top of the default policy
+PERSONA_POLICY = {
+    'congressional_staffer': {
+        'simple': {'max_tokens': 1000},
+    },
+    'research_journalist': {},
+    'law_student': {
+        # Educational answers run longer and benefit from the stronger model
+        'standard': {'max_tokens': 2000},
+        'complex': {'max_tokens': 3000},
+    },
+    'general': {},
+}
+
+
+def _merge(base: dict, override: dict) -> dict:
+    merged = {complexity: dict(settings) for complexity, settings in base.items()}
+    for complexity, settings in (override or {}).items():
+        merged.setdefault(complexity, {}).update(settings)
+    return merged
+
+
+def load_policy() -> dict:
+    """
+    Per-persona policy: default, persona adjustments, then QUERY_POLICY_JSON overrides
+    """
+    overrides = {}
+    if os.environ.get('QUERY_POLICY_JSON'):
+        try:
+            overrides = json.loads(os.environ['QUERY_POLICY_JSON'])
+        except ValueError as e:
+            log.warning("Ignoring invalid QUERY_POLICY_JSON: %s", e)
+    return {
+        persona: _merge(_merge(DEFAULT_POLICY, adjustments), overrides.get(persona))
+        for persona, adjustments in PERSONA_POLICY.items()
+    }
+
+
+def classify_complexity(question: str, route: dict) -> tuple:
+    """
+    Returns (complexity, reasons)
+    """
+    words = len(question.split())
+    bills = route.get('bills', [])
+    reasons = []
+
+    if len(bills) > 1:
+        reasons.append('multiple_bills')
+    if decompose_question(question):
+        reasons.append('comparative')
+    if question.count('?') > 1:
+        reasons.append('multiple_questions')
+    analytical = bool(ANALYTICAL_CUES.search(question))
+    if analytical and words >= COMPLEX_MIN_WORDS:
+        reasons.append('long_analytical')
+    if reasons:
+        return 'complex', reasons
+
+    if len(bills) == 1 and not analytical:
+        return 'simple', ['exact_bill']
+    if words <= SIMPLE_MAX_WORDS and not analytical and FACTUAL_OPENERS.match(question):
+        return 'simple', ['short_factual']
+    return 'standard', ['analytical' if analytical else 'default']
+
+
+def choose_plan(question: str, persona: str, route: dict, policy: dict, model_tiers: dict) -> dict:
+    """
+    The generation plan for a request: complexity, model tier and budgets
+
+    model_tiers: {"fast": {"model_id", "model_arn", "prompt_caching"}, "strong": {...}}
+    """
+    complexity, reasons = classify_complexity(question, route)
+    settings = policy.get(persona, policy['general'])[complexity]
+    tier = settings['tier'] if settings['tier'] in model_tiers else 'strong'
+    return {
+        'complexity': complexity,
+        'reasons': reasons,
+        'persona': persona,
+        'tier': tier,
+        **model_tiers[tier],
+        'max_tokens': settings['max_tokens'],
+        'retrieve_results': settings['retrieve_results'],
+        'context_max_tokens': settings['context_max_tokens'],
+    }
+
+
+def log_plan_outcome(plan: dict, metrics: dict):
+    """
+    One JSON line per request with the choice and what it cost, for tuning the policy
+    """
+    metrics = metrics or {}
+    log.info('query_policy', **{
+        'persona': plan['persona'],
+        'complexity': plan['complexity'],
+        'reasons': plan['reasons'],
+        'tier': plan['tier'],
+        'model_id': plan['model_id'],
+        'max_tokens': plan['max_tokens'],
+        'retrieve_results': plan['retrieve_results'],
+        'mode': metrics.get('mode'),
+        'latency_ms': metrics.get('latency_ms', metrics.get('total_ms', metrics.get('generation_ms'))),
+        'prompt_tokens': metrics.get('prompt_tokens'),
+        'completion_tokens': metrics.get('completion_tokens'),
+    })
@@ -0,0 +1,296 @@
+"""
+Query Router for the Chat Handler
+Maps cues in a question onto the S3 metadata the collector writes, so general
+questions search a narrowed candidate set instead of the whole index:
+
+- Document type: "newspapers", "gazette", "editorial" -> entity_type = newspaper;
+  "bills", "legislation", "resolution" -> entity_type = bill
+- Years and dates: "in 1793", "July 4, 1793", "1790s", "from 1790 to 1795" -> year in [...]
+- Congress numbers without a bill: "the 6th Congress" -> the years that congress sat
+- Places: "Philadelphia", "Virginia" -> published there (place_of_publication) or
+  tagged with the place at ingestion (the chunk's "places" entity tags)
+- Newspaper titles: "the Gazette of the United States" -> newspaper_title contains the title
+- People: "Hamilton", "President Jefferson" -> the gazetteer's canonical names, matched
+  against the chunk's "persons" entity tags by an extra search (never a filter)
+
+Comparative questions ("compare X and Y", "X vs Y") are also split into
+sub-questions so each side gets its own retrieval.
+
+Only cues the router is confident about become filters, and a cue filter that
+finds nothing is relaxed (relax_cues) rather than answering from no sources.
+All matching uses patterns compiled at import.
+"""
+
+import re
+
+from bill_parser import find_congresses, tokenize
+from entity_extractor import PERSONS, extract_entities
+
+FIRST_CONGRESS_YEAR = 1789
+# Year lists longer than this are too broad to be worth filtering on
+MAX_YEAR_SPAN = 40
+
+YEAR = r'(1[6-9]\d\d)'
+YEAR_RANGE_PATTERN = re.compile(
+    rf'\b(?:between\s+{YEAR}\s+and|from\s+{YEAR}\s+(?:to|until|through)|{YEAR}\s*(?:-|–|to|through)\s*)\s*{YEAR}\b'
+)
+DECADE_PATTERN = re.compile(r'\b(1[6-9]\d)0\'?s\b')
+YEAR_PATTERN = re.compile(rf'\b{YEAR}\b')
+
+# "Articles" and "papers" are left out on purpose (Articles of Confederation, Federalist Papers)
+NEWSPAPER_CUES = re.compile(
+    r'\b(newspapers?|gazettes?|press|editorials?|advertisements?|adverts?|publishers?|headlines?)\b'
+)
+BILL_CUES = re.compile(
+    r'\b(bills?|legislation|legislative|resolutions?|acts? of congress|sponsors?)\b'
+)
+
+# Newspaper names from the period: capitalized words around a masthead noun
+NEWSPAPER_TITLE_PATTERN = re.compile(
+    r'\b((?:[A-Z][a-z]+\s+){0,3}'
+    r'(?:Gazette|Advertiser|Aurora|Herald|Journal|Courier|Register|Chronicle|Intelligencer|'
+    r'Mercury|Sentinel|Spectator|Packet|Argus|Eagle|Repository|Recorder|Monitor)'
+    r'(?:\s+(?:of\s+the\s+|of\s+)?(?:[A-Z][a-z]+)(?:\s+[A-Z][a-z]+){0,2})?)'
+)
+TITLE_STOPWORDS = {'The', 'In', 'What', 'Did', 'Does', 'Show', 'Find', 'Was', 'Were', 'How', 'Why', 'When'}
+# "Senate Journal", "House Journal" are congressional records, not newspapers
+NON_NEWSPAPER_TITLE_WORDS = {'Senate', 'House', 'Congress', 'Congressional'}
+
+# Places of publication: cities match by name; states also match the Library of
+# Congress abbreviation used in place strings such as "Philadelphia [Pa.]"
+CITIES = [
+    'Philadelphia', 'New York', 'Boston', 'Baltimore', 'Charleston', 'Richmond',
+    'Washington', 'Alexandria', 'Georgetown', 'Annapolis', 'Hartford', 'New Haven',
+    'Providence', 'Newport', 'Portsmouth', 'Albany', 'Savannah', 'Norfolk',
+    'Lancaster', 'Pittsburgh', 'Trenton', 'Wilmington', 'Salem', 'Worcester',
+    'Lexington', 'Frankfort', 'Cincinnati', 'New Orleans', 'Fredericksburg', 'Petersburg',
+]
+STATES = {
+    'Pennsylvania': 'Pa.', 'Massachusetts': 'Mass.', 'Virginia': 'Va.', 'Maryland': 'Md.',
+    'Connecticut': 'Conn.', 'Rhode Island': 'R.I.', 'New Jersey': 'N.J.', 'Delaware': 'Del.',
+    'New Hampshire': 'N.H.', 'Vermont': 'Vt.', 'Georgia': 'Ga.', 'South Carolina': 'S.C.',
+    'North Carolina': 'N.C.', 'Kentucky': 'Ky.', 'Tennessee': 'Tenn.', 'Ohio': 'Ohio',
+    'Louisiana': 'La.', 'District of Columbia': 'D.C.',
+}
+# "Washington" and "Georgia" are also people; only route on them after "in"/"from"
+AMBIGUOUS_PLACES = {'Washington', 'Georgia', 'Salem'}
+
+# The entity extractor's canonical names for the places it tags under another name
+TAGGED_PLACE_NAMES = {'Washington': 'Washington, D.C.', 'District of Columbia': 'Washington, D.C.'}
+
+CANONICAL_PLACES = {place.lower(): place for place in CITIES + list(STATES)}
+PLACE_PATTERN = re.compile(
+    r'\b(?:(in|from|at|of)\s+)?(' + '|'.join(
+        re.escape(place) for place in sorted(CANONICAL_PLACES, key=len, reverse=True)
+    ) + r')\b',
+    re.IGNORECASE
+)
+
+# Surnames naming exactly one person in the gazetteer ("Hamilton"; not "Adams" or "Clinton")
+def _unique_surnames() -> dict:
+    owners = {}
+    for canonical in PERSONS:
+        owners.setdefault(canonical.split()[-1], []).append(canonical)
+    return {surname: names[0] for surname, names in owners.items()
+            if len(names) == 1 and surname.isalpha() and not surname.isupper()}
+
+
+SURNAMES = _unique_surnames()
+SURNAME_PATTERN = re.compile(r'\b(' + '|'.join(sorted(SURNAMES, key=len, reverse=True)) + r')\b')
+# "in Washington" is the place, not the person
+PLACE_PREPOSITION_BEFORE = re.compile(r'\b(?:in|from|at|to|near)\s+$', re.IGNORECASE)
+
+# A comparison verb ends the last side of "how did X versus Y differ on Z"; Z is the topic
+COMPARISON_VERB_PATTERN = re.compile(
+    r'\s+(?:differ|disagree|agree|compare|contrast|clash)(?:e?d)?\b\s*(.*)$', re.IGNORECASE
+)
+COMPARISON_PATTERNS = [
+    re.compile(r'\bdifferences?\s+between\s+(.+?)\s+and\s+(.+?)[?.!]*$', re.IGNORECASE),
+    re.compile(r'\bcompare\s+(.+?)\s+(?:and|with|to|against|versus|vs\.?)\s+(.+?)[?.!]*$', re.IGNORECASE),
+    re.compile(r'^(?:how\s+(?:did|does|do|was|were)\s+)?(.+?)\s+(?:versus|vs\.?)\s+(.+?)[?.!]*$', re.IGNORECASE),
+    # "how did X and Y differ": only with a comparison verb after the second side
+    re.compile(r'^how\s+(?:did|does|do)\s+(.+?)\s+and\s+(.+?\s+(?:differ|disagree|contrast)(?:e?d)?\b.*?)[?.!]*$',
+               re.IGNORECASE),
+]
+MIN_SUB_QUESTION_CHARS = 3
+
+
+def congress_years(congress: int) -> list:
+    """
+    Calendar years a congress sat in (congress 1 = March 1789 - March 1791)
+    """
+    start = FIRST_CONGRESS_YEAR + 2 * (congress - 1)
+    return [start, start + 1, start + 2]
+
+
+def find_years(question: str) -> list:
+    """
+    Years mentioned in a question: explicit ranges, decades, then single years and dates
+    """
+    years = set()
+    remaining = question
+    for match in YEAR_RANGE_PATTERN.finditer(question):
+        bounds = [int(year) for year in match.groups() if year]
+        start, end = min(bounds), max(bounds)
+        years.update(range(start, end + 1))
+        remaining = remaining.replace(match.group(0), ' ')
+    for match in DECADE_PATTERN.finditer(remaining):
+        start = int(match.group(1)) * 10
+        years.update(range(start, start + 10))
+        remaining = remaining.replace(match.group(0), ' ')
+    years.update(int(year) for year in YEAR_PATTERN.findall(remaining))
+    return sorted(years)
+
+
+def find_entity_type(question: str):
+    lowered = question.lower()
+    wants_newspapers = bool(NEWSPAPER_CUES.search(lowered))
+    wants_bills = bool(BILL_CUES.search(lowered))
+    if wants_newspapers == wants_bills:
+        return None
+    return 'newspaper' if wants_newspapers else 'bill'
+
+
+def find_places(question: str) -> list:
+    places = []
+    for preposition, place in PLACE_PATTERN.findall(question):
+        place = CANONICAL_PLACES[place.lower()]
+        if place in AMBIGUOUS_PLACES and preposition.lower() not in ('in', 'from', 'at'):
+            continue
+        if place not in places:
+            places.append(place)
+    return places
+
+
+def find_persons(question: str) -> list:
+    """
+    Canonical gazetteer names of the people a question mentions, by alias
+    ("President Jefferson") or by a surname only one person has ("Hamilton")
+    """
+    persons = extract_entities(question)['persons']
+    for match in SURNAME_PATTERN.finditer(question):
+        if match.group(1).lower() in CANONICAL_PLACES and PLACE_PREPOSITION_BEFORE.search(question[:match.start()]):
+            continue
+        person = SURNAMES[match.group(1)]
+        if person not in persons:
+            persons.append(person)
+    return persons
+
+
+def find_newspaper_title(question: str):
+    match = NEWSPAPER_TITLE_PATTERN.search(question)
+    if not match:
+        return None
+    words = match.group(1).split()
+    while words and words[0] in TITLE_STOPWORDS:
+        words.pop(0)
+    if not words or NON_NEWSPAPER_TITLE_WORDS & set(words):
+        return None
+    return ' '.join(words)
+
+
+def extract_query_cues(question: str) -> dict:
+    """
+    Routing cues in a question (only the ones that were found)
+    """
+    cues = {}
+    years = find_years(question)
+    if not years:
+        for _, congress in find_congresses(tokenize(question)):
+            years.extend(year for year in congress_years(congress) if year not in years)
+    if years and len(years) <= MAX_YEAR_SPAN:
+        cues['years'] = [str(year) for year in sorted(years)]
+
+    newspaper_title = find_newspaper_title(question)
+    if newspaper_title:
+        cues['newspaper_title'] = newspaper_title
+
+    entity_type = 'newspaper' if newspaper_title else find_entity_type(question)
+    if entity_type:
+        cues['entity_type'] = entity_type
+
+    # Places of publication only exist on newspapers
+    if entity_type != 'bill':
+        places = find_places(question)
+        if places:
+            cues['places'] = places
+
+    persons = find_persons(question)
+    if persons:
+        cues['persons'] = persons
+    return cues
+
+
+def place_filter(place: str) -> dict:
+    """
+    Published in the place, or tagged with it by the ingest-time entity extraction
+    """
+    conditions = [{'stringContains': {'key': 'place_of_publication', 'value': place}}]
+    if place in STATES and STATES[place] != place:
+        conditions.append({'stringContains': {'key': 'place_of_publication', 'value': STATES[place]}})
+    conditions.append({'listContains': {'key': 'places', 'value': TAGGED_PLACE_NAMES.get(place, place)}})
+    return {'orAll': conditions}
+
+
+def person_filter(person: str) -> dict:
+    """
+    Chunks tagged with a person by the ingest-time entity extraction
+    """
+    return {'listContains': {'key': 'persons', 'value': person}}
+
+
+def build_cue_filter(cues: dict):
+    """
+    Knowledge Base metadata filter for routing cues, or None when there are none
+    """
+    filters = []
+    if 'entity_type' in cues:
+        filters.append({'equals': {'key': 'entity_type', 'value': cues['entity_type']}})
+    if 'years' in cues:
+        if len(cues['years']) == 1:
+            filters.append({'equals': {'key': 'year', 'value': cues['years'][0]}})
+        else:
+            filters.append({'in': {'key': 'year', 'value': cues['years']}})
+    if 'newspaper_title' in cues:
+        filters.append({'stringContains': {'key': 'newspaper_title', 'value': cues['newspaper_title']}})
+    if 'places' in cues:
+        place_filters = [place_filter(place) for place in cues['places']]
+        filters.append(place_filters[0] if len(place_filters) == 1 else {'orAll': place_filters})
+
+    if not filters:
+        return None
+    if len(filters) == 1:
+        return filters[0]
+    return {'andAll': filters}
+
+
+def relax_cues(cues: dict) -> dict:
+    """
+    Cues for a retry after a cue-filtered search found nothing ("July 4, 1776"
+    predates the corpus): the document type alone, then no filter at all.
+    People are kept; they never filter.
+    """
+    relaxed = {key: value for key, value in cues.items() if key == 'persons'}
+    if 'entity_type' in cues and build_cue_filter(cues) != build_cue_filter({'entity_type': cues['entity_type']}):
+        relaxed['entity_type'] = cues['entity_type']
+    return relaxed
+
+
+def decompose_question(question: str) -> list:
+    """
+    Sub-questions for a comparative question, or [] when it is not one
+    "compare the Alien Act and the Sedition Act" -> ["the Alien Act", "the Sedition Act"]
+    "how did Hamilton versus Jefferson differ on the bank" -> ["Hamilton on the bank", "Jefferson on the bank"]
+    """
+    for pattern in COMPARISON_PATTERNS:
+        match = pattern.search(question.strip())
+        if match:
+            parts = [part.strip(' ,;:') for part in match.groups()]
+            topic = ''
+            verb = COMPARISON_VERB_PATTERN.search(parts[-1])
+            if verb:
+                topic = verb.group(1).strip(' ,;:?.!')
+                parts[-1] = parts[-1][:verb.start()].strip(' ,;:')
+            if all(len(part) >= MIN_SUB_QUESTION_CHARS for part in parts):
+                return [f"{part} {topic}" if topic else part for part in parts]
+    return []
@@ -0,0 +1,123 @@
+"""
+Per-Request Phase Timing for the Chat Handler
+Times the phases of a request (parsing, config/STS, routing, cache lookup,
+retrieval, generation, serialization) and reports them two ways:
+
+- a Server-Timing response header, so the frontend and load tests can see the
+  breakdown (exposed to the browser through CORS)
+- one CloudWatch Embedded Metric Format record per request, printed to stdout:
+  CloudWatch turns it into metrics in Lambda, and offline it is just a JSON log line
+
+With REQUEST_METRICS_ENABLED=false every request gets the shared NULL_TIMER,
+whose methods do nothing.
+"""
+
+import json
+import os
+import time
+from contextlib import nullcontext
+
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'ChroniclingAmerica/Chat')
+
+
+class RequestTimer:
+    """
+    Phase durations of one request, in milliseconds and in the order first seen
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.dimensions = {}
+
+    def phase(self, name: str):
+        return _Phase(self, name)
+
+    def add(self, name: str, duration_ms):
+        """
+        Record a phase measured elsewhere (e.g. retrieval_ms from the answer metrics)
+        """
+        if duration_ms is not None:
+            self.phases[name] = self.phases.get(name, 0.0) + duration_ms
+
+    def dimension(self, name: str, value):
+        if value is not None:
+            self.dimensions[name] = str(value)
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self) -> str:
+        entries = [f"{name};dur={duration_ms:.1f}" for name, duration_ms in self.phases.items()]
+        entries.append(f"total;dur={self.total_ms():.1f}")
+        return ', '.join(entries)
+
+    def emit(self, status_code: int):
+        """
+        Print the request's phases as one EMF record
+        """
+        metrics = {f"{name}_ms": round(duration_ms, 1) for name, duration_ms in self.phases.items()}
+        metrics['total_ms'] = round(self.total_ms(), 1)
+        print(json.dumps({
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [sorted(self.dimensions)],
+                    'Metrics': [{'Name': name, 'Unit': 'Milliseconds'} for name in metrics],
+                }],
+            },
+            **self.dimensions,
+            'status_code': status_code,
+            **metrics,
+        }))
+
+
+class _Phase:
+    __slots__ = ('timer', 'name', 'started')
+
+    def __init__(self, timer: RequestTimer, name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timer.add(self.name, (time.perf_counter() - self.started) * 1000)
+        return False
+
+
+class NullTimer:
+    """
+    Timer used when request metrics are disabled
+    """
+
+    enabled = False
+    _phase = nullcontext()
+
+    def phase(self, name: str):
+        return self._phase
+
+    def add(self, name: str, duration_ms):
+        pass
+
+    def dimension(self, name: str, value):
+        pass
+
+    def server_timing(self):
+        return None
+
+    def emit(self, status_code: int):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def start_timer():
+    return RequestTimer() if REQUEST_METRICS_ENABLED else NULL_TIMER
@@ -0,0 +1,97 @@
+"""
+Retrieval Result Cache for the Chat Handler
+Caches raw Knowledge Base `retrieve` results separately from generated answers,
+so a question asked again under another persona or language, or rephrased only
+in case and punctuation, reuses the chunks and skips vector search.
+
+- Keyed by normalized question text, metadata filter and result count
+- Bounded LRU per container (RETRIEVAL_CACHE_MAX_ENTRIES) with a TTL
+- Invalidated when the corpus version changes (bumped by kb-sync-trigger's
+  check_ingestion once a Knowledge Base ingestion job completes): the whole
+  cache is dropped
+- Every hit logs the retrieval latency it saved
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from answer_cache import normalize_question
+from structured_log import get_logger
+
+log = get_logger('chat-handler')
+
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.environ.get('RETRIEVAL_CACHE_MAX_ENTRIES', '256'))
+RETRIEVAL_CACHE_TTL_SECONDS = int(os.environ.get('RETRIEVAL_CACHE_TTL_SECONDS', '3600'))
+
+
+class RetrievalCache:
+    """
+    Thread-safe LRU of retrieval results with TTL and corpus-version invalidation
+    """
+
+    def __init__(self, max_entries: int = RETRIEVAL_CACHE_MAX_ENTRIES,
+                 ttl_seconds: int = RETRIEVAL_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._corpus_version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0
+
+    @staticmethod
+    def make_key(question: str, metadata_filter, number_of_results: int) -> str:
+        return json.dumps([normalize_question(question), metadata_filter, number_of_results], sort_keys=True)
+
+    def _check_version(self, corpus_version: int):
+        if corpus_version != self._corpus_version:
+            if self._entries:
+                log.info("Retrieval cache: corpus version changed, dropping entries",
+                         old_version=self._corpus_version, new_version=corpus_version, entries=len(self._entries))
+            self._entries.clear()
+            self._corpus_version = corpus_version
+
+    def get(self, key: str, corpus_version: int):
+        """
+        Cached retrieval results for a key, or None
+        """
+        with self._lock:
+            self._check_version(corpus_version)
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires_at'] < time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_ms += entry['retrieval_ms']
+            return entry
+
+    def put(self, key: str, corpus_version: int, results: list, retrieval_ms: int):
+        with self._lock:
+            self._check_version(corpus_version)
+            self._entries[key] = {
+                'results': results,
+                'retrieval_ms': retrieval_ms,
+                'expires_at': time.time() + self.ttl_seconds,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'saved_ms': self.saved_ms,
+            }
@@ -0,0 +1,233 @@
+"""
+Retrieval-Only Search for POST /search
+Returns ranked documents with snippets and facet counts without generating an
+answer, for research requests that only need the matching documents.
+
+- One Knowledge Base retrieve of SEARCH_DEPTH chunks (through the retrieval
+  cache, so later pages of the same query cost nothing), grouped into
+  documents ranked by their best chunk
+- Facets (entity_type, year, congress, bill_type, newspaper_title) are counted
+  over all matching documents, not just the page
+- Filters on the same fields narrow the retrieval itself (Knowledge Base
+  metadata filter); year ranges are expanded to the year list
+- Modes: `semantic` (vector search), `keyword` (BM25 over the collector's
+  inverted index, see keyword_index; exact names, OCR spellings, "quoted
+  phrases") and `hybrid` (both, fused by document rank), the default; hybrid
+  falls back to semantic while the keyword index is not loaded
+- Cursors are opaque: the offset of the next page plus a fingerprint of the
+  query and filters, so a cursor cannot be replayed against another query
+"""
+
+import base64
+import hashlib
+import json
+import os
+
+from answer_cache import normalize_question
+from context_selection import RRF_K
+from source_index import source_id
+
+SEARCH_DEPTH = int(os.environ.get('SEARCH_DEPTH', '100'))  # Knowledge Base maximum per retrieve
+SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', '10'))
+SEARCH_MAX_PAGE_SIZE = int(os.environ.get('SEARCH_MAX_PAGE_SIZE', '50'))
+SEARCH_SNIPPET_CHARS = int(os.environ.get('SEARCH_SNIPPET_CHARS', '300'))
+SEARCH_MAX_QUERY_CHARS = int(os.environ.get('SEARCH_MAX_QUERY_CHARS', '1000'))
+# Most values returned per facet (by count)
+SEARCH_MAX_FACET_VALUES = int(os.environ.get('SEARCH_MAX_FACET_VALUES', '20'))
+# Widest year_from..year_to range accepted as a filter
+SEARCH_MAX_YEAR_RANGE = 100
+SEARCH_MODES = ('semantic', 'keyword', 'hybrid')
+SEARCH_DEFAULT_MODE = os.environ.get('SEARCH_DEFAULT_MODE', 'hybrid')
+
+FACET_FIELDS = ('entity_type', 'year', 'congress', 'bill_type', 'newspaper_title')
+
+
+def parse_search_request(body: dict) -> dict:
+    """
+    Validate a search body; raises ValueError when invalid
+
+    {"query": "...", "filters": {"entity_type": "bill", "year": ["1798", "1799"],
+     "year_from": 1790, "year_to": 1800, "congress": "5", "bill_type": "HR",
+     "newspaper_title": "..."}, "mode": "hybrid", "page_size": 10, "cursor": "..."}
+    Filter values are strings or lists of strings.
+    """
+    query = (body.get('query') or body.get('message') or '').strip()
+    if not query:
+        raise ValueError('query is required')
+    if len(query) > SEARCH_MAX_QUERY_CHARS:
+        raise ValueError(f"query is longer than {SEARCH_MAX_QUERY_CHARS} characters")
+
+    filters = body.get('filters') or {}
+    if not isinstance(filters, dict):
+        raise ValueError('filters must be an object')
+    unknown = set(filters) - set(FACET_FIELDS) - {'year_from', 'year_to'}
+    if unknown:
+        raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+
+    try:
+        page_size = int(body.get('page_size', SEARCH_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise ValueError('page_size must be an integer')
+    if not 1 <= page_size <= SEARCH_MAX_PAGE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {SEARCH_MAX_PAGE_SIZE}")
+
+    mode = body.get('mode') or SEARCH_DEFAULT_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"mode must be one of {', '.join(SEARCH_MODES)}")
+
+    request = {'query': query, 'filters': filters, 'mode': mode, 'page_size': page_size,
+               'metadata_filter': build_search_filter(filters)}
+    request['offset'] = decode_cursor(body.get('cursor'), fingerprint(request)) if body.get('cursor') else 0
+    return request
+
+
+def filter_values(value) -> list:
+    values = value if isinstance(value, list) else [value]
+    if not values or not all(isinstance(item, (str, int)) for item in values):
+        raise ValueError('Filter values must be strings or lists of strings')
+    return [str(item) for item in values]
+
+
+def build_search_filter(filters: dict):
+    """
+    Knowledge Base metadata filter for search filters, or None without any
+    """
+    conditions = []
+    for field in FACET_FIELDS:
+        if field in filters:
+            values = filter_values(filters[field])
+            if field == 'newspaper_title' and len(values) == 1:
+                conditions.append({'stringContains': {'key': field, 'value': values[0]}})
+            elif len(values) == 1:
+                conditions.append({'equals': {'key': field, 'value': values[0]}})
+            else:
+                conditions.append({'in': {'key': field, 'value': values}})
+
+    # Years are stored as strings, so a range becomes the list of years in it
+    if 'year_from' in filters or 'year_to' in filters:
+        try:
+            first = int(filters.get('year_from', filters.get('year_to')))
+            last = int(filters.get('year_to', filters.get('year_from')))
+        except (TypeError, ValueError):
+            raise ValueError('year_from and year_to must be years')
+        if last < first or last - first >= SEARCH_MAX_YEAR_RANGE:
+            raise ValueError(f"year_from..year_to must span 1 to {SEARCH_MAX_YEAR_RANGE} years")
+        years = [str(year) for year in range(first, last + 1)]
+        conditions.append({'equals': {'key': 'year', 'value': years[0]}} if len(years) == 1
+                          else {'in': {'key': 'year', 'value': years}})
+
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {'andAll': conditions}
+
+
+def fingerprint(request: dict) -> str:
+    """
+    Short hash of the normalized query, filters and mode, carried in cursors
+    """
+    key = json.dumps([normalize_question(request['query']), request['filters'], request['mode']], sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:12]
+
+
+def encode_cursor(offset: int, query_fingerprint: str) -> str:
+    raw = json.dumps({'o': offset, 'f': query_fingerprint}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, query_fingerprint: str) -> int:
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        offset = int(value['o'])
+        matches = value['f'] == query_fingerprint
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Invalid cursor')
+    if not matches or offset < 0:
+        raise ValueError('Cursor does not belong to this query')
+    return offset
+
+
+def group_documents(results: list, bucket: str, document_index=None) -> list:
+    """
+    Retrieve results (chunks) grouped into documents, best score first
+
+    Each document: {id, title, url, date, type, score, snippet, chunks, metadata}
+    with the public URL, title, date and type from the document index when it
+    has the document, and the facet fields from the chunk metadata.
+    """
+    documents = {}
+    for result in results:
+        uri = result.get('location', {}).get('s3Location', {}).get('uri', '')
+        score = result.get('score', 0) or 0
+        document = documents.get(uri)
+        if document is not None:
+            document['chunks'] += 1
+            if score > document['score']:
+                document['score'] = score
+                document['snippet'] = result.get('content', {}).get('text', '')[:SEARCH_SNIPPET_CHARS]
+            continue
+
+        metadata = result.get('metadata', {})
+        indexed = (document_index.get_uri(uri) if document_index else None) or {}
+        documents[uri] = {
+            'id': source_id(uri, bucket),
+            'title': (indexed.get('title') or metadata.get('bill_title') or metadata.get('newspaper_title')
+                      or metadata.get('title', '')),
+            'url': indexed.get('url') or metadata.get('bill_url') or metadata.get('pdf_url') or uri,
+            'date': indexed.get('date') or metadata.get('introduced_date') or metadata.get('issue_date', ''),
+            'type': indexed.get('type') or metadata.get('entity_type', ''),
+            'score': score,
+            'snippet': result.get('content', {}).get('text', '')[:SEARCH_SNIPPET_CHARS],
+            'chunks': 1,
+            'metadata': {field: str(metadata[field]) for field in FACET_FIELDS if metadata.get(field) not in (None, '')},
+        }
+    return sorted(documents.values(), key=lambda document: document['score'], reverse=True)
+
+
+def fuse_documents(ranked_lists: list, k: int = RRF_K) -> list:
+    """
+    Reciprocal rank fusion of ranked document lists (semantic and keyword scores
+    are not comparable, ranks are). A document keeps the fields of the first list
+    it appears in, with the snippet of the first list that has one.
+    """
+    fused = {}
+    for documents in ranked_lists:
+        for rank, document in enumerate(documents, 1):
+            document_id = document['id'] or document['url']
+            entry = fused.get(document_id)
+            if entry is None:
+                entry = fused[document_id] = {**document, 'score': 0.0}
+            elif not entry['snippet']:
+                entry['snippet'] = document['snippet']
+            entry['score'] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda document: document['score'], reverse=True)
+
+
+def facet_counts(documents: list) -> dict:
+    """
+    {field: [{"value", "count"}, ...]} over documents, most frequent first
+    """
+    facets = {}
+    for field in FACET_FIELDS:
+        counts = {}
+        for document in documents:
+            value = document['metadata'].get(field)
+            if value:
+                counts[value] = counts.get(value, 0) + 1
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:SEARCH_MAX_FACET_VALUES]
+        facets[field] = [{'value': value, 'count': count} for value, count in ranked]
+    return facets
+
+
+def search_page(request: dict, documents: list) -> dict:
+    """
+    The requested page of ranked documents with facets and the next cursor
+    """
+    offset, page_size = request['offset'], request['page_size']
+    end = offset + page_size
+    return {
+        'query': request['query'],
+        'total': len(documents),
+        'documents': documents[offset:end],
+        'facets': facet_counts(documents),
+        'next_cursor': encode_cursor(end, fingerprint(request)) if end < len(documents) else None,
+    }
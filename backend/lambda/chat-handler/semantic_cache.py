@@ -0,0 +1,166 @@
+"""
+Semantic Question Cache for the Chat Handler
+Serves cached answers for near-duplicate questions that an exact-key cache misses,
+e.g. "what was HR 1 in the 6th congress" vs "tell me about bill HR1 congress 6".
+
+How it works:
+- Questions are embedded with Titan Text Embeddings v2 (256 dims, normalized)
+- Vectors are quantized to int8 to keep the index compact (256 bytes per question)
+- Entries are partitioned by persona, language, metadata filter, the numbers and
+  proper nouns in the question and the corpus version, so "HR 1" never serves an
+  answer for "HR 2" and "Hamilton" never one for "Jefferson"
+- A brute-force dot-product scan finds the nearest neighbour inside a partition;
+  partitions are small (LRU-evicted), so a lookup takes a few milliseconds
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from operator import mul
+
+import boto3
+
+SEMANTIC_CACHE_EMBEDDING_MODEL_ID = os.environ.get('SEMANTIC_CACHE_EMBEDDING_MODEL_ID', 'amazon.titan-embed-text-v2:0')
+SEMANTIC_CACHE_DIMENSIONS = int(os.environ.get('SEMANTIC_CACHE_DIMENSIONS', '256'))
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get('SEMANTIC_CACHE_MAX_ENTRIES', '2000'))
+SEMANTIC_CACHE_MAX_PER_PARTITION = int(os.environ.get('SEMANTIC_CACHE_MAX_PER_PARTITION', '256'))
+
+# int8 quantization scale for unit vectors
+QUANT_SCALE = 127
+
+# Capitalized words, e.g. "Hamilton" in "Hamilton's report" or "McCulloch"
+CAPITALIZED_PATTERN = re.compile(r'\b[A-Z][a-z]+(?:[A-Z][a-z]+)*')
+# Capitalized words that are question or function words rather than names
+NON_ENTITY_WORDS = frozenset("""
+a about according after all also an and any are as at be before between bill bills by can compare
+congress could did do does during explain find for from give had has have house how i if in is it
+list me my of on or please president senate show summarize tell than that the their there these
+this those to versus vs was were what when where which who whom whose why will with would you
+""".split())
+
+bedrock_runtime = boto3.client('bedrock-runtime')
+
+
+def embed_question(question: str) -> list:
+    """
+    Embed a question with Titan Text Embeddings v2 (normalized vector)
+    """
+    response = bedrock_runtime.invoke_model(
+        modelId=SEMANTIC_CACHE_EMBEDDING_MODEL_ID,
+        body=json.dumps({
+            'inputText': question,
+            'dimensions': SEMANTIC_CACHE_DIMENSIONS,
+            'normalize': True,
+        }),
+        contentType='application/json',
+        accept='application/json',
+    )
+    return json.loads(response['body'].read())['embedding']
+
+
+def quantize(vector: list) -> array:
+    """
+    Quantize a unit vector to int8
+    """
+    return array('b', (max(-QUANT_SCALE, min(QUANT_SCALE, round(value * QUANT_SCALE))) for value in vector))
+
+
+def question_entities(question: str) -> list:
+    """
+    Proper nouns of a question, lowercased and sorted
+    """
+    words = (word.lower() for word in CAPITALIZED_PATTERN.findall(question))
+    return sorted({word for word in words if word not in NON_ENTITY_WORDS})
+
+
+def partition_key(persona: str, language: str, metadata_filter, question: str, corpus_version: int) -> str:
+    """
+    Partition for candidate answers: only questions that agree on everything
+    except phrasing may share an answer
+    """
+    numbers = sorted(set(re.findall(r'\d+', question)))
+    return json.dumps([persona, language, metadata_filter, numbers, question_entities(question), corpus_version],
+                      sort_keys=True)
+
+
+class SemanticCache:
+    """
+    In-memory nearest-neighbour cache of answered questions, kept per container
+    Thread-safe; evicts least recently used entries per partition and globally.
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+                 max_per_partition: int = SEMANTIC_CACHE_MAX_PER_PARTITION):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_per_partition = max_per_partition
+        self._partitions = {}
+        self._lru = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.lookup_ms_total = 0.0
+
+    def lookup(self, partition: str, vector: array):
+        """
+        Return (answer, similarity) for the nearest cached question above the
+        threshold, or (None, best_similarity)
+        """
+        start = time.perf_counter()
+        min_dot = self.threshold * QUANT_SCALE * QUANT_SCALE
+        best_id, best_dot = None, None
+        with self._lock:
+            for entry_id, (entry_vector, _) in self._partitions.get(partition, {}).items():
+                dot = sum(map(mul, vector, entry_vector))
+                if best_dot is None or dot > best_dot:
+                    best_id, best_dot = entry_id, dot
+
+            answer = None
+            if best_id is not None and best_dot >= min_dot:
+                answer = self._partitions[partition][best_id][1]
+                self._partitions[partition].move_to_end(best_id)
+                self._lru.move_to_end(best_id)
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.lookup_ms_total += (time.perf_counter() - start) * 1000
+
+        similarity = (best_dot / (QUANT_SCALE * QUANT_SCALE)) if best_dot is not None else 0.0
+        return answer, similarity
+
+    def add(self, partition: str, vector: array, answer: dict):
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            entries = self._partitions.setdefault(partition, OrderedDict())
+            entries[entry_id] = (vector, answer)
+            self._lru[entry_id] = partition
+
+            while len(entries) > self.max_per_partition:
+                evicted_id, _ = entries.popitem(last=False)
+                del self._lru[evicted_id]
+            while len(self._lru) > self.max_entries:
+                evicted_id, evicted_partition = self._lru.popitem(last=False)
+                del self._partitions[evicted_partition][evicted_id]
+                if not self._partitions[evicted_partition]:
+                    del self._partitions[evicted_partition]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._lru),
+                'partitions': len(self._partitions),
+                'index_bytes': len(self._lru) * SEMANTIC_CACHE_DIMENSIONS,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'avg_lookup_ms': (self.lookup_ms_total / lookups) if lookups else 0.0,
+            }
@@ -0,0 +1,178 @@
+"""
+Compact Sources for Chat Responses
+The Knowledge Base returns one reference per citation, so the same document
+shows up many times with its S3 URI and a snippet. Responses instead carry:
+
+- sources: one entry per document (public URL, title, date and type from the
+  document index, best score, reference count, one short snippet) with a source ID that GET /sources/{id} resolves to the full text
+- citations: indexes into sources instead of copies - answer spans for
+  retrieve_and_generate, the numbered context markers ([1], [2], ...) otherwise
+
+Source IDs are the base64url-encoded S3 key of a document in the data bucket,
+so no lookup table is needed; only bills/ and newspapers/ text files resolve.
+Documents are plain text, so "pages" are fixed-size SOURCE_PAGE_CHARS slices.
+"""
+
+import base64
+import os
+import threading
+from collections import OrderedDict
+
+SOURCE_SNIPPET_CHARS = int(os.environ.get('SOURCE_SNIPPET_CHARS', '160'))
+SOURCE_PAGE_CHARS = int(os.environ.get('SOURCE_PAGE_CHARS', '4000'))
+# Most pages returned by one GET /sources/{id}; the response says where to continue
+SOURCE_MAX_PAGES = int(os.environ.get('SOURCE_MAX_PAGES', '25'))
+# Document text kept per container for repeated source requests
+SOURCE_CACHE_MAX_CHARS = int(os.environ.get('SOURCE_CACHE_MAX_CHARS', '20000000'))
+
+SOURCE_KEY_PREFIXES = ('bills/', 'newspapers/')
+
+
+def source_id(uri: str, bucket: str):
+    """
+    Source ID for an s3:// URI in the data bucket, or None for anything else
+    """
+    prefix = f"s3://{bucket}/"
+    if not bucket or not uri.startswith(prefix):
+        return None
+    return base64.urlsafe_b64encode(uri[len(prefix):].encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def parse_source_id(value: str):
+    """
+    The S3 key for a source ID, or None when it is not a document key
+    """
+    try:
+        key = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode('utf-8')
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not key.startswith(SOURCE_KEY_PREFIXES) or not key.endswith('.txt') or '..' in key:
+        return None
+    return key
+
+
+class SourceIndex:
+    """
+    Sources deduplicated by document, in order of first appearance
+    """
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+        self.sources = []
+        self._positions = {}
+
+    def add(self, source: dict) -> tuple:
+        """
+        Add one reference; returns (index of its document, whether the document is new)
+        """
+        document = source.get('document_id') or source.get('url', '')
+        score = source.get('score', 0) or 0
+        index = self._positions.get(document)
+        if index is not None:
+            entry = self.sources[index]
+            entry['references'] += 1
+            if score > entry['score']:
+                entry['score'] = score
+                entry['snippet'] = source.get('content', '')[:SOURCE_SNIPPET_CHARS]
+            return index, False
+
+        self._positions[document] = len(self.sources)
+        self.sources.append({
+            'id': source_id(document, self.bucket),
+            'title': source.get('title', ''),
+            'url': source.get('url', ''),
+            'date': source.get('date', ''),
+            'type': source.get('type', ''),
+            'score': score,
+            'snippet': source.get('content', '')[:SOURCE_SNIPPET_CHARS],
+            'references': 1,
+        })
+        return len(self.sources) - 1, True
+
+
+def compact_sources(sources: list, citations: list = None, bucket: str = '') -> tuple:
+    """
+    Deduplicate a result's sources and point its citations at them
+
+    citations: retrieve_and_generate answer spans ({"start", "end", "references":
+    positions in sources}); without them, source N is context marker [N + 1].
+
+    Returns (sources, citations)
+    """
+    index = SourceIndex(bucket)
+    positions = [index.add(source)[0] for source in sources]
+    if citations is None:
+        compact_citations = [{'marker': position + 1, 'sources': [source_index]}
+                             for position, source_index in enumerate(positions)]
+    else:
+        compact_citations = [
+            {
+                'start': citation.get('start'),
+                'end': citation.get('end'),
+                'sources': sorted({positions[reference] for reference in citation['references']
+                                   if reference < len(positions)}),
+            }
+            for citation in citations
+        ]
+    return index.sources, compact_citations
+
+
+def parse_page_range(value: str, page_count: int):
+    """
+    "3" or "2-5" -> (first, last), 1-based and clamped; None when malformed
+    Without a value the range starts at page 1. At most SOURCE_MAX_PAGES pages.
+    """
+    try:
+        if not value:
+            first, last = 1, page_count
+        elif '-' in value:
+            first, last = (int(part) for part in value.split('-', 1))
+        else:
+            first = last = int(value)
+    except ValueError:
+        return None
+    if first < 1 or last < first:
+        return None
+    last = min(last, page_count, first + SOURCE_MAX_PAGES - 1)
+    return first, max(first, last)
+
+
+def page_count(text: str) -> int:
+    return max(1, -(-len(text) // SOURCE_PAGE_CHARS))
+
+
+def page_text(text: str, first: int, last: int) -> str:
+    return text[(first - 1) * SOURCE_PAGE_CHARS:last * SOURCE_PAGE_CHARS]
+
+
+class DocumentCache:
+    """
+    Thread-safe LRU of document text, bounded by total characters
+    """
+
+    def __init__(self, max_chars: int = SOURCE_CACHE_MAX_CHARS):
+        self.max_chars = max_chars
+        self._documents = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+            return document
+
+    def put(self, key: str, document: dict):
+        size = len(document['text'])
+        if size > self.max_chars:
+            return
+        with self._lock:
+            previous = self._documents.pop(key, None)
+            if previous is not None:
+                self._chars -= len(previous['text'])
+            self._documents[key] = document
+            self._chars += size
+            while self._chars > self.max_chars:
+                _, evicted = self._documents.popitem(last=False)
+                self._chars -= len(evicted['text'])
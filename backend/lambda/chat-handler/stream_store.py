@@ -0,0 +1,153 @@
+"""
+Stream Store for Chunked Chat Delivery
+Holds the incremental output of streaming chat generations so the frontend can
+poll for new tokens and citations while the answer is still being generated.
+
+Python Lambdas behind API Gateway cannot stream a response body, so streaming is
+delivered in chunks: a worker invocation appends generated text to the store as it
+arrives from retrieve_and_generate_stream, and GET /chat/stream/{streamId} returns
+everything after the client's cursor.
+
+Storage:
+- DynamoDB table (STREAM_TABLE) with TTL on `expires_at`, shared by all containers
+- In-memory stand-in when no table is configured (local testing, single container)
+"""
+
+import json
+import os
+import threading
+import time
+
+import boto3
+
+STREAM_TABLE = os.environ.get('STREAM_TABLE', '')
+STREAM_TTL_SECONDS = int(os.environ.get('STREAM_TTL_SECONDS', '3600'))
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class InMemoryStreamStore:
+    """
+    Local stand-in for the DynamoDB store (per container)
+    """
+
+    shared = False
+
+    def __init__(self):
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def create(self, stream_id: str, accepted_at_ms: int):
+        with self._lock:
+            self._streams[stream_id] = {
+                'stream_id': stream_id,
+                'status': 'pending',
+                'chunks': [],
+                'sources': [],
+                'accepted_at_ms': accepted_at_ms,
+                'expires_at': time.time() + STREAM_TTL_SECONDS,
+            }
+
+    def append(self, stream_id: str, chunks: list, sources: list):
+        with self._lock:
+            stream = self._streams[stream_id]
+            stream['chunks'].extend(chunks)
+            stream['sources'].extend(json.dumps(source) for source in sources)
+            stream['status'] = 'streaming'
+
+    def finish(self, stream_id: str, status: str, final: dict):
+        with self._lock:
+            stream = self._streams[stream_id]
+            stream['status'] = status
+            stream['final'] = json.dumps(final)
+
+    def read(self, stream_id: str):
+        with self._lock:
+            stream = self._streams.get(stream_id)
+            if stream is None or stream['expires_at'] < time.time():
+                return None
+            return {**stream, 'chunks': list(stream['chunks']), 'sources': list(stream['sources'])}
+
+
+class DynamoDBStreamStore:
+    """
+    DynamoDB-backed store shared across containers
+    Sources and the final payload are stored as JSON strings (DynamoDB rejects floats)
+    """
+
+    shared = True
+
+    def __init__(self, table_name: str):
+        self.table = boto3.resource('dynamodb').Table(table_name)
+
+    def create(self, stream_id: str, accepted_at_ms: int):
+        self.table.put_item(Item={
+            'stream_id': stream_id,
+            'status': 'pending',
+            'chunks': [],
+            'sources': [],
+            'accepted_at_ms': accepted_at_ms,
+            'expires_at': int(time.time() + STREAM_TTL_SECONDS),
+        })
+
+    def append(self, stream_id: str, chunks: list, sources: list):
+        self.table.update_item(
+            Key={'stream_id': stream_id},
+            UpdateExpression='SET chunks = list_append(chunks, :chunks), sources = list_append(sources, :sources), #status = :streaming',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':chunks': chunks,
+                ':sources': [json.dumps(source) for source in sources],
+                ':streaming': 'streaming',
+            },
+        )
+
+    def finish(self, stream_id: str, status: str, final: dict):
+        self.table.update_item(
+            Key={'stream_id': stream_id},
+            UpdateExpression='SET #status = :status, final = :final',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':status': status, ':final': json.dumps(final)},
+        )
+
+    def read(self, stream_id: str):
+        item = self.table.get_item(Key={'stream_id': stream_id}, ConsistentRead=True).get('Item')
+        if not item or int(item.get('expires_at', 0)) < time.time():
+            return None
+        return item
+
+
+def create_stream_store():
+    """
+    Build the stream store: DynamoDB when STREAM_TABLE is set, in-memory otherwise
+    """
+    if STREAM_TABLE:
+        return DynamoDBStreamStore(STREAM_TABLE)
+    return InMemoryStreamStore()
+
+
+def read_stream_page(store, stream_id: str, cursor: int, source_cursor: int):
+    """
+    Everything a poll needs: text and sources after the client's cursors,
+    the new cursors, status and (once finished) the final metrics
+    """
+    stream = store.read(stream_id)
+    if stream is None:
+        return None
+
+    chunks = stream.get('chunks', [])
+    sources = stream.get('sources', [])
+    page = {
+        'stream_id': stream_id,
+        'status': stream['status'],
+        'text': ''.join(chunks[cursor:]),
+        'cursor': len(chunks),
+        'sources': [json.loads(source) for source in sources[source_cursor:]],
+        'source_cursor': len(sources),
+        'done': stream['status'] in ('done', 'error'),
+    }
+    if page['done'] and stream.get('final'):
+        page.update(json.loads(stream['final']))
+    return page
@@ -0,0 +1,145 @@
+"""
+Unit tests for admission: bucket math, priority lanes and the shared DynamoDB bucket
+"""
+
+import threading
+from decimal import Decimal
+
+import pytest
+from botocore.exceptions import ClientError
+
+import admission
+from admission import (AdmissionController, AdmissionRejected, DynamoDBBucketStore, InMemoryBucketStore,
+                       refill, seconds_until)
+
+
+class FakeBucketTable:
+    """
+    The conditional writes DynamoDBBucketStore makes, evaluated like DynamoDB would
+    """
+
+    def __init__(self):
+        self.item = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def conditional_failure():
+        return ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+
+    def get_item(self, Key, ConsistentRead=False):
+        with self.lock:
+            return {'Item': dict(self.item)} if self.item else {}
+
+    def put_item(self, Item, ConditionExpression):
+        with self.lock:
+            if self.item is not None:
+                raise self.conditional_failure()
+            self.item = dict(Item)
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression, ExpressionAttributeValues, ReturnValues):
+        values = ExpressionAttributeValues
+        with self.lock:
+            item = self.item
+            if item is None or item['tokens'] < values[':needed']:
+                raise self.conditional_failure()
+            if ':previous' in values and item['refilled_at'] != values[':previous']:
+                raise self.conditional_failure()
+            if ':now' in values:
+                item['refilled_at'] = values[':now']
+            item['tokens'] += values[':change'] if ':change' in values else values[':minus_one']
+            return {'Attributes': {'tokens': item['tokens']}}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, 'time', lambda: now[0])
+    return now
+
+
+def dynamodb_store():
+    store = DynamoDBBucketStore('admission-test')
+    store.table = FakeBucketTable()
+    return store
+
+
+def test_refill_is_capped_at_capacity():
+    assert refill(2, 100, 101, capacity=10, rate=4) == 6
+    assert refill(2, 100, 110, capacity=10, rate=4) == 10
+    assert refill(2, 100, 99, capacity=10, rate=4) == 2
+
+
+def test_seconds_until():
+    assert seconds_until(0, 1, rate=4) == 1
+    assert seconds_until(0, 9, rate=4) == 3
+    assert seconds_until(5, 1, rate=4) == 1
+    assert seconds_until(0, 1, rate=0) == 60
+
+
+@pytest.mark.parametrize('make_store', [lambda: InMemoryBucketStore(10), dynamodb_store])
+def test_lanes_keep_a_reserve(clock, make_store):
+    controller = AdmissionController(make_store(), capacity=10, rate=1, lanes={'general': 0.4, 'staffer': 0.0})
+    for _ in range(6):
+        controller.admit('general')
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit('general')
+    assert rejected.value.retry_after == 1
+    # Higher-priority lanes still get the reserve
+    for _ in range(4):
+        controller.admit('staffer')
+    with pytest.raises(AdmissionRejected):
+        controller.admit('staffer')
+
+    clock[0] += 2
+    assert controller.admit('staffer') == pytest.approx(1)
+
+
+def test_unknown_personas_use_the_general_lane():
+    controller = AdmissionController(InMemoryBucketStore(10), capacity=10, rate=0, lanes={'general': 0.5})
+    assert controller.lane('someone') == 'general'
+    assert controller.floor('someone') == 5
+    for _ in range(5):
+        controller.admit('someone')
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit('someone')
+    assert rejected.value.persona == 'general'
+
+
+def test_store_failures_admit():
+    class BrokenStore:
+        def take(self, floor, capacity, rate):
+            raise ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException'}}, 'GetItem')
+
+    assert AdmissionController(BrokenStore(), capacity=10, rate=1, lanes={}).admit('general') == 10
+
+
+def test_dynamodb_bucket_refills_and_takes_in_one_write(clock):
+    store = dynamodb_store()
+    assert store.take(0, 10, 1) == (True, 9)
+    assert store.table.item['tokens'] == Decimal('9')
+
+    clock[0] += 0.5
+    admitted, tokens = store.take(0, 10, 1)
+    assert admitted and tokens == pytest.approx(8.5)
+    assert store.table.item['refilled_at'] == Decimal('1000.5')
+
+
+def test_dynamodb_contention_never_rejects_while_tokens_are_left(clock):
+    store = dynamodb_store()
+    controller = AdmissionController(store, capacity=10, rate=0, lanes={'general': 0.0})
+    results = []
+
+    def request():
+        try:
+            controller.admit('general')
+            results.append(True)
+        except AdmissionRejected:
+            results.append(False)
+
+    threads = [threading.Thread(target=request) for _ in range(30)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 10
+    assert store.table.item['tokens'] == 0
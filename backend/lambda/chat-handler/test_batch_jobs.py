@@ -0,0 +1,86 @@
+"""
+Unit tests for batch_jobs: request parsing, throughput and the job stores
+"""
+
+import io
+
+import pytest
+
+from batch_jobs import (BATCH_MAX_QUESTIONS, InMemoryBatchStore, S3BatchStore, new_status, parse_batch_request,
+                        questions_per_minute)
+
+
+class FakeS3:
+    """
+    The put_object/get_object calls S3BatchStore makes, over a dict
+    """
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+
+def test_parse_batch_request_applies_defaults():
+    questions = parse_batch_request({
+        'persona': 'staffer',
+        'questions': [' What was the Alien Act? ', {'message': 'Who was Matthew Lyon?', 'language': 'es', 'id': 'q2'},
+                      {'question': 'What did the embargo do?', 'persona': 'student'}],
+    })
+    assert questions == [
+        {'question': 'What was the Alien Act?', 'persona': 'staffer', 'language': 'en', 'id': 0},
+        {'question': 'Who was Matthew Lyon?', 'persona': 'staffer', 'language': 'es', 'id': 'q2'},
+        {'question': 'What did the embargo do?', 'persona': 'student', 'language': 'en', 'id': 2},
+    ]
+
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'questions': []},
+    {'questions': 'What was the Alien Act?'},
+    {'questions': ['x'] * (BATCH_MAX_QUESTIONS + 1)},
+    {'questions': ['What was the Alien Act?', 42]},
+    {'questions': [{'question': '   '}]},
+    {'questions': ['x' * 2001]},
+])
+def test_parse_batch_request_rejects(body):
+    with pytest.raises(ValueError):
+        parse_batch_request(body)
+
+
+def test_questions_per_minute():
+    assert questions_per_minute(30, 60) == 30.0
+    assert questions_per_minute(10, 7) == 85.7
+    assert questions_per_minute(5, 0) == 0.0
+
+
+@pytest.mark.parametrize('make_store', [InMemoryBatchStore, lambda: S3BatchStore('data-bucket')])
+def test_store_round_trip(make_store):
+    store = make_store()
+    if isinstance(store, S3BatchStore):
+        store.s3 = FakeS3()
+    questions = parse_batch_request({'questions': ['What was the Alien Act?', 'Who was Matthew Lyon?']})
+    status = new_status('job-1', questions)
+    store.create('job-1', questions, status)
+
+    assert store.read_questions('job-1') == questions
+    assert store.read_status('job-1') == status
+    assert store.read_status('job-2') is None
+    assert store.read_results('job-1') == []
+
+    results = [{'id': 0, 'answer': 'An act of 1798.'}, {'id': 1, 'answer': 'A Vermont congressman.'}]
+    store.write_results('job-1', results[:1])
+    store.write_results('job-1', results)
+    store.write_status('job-1', {**status, 'completed': 2, 'status': 'complete'})
+    assert store.read_results('job-1') == results
+    assert store.read_status('job-1')['status'] == 'complete'
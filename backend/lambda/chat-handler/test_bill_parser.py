@@ -0,0 +1,66 @@
+"""
+Unit tests for bill_parser: citation styles, congress binding and false positives
+"""
+
+import pytest
+
+from bill_parser import extract_bill_references, find_congresses, tokenize
+
+
+def bill(bill_type, number, congress=None):
+    reference = {'bill_type': bill_type, 'bill_number': str(number)}
+    if congress is not None:
+        reference['congress'] = str(congress)
+    return reference
+
+
+@pytest.mark.parametrize('question, expected', [
+    ('what is bill HR 1 in congress 6?', [bill('HR', 1, 6)]),
+    ('H.R. 12 of the Sixth Congress', [bill('HR', 12, 6)]),
+    ('S4 in the 6th congress', [bill('S', 4, 6)]),
+    ('Congress 6 bill H. J. Res. 2', [bill('HJRES', 2, 6)]),
+    ('S.Con.Res. 3 of the XVI Congress', [bill('SCONRES', 3, 16)]),
+    ('Senate joint resolution 2, Twenty-third Congress', [bill('SJRES', 2, 23)]),
+    ('House bill No. 5', [bill('HR', 5)]),
+])
+def test_citation_styles(question, expected):
+    assert extract_bill_references(question) == expected
+
+
+def test_each_bill_binds_to_the_following_congress():
+    assert extract_bill_references('HR 1 of the 6th congress and S 2 of the 8th congress') == [
+        bill('HR', 1, 6), bill('S', 2, 8)]
+
+
+def test_congresses_written_first_bind_forward():
+    assert extract_bill_references('congress 6: HR 1; congress 7: HR 2') == [bill('HR', 1, 6), bill('HR', 2, 7)]
+
+
+@pytest.mark.parametrize('question, expected', [
+    ('HR 1 of the 6th congress and S 2 of the 7th', [bill('HR', 1, 6), bill('S', 2, 7)]),
+    ('S 2 of the 7th', [bill('S', 2, 7)]),
+    ('compare HR 1 and S 2 of the twenty third', [bill('HR', 1, 23), bill('S', 2, 23)]),
+    ('HR 5 of the 4th of July', [bill('HR', 5)]),
+    ('HR 3 of the 2nd session of the 6th congress', [bill('HR', 3, 6)]),
+])
+def test_bare_ordinal_congress(question, expected):
+    assert extract_bill_references(question) == expected
+
+
+def test_bare_ordinals_are_not_congresses_without_a_bill():
+    assert find_congresses(tokenize('what happened at the end of the 7th')) == []
+
+
+@pytest.mark.parametrize('question', [
+    'In the 1790s 3 bills passed',
+    'how many bills in the 1800s 2 of them',
+    "it's 4 o'clock",
+    'cited at 17 U.S. 316',
+    'what did the senate debate in 1798',
+])
+def test_no_false_positives(question):
+    assert extract_bill_references(question) == []
+
+
+def test_decades_are_single_tokens():
+    assert tokenize('In the 1790s, S 3') == ['in', 'the', '1790s', 's', '3']
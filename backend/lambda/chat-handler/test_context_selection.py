@@ -0,0 +1,59 @@
+"""
+Unit tests for context_selection: score cutoffs, fusion and selection
+"""
+
+from context_selection import reciprocal_rank_fusion, score_cutoff, select_context
+
+
+def chunks(source_type, count, top_score=0.8, step=0.01):
+    return [{'content': {'text': f"{source_type} {i} text about the alien and sedition acts of {1790 + i}"},
+             'location': {'s3Location': {'uri': f"s3://data-bucket/{source_type}/{i}.txt"}},
+             'metadata': {'entity_type': source_type},
+             'score': top_score - i * step} for i in range(count)]
+
+
+def test_score_cutoff_is_relative_to_the_best():
+    results = chunks('bill', 5, top_score=0.8, step=0.15)
+    assert [result['score'] for result in score_cutoff(results)] == [0.8, 0.65, 0.5]
+    assert score_cutoff([]) == []
+
+
+def test_fusion_cuts_each_list_on_its_own_scores():
+    # Newspapers score far higher than bills; bills are still kept by their own best
+    bills = chunks('bill', 3, top_score=0.3, step=0.1)
+    newspapers = chunks('newspaper', 3, top_score=0.9)
+    fused = reciprocal_rank_fusion([bills, newspapers])
+    assert sorted(result['content']['text'].split()[1] for result in fused
+                  if result['metadata']['entity_type'] == 'bill') == ['0', '1']
+    assert fused[0]['vector_score'] in (0.3, 0.9)
+
+
+def test_overlapping_lists_do_not_crowd_out_the_rest():
+    # A person search over newspapers overlaps the newspaper search: those chunks
+    # fuse to twice the score of anything found by one list
+    bills = chunks('bill', 10)
+    newspapers = chunks('newspaper', 10)
+    person = newspapers[:5]
+    fused = reciprocal_rank_fusion([bills, newspapers, person])
+    assert len(fused) == 20
+
+    selected, stats = select_context(fused, max_chunks=12, fused=True)
+    assert stats['after_score_cutoff'] == 20
+    assert sum(result['metadata']['entity_type'] == 'bill' for result in selected) >= 5
+
+    # The relative cutoff on fused scores is what dropped them
+    _, unfused_stats = select_context(fused, max_chunks=12)
+    assert unfused_stats['after_score_cutoff'] == 6
+
+
+def test_keyword_results_fuse_with_the_vector_lists():
+    # Hybrid retrieval: BM25 scores are on another scale, and a document found by
+    # both kinds of search must not push out what only one of them found
+    bills = chunks('bill', 10)
+    newspapers = chunks('newspaper', 10)
+    keyword = [{**result, 'score': 12.0 - i} for i, result in enumerate(chunks('bill', 3) + chunks('newspaper', 3))]
+    fused = reciprocal_rank_fusion([bills, newspapers, keyword])
+
+    selected, stats = select_context(fused, max_chunks=12, fused=True)
+    assert stats['after_score_cutoff'] == 20
+    assert sum(result['metadata']['entity_type'] == 'bill' for result in selected) >= 5
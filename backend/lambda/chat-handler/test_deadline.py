@@ -0,0 +1,71 @@
+"""
+Unit tests for deadline: hedged generation and when a hedge is worth starting
+"""
+
+import time
+
+import pytest
+
+import lambda_function
+from deadline import run_hedged
+
+FAST = {'model_id': 'anthropic.claude-3-haiku-20240307-v1:0', 'model_arn': 'fast-arn', 'prompt_caching': False}
+
+
+def slow(seconds, value):
+    def run():
+        time.sleep(seconds)
+        return value
+    return run
+
+
+def test_hedge_wins_a_slow_primary():
+    result, info = run_hedged(slow(1.0, 'primary'), slow(0, 'hedge'), time.monotonic() + 0.4)
+    assert (result, info['winner'], info['hedged']) == ('hedge', 'hedge', True)
+
+
+def test_unadmitted_hedge_waits_for_the_primary():
+    result, info = run_hedged(slow(0.6, 'primary'), slow(0, 'hedge'), time.monotonic() + 0.8, lambda: False)
+    assert (result, info['winner'], info['hedge_skipped']) == ('primary', 'primary', True)
+
+
+def test_without_a_hedge_the_primary_keeps_the_deadline():
+    result, info = run_hedged(slow(1.0, 'primary'), None, time.monotonic() + 0.2)
+    assert (result, info['winner'], info['hedged']) == (None, 'deadline_exceeded', False)
+    assert 'hedge_skipped' not in info
+
+
+@pytest.fixture
+def generation(monkeypatch):
+    plans = []
+    admitted = []
+
+    def generate_answer(question, persona, route, plan):
+        plans.append(plan)
+        time.sleep(0.6 if len(plans) == 1 else 0)
+        return {'answer': plan['tier'], 'sources': [], 'metrics': {}}
+
+    monkeypatch.setattr(lambda_function, 'generate_answer', generate_answer)
+    monkeypatch.setattr(lambda_function, 'get_resolved_config', lambda: {'model_tiers': {'fast': FAST}})
+    monkeypatch.setattr(lambda_function.admission, 'admit', lambda lane: admitted.append(lane))
+    return plans, admitted
+
+
+def plan(tier, **budgets):
+    return {'tier': tier, 'deadline': time.monotonic() + 0.8, 'max_tokens': 500, 'retrieve_results': 10,
+            'context_max_tokens': 2000, **budgets}
+
+
+def test_fast_plans_are_not_hedged_with_a_copy(generation):
+    plans, admitted = generation
+    result = lambda_function.generate_within_deadline('Who was Matthew Lyon?', 'general', {}, plan('fast'))
+    assert result['answer'] == 'fast'
+    assert len(plans) == 1 and admitted == []
+    assert not result['metrics']['hedge']['hedged']
+
+
+def test_fast_plans_with_larger_budgets_are_hedged(generation):
+    plans, admitted = generation
+    lambda_function.generate_within_deadline('Who was Matthew Lyon?', 'general', {}, plan('fast', max_tokens=2000))
+    assert [p['max_tokens'] for p in plans] == [2000, lambda_function.HEDGE_MAX_TOKENS]
+    assert admitted == ['general']
@@ -0,0 +1,92 @@
+"""
+Unit tests for keyword_index: a builder/reader round trip, phrases, filters and common terms
+"""
+
+import importlib.util
+import os
+
+import pytest
+
+from keyword_index import KeywordIndex, filter_matches, parse_query
+
+BUILDER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'fargate', 'keyword_index.py')
+spec = importlib.util.spec_from_file_location('keyword_index_builder', BUILDER_PATH)
+builder = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(builder)
+
+DOCUMENTS = [
+    ('bills/congress_5/hr_1.txt', 'An act concerning aliens, passed by Congress in its second session.',
+     {'entity_type': 'bill', 'year': '1798', 'congress': '5'}),
+    ('bills/congress_5/hr_2.txt', 'An act for the punishment of sedition. Congress session notes.',
+     {'entity_type': 'bill', 'year': '1798', 'congress': '5'}),
+    ('newspapers/batch/page_1.txt', 'Matthew Lyon of Vermont was tried for sedition. Congress adjourned.',
+     {'entity_type': 'newspaper', 'year': '1798'}),
+    ('newspapers/batch/page_2.txt', 'Lyon, Matthew, re-elected from Vermont while in jail. Congress session.',
+     {'entity_type': 'newspaper', 'year': '1799'}),
+    ('newspapers/batch/page_3.txt', 'Yellow fever in Philadelphia; the session of Congress moved.',
+     {'entity_type': 'newspaper', 'year': '1798'}),
+]
+
+
+@pytest.fixture(scope='module', params=[1 << 30, 1], ids=['one-segment', 'segment-per-document'])
+def index(request, tmp_path_factory):
+    work_dir = tmp_path_factory.mktemp('keyword-index')
+    path = str(work_dir / 'keyword_index.bin')
+    index_builder = builder.KeywordIndexBuilder(path, work_dir=str(work_dir), segment_bytes=request.param)
+    for key, text, metadata in DOCUMENTS:
+        index_builder.add(key, text, metadata)
+    stats = index_builder.finish()
+    assert stats['documents'] == len(DOCUMENTS)
+    return KeywordIndex(path)
+
+
+def keys(hits):
+    return [hit['key'] for hit in hits]
+
+
+def test_round_trip(index):
+    assert index.documents == len(DOCUMENTS)
+    assert index.lookup('congress')[0] == len(DOCUMENTS)
+    assert index.lookup('sedition')[0] == 2
+    assert index.lookup('the') is None
+    assert index.document(2) == ('newspapers/batch/page_1.txt', {'entity_type': 'newspaper', 'year': '1798'})
+
+
+def test_search_ranks_rare_terms(index):
+    hits = index.search('yellow fever Congress')
+    assert keys(hits) == ['newspapers/batch/page_3.txt']
+
+
+def test_phrases_must_match_verbatim(index):
+    assert parse_query('"Matthew Lyon" trial') == (['matthew', 'lyon', 'trial'], [[('matthew', 0), ('lyon', 1)]])
+    assert keys(index.search('"Matthew Lyon"')) == ['newspapers/batch/page_1.txt']
+    assert index.search('"Lyon Vermont"') == []
+    assert index.search('"Matthew Hamilton"') == []
+
+
+def test_accept_filters_before_the_limit(index):
+    metadata_filter = {'equals': {'key': 'entity_type', 'value': 'bill'}}
+    hits = index.search('sedition', limit=1, accept=lambda metadata: filter_matches(metadata_filter, metadata))
+    assert keys(hits) == ['bills/congress_5/hr_2.txt']
+
+
+def test_all_common_terms_rank_by_the_rarest(index):
+    # Both terms are in more than half the documents; "session" is the rarer one
+    assert index.lookup('session')[0] == 4
+    assert sorted(keys(index.search('congress session'))) == sorted(
+        key for key, text, _ in DOCUMENTS if 'session' in text)
+
+
+def test_filter_matches():
+    metadata = {'entity_type': 'newspaper', 'year': '1798', 'places': ['vermont']}
+    assert filter_matches(None, metadata)
+    assert filter_matches({'andAll': [{'equals': {'key': 'year', 'value': 1798}},
+                                      {'notEquals': {'key': 'entity_type', 'value': 'bill'}}]}, metadata)
+    assert filter_matches({'orAll': [{'in': {'key': 'year', 'value': ['1790', '1798']}},
+                                     {'equals': {'key': 'entity_type', 'value': 'bill'}}]}, metadata)
+    assert filter_matches({'listContains': {'key': 'places', 'value': 'vermont'}}, metadata)
+    assert not filter_matches({'listContains': {'key': 'places', 'value': 'ohio'}}, metadata)
+    # Documents carry no entity tags: a tag condition never matches them
+    assert not filter_matches({'listContains': {'key': 'persons', 'value': 'lyon'}}, metadata)
+    with pytest.raises(ValueError):
+        filter_matches({'greaterThan': {'key': 'year', 'value': 1790}}, metadata)
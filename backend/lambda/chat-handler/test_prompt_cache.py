@@ -0,0 +1,63 @@
+"""
+Unit tests for prompt caching: supported models and cache point placement
+"""
+
+import pytest
+
+import lambda_function
+from prompt_cache import CACHE_POINT, PROMPT_CACHE_MIN_TOKENS, PromptCacheStats, supports_prompt_caching
+
+LONG_PROMPT = 'You answer questions about early American newspapers and bills. ' * 80
+
+
+@pytest.fixture
+def long_system_prompt(monkeypatch):
+    monkeypatch.setattr(lambda_function, 'get_resolved_config', lambda: {'system_prompts': {'general': LONG_PROMPT}})
+
+
+def plan(model_id):
+    return {'model_id': model_id, 'prompt_caching': supports_prompt_caching(model_id), 'max_tokens': 500}
+
+
+def test_supported_models():
+    assert supports_prompt_caching('us.anthropic.claude-sonnet-4-20250514-v1:0')
+    assert supports_prompt_caching('anthropic.claude-3-5-haiku-20241022-v1:0')
+    # The stack's default models
+    assert not supports_prompt_caching('anthropic.claude-3-5-sonnet-20241022-v2:0')
+    assert not supports_prompt_caching('anthropic.claude-3-haiku-20240307-v1:0')
+
+
+def test_cache_points_follow_the_stable_prefix(long_system_prompt):
+    assert len(LONG_PROMPT) // 4 >= PROMPT_CACHE_MIN_TOKENS
+    request = lambda_function.build_converse_request(
+        'What was the Alien Act?', 'general', 'context ' * 10, 'Search results',
+        plan('us.anthropic.claude-sonnet-4-20250514-v1:0'))
+    assert request['system'] == [{'text': LONG_PROMPT}, CACHE_POINT]
+    content = request['messages'][0]['content']
+    assert content[1] == CACHE_POINT
+    assert content[2]['text'].startswith('Question: What was the Alien Act?')
+
+
+def test_no_cache_points_for_unsupported_models(long_system_prompt):
+    request = lambda_function.build_converse_request(
+        'What was the Alien Act?', 'general', 'context', 'Search results',
+        plan('anthropic.claude-3-5-sonnet-20241022-v2:0'))
+    assert CACHE_POINT not in request['system']
+    assert CACHE_POINT not in request['messages'][0]['content']
+
+
+def test_short_prefixes_are_not_cached(monkeypatch):
+    monkeypatch.setattr(lambda_function, 'get_resolved_config', lambda: {'system_prompts': {'general': 'Be brief.'}})
+    request = lambda_function.build_converse_request(
+        'What was the Alien Act?', 'general', 'context', 'Search results',
+        plan('us.anthropic.claude-sonnet-4-20250514-v1:0'))
+    assert request['system'] == [{'text': 'Be brief.'}]
+    assert CACHE_POINT not in request['messages'][0]['content']
+
+
+def test_stats_estimate_latency_saved():
+    stats = PromptCacheStats()
+    stats.record('general', {'inputTokens': 2000, 'cacheWriteInputTokens': 1500}, 1000)
+    saved = stats.record('general', {'inputTokens': 500, 'cacheReadInputTokens': 1500}, 600)
+    assert saved == {'cache_read_tokens': 1500, 'cache_write_tokens': 0, 'latency_saved_ms_estimate': 400}
+    assert stats.summary()['general']['cache_hits'] == 1
@@ -0,0 +1,107 @@
+"""
+Unit tests for query_router: cues, cue filters, relaxation and comparisons
+"""
+
+import pytest
+
+from entity_extractor import PLACES, extract_entities
+from query_router import (CANONICAL_PLACES, TAGGED_PLACE_NAMES, build_cue_filter, congress_years, decompose_question,
+                          extract_query_cues, find_persons, find_years, place_filter, relax_cues)
+
+
+@pytest.mark.parametrize('question, years', [
+    ('what happened in 1793', [1793]),
+    ('July 4, 1776', [1776]),
+    ('between 1790 and 1792', [1790, 1791, 1792]),
+    ('from 1795 to 1796', [1795, 1796]),
+    ('the 1790s', list(range(1790, 1800))),
+    ('no year here', []),
+])
+def test_find_years(question, years):
+    assert find_years(question) == years
+
+
+def test_congress_without_a_year_maps_to_its_years():
+    assert congress_years(6) == [1799, 1800, 1801]
+    assert extract_query_cues('laws of the 6th Congress')['years'] == ['1799', '1800', '1801']
+
+
+def test_newspaper_cues():
+    cues = extract_query_cues('newspapers in Philadelphia in 1793')
+    assert cues == {'years': ['1793'], 'entity_type': 'newspaper', 'places': ['Philadelphia']}
+    assert build_cue_filter(cues) == {'andAll': [
+        {'equals': {'key': 'entity_type', 'value': 'newspaper'}},
+        {'equals': {'key': 'year', 'value': '1793'}},
+        {'orAll': [
+            {'stringContains': {'key': 'place_of_publication', 'value': 'Philadelphia'}},
+            {'listContains': {'key': 'places', 'value': 'Philadelphia'}},
+        ]},
+    ]}
+
+
+def test_state_places_also_match_the_abbreviation():
+    place = build_cue_filter({'places': ['Pennsylvania']})
+    assert {'stringContains': {'key': 'place_of_publication', 'value': 'Pa.'}} in place['orAll']
+
+
+def test_place_tags_use_the_extractors_names():
+    assert extract_entities('Letters from the City of Washington')['places'] == ['Washington, D.C.']
+    assert extract_query_cues('newspapers published in Washington')['places'] == ['Washington']
+    for place in ('Washington', 'District of Columbia'):
+        assert {'listContains': {'key': 'places', 'value': 'Washington, D.C.'}} in place_filter(place)['orAll']
+    # Every place the router finds is one the extractor can tag
+    for place in CANONICAL_PLACES.values():
+        assert TAGGED_PLACE_NAMES.get(place, place) in PLACES
+
+
+def test_bill_questions_have_no_place_cue():
+    assert 'places' not in extract_query_cues('bills about Virginia in 1790')
+
+
+def test_no_cues_no_filter():
+    assert extract_query_cues('tell me something interesting') == {}
+    assert build_cue_filter({}) is None
+
+
+@pytest.mark.parametrize('question, persons', [
+    ('What did Hamilton say about the bank?', ['Alexander Hamilton']),
+    ('What did President Adams say?', ['John Adams']),
+    ('What did Adams say?', []),
+    ('newspapers printed in Washington', []),
+    ('What did Washington write in his farewell address?', ['George Washington']),
+])
+def test_find_persons(question, persons):
+    assert find_persons(question) == persons
+
+
+def test_persons_never_filter():
+    cues = extract_query_cues('What did Hamilton say?')
+    assert cues == {'persons': ['Alexander Hamilton']}
+    assert build_cue_filter(cues) is None
+
+
+def test_relax_drops_years_then_keeps_the_document_type():
+    cues = extract_query_cues('newspapers on July 4, 1776')
+    relaxed = relax_cues(cues)
+    assert relaxed == {'entity_type': 'newspaper'}
+    assert relax_cues(relaxed) == {}
+    assert relax_cues(extract_query_cues('What happened on July 4, 1776')) == {}
+
+
+def test_relax_keeps_persons():
+    assert relax_cues({'years': ['1776'], 'persons': ['Thomas Jefferson']}) == {'persons': ['Thomas Jefferson']}
+
+
+@pytest.mark.parametrize('question, parts', [
+    ('compare the Alien Act and the Sedition Act', ['the Alien Act', 'the Sedition Act']),
+    ('What are the differences between Federalists and Republicans?', ['Federalists', 'Republicans']),
+    ('how did Hamilton versus Jefferson differ', ['Hamilton', 'Jefferson']),
+    ('How did Hamilton vs. Jefferson differ on the national bank?',
+     ['Hamilton on the national bank', 'Jefferson on the national bank']),
+    ('how did the Federalists and the Republicans differ on France',
+     ['the Federalists on France', 'the Republicans on France']),
+    ('how did the Senate and the House vote', []),
+    ('what is the Jay Treaty', []),
+])
+def test_decompose_question(question, parts):
+    assert decompose_question(question) == parts
@@ -0,0 +1,120 @@
+"""
+Unit tests for search: request validation, filters, cursors, grouping and fusion
+"""
+
+import pytest
+
+from search import (SEARCH_MAX_YEAR_RANGE, build_search_filter, fuse_documents, group_documents,
+                    parse_search_request, search_page)
+
+BUCKET = 'data-bucket'
+
+
+def chunk(key, score, text='', **metadata):
+    return {'location': {'s3Location': {'uri': f"s3://{BUCKET}/{key}"}}, 'score': score,
+            'content': {'text': text}, 'metadata': metadata}
+
+
+def documents(count):
+    return [{'id': f"doc-{i}", 'url': '', 'snippet': '', 'score': 1.0 / (i + 1),
+             'metadata': {'entity_type': 'bill', 'year': str(1790 + i % 3)}} for i in range(count)]
+
+
+def test_parse_search_request_defaults():
+    request = parse_search_request({'query': '  Alien and Sedition Acts '})
+    assert request['query'] == 'Alien and Sedition Acts'
+    assert request['mode'] == 'hybrid'
+    assert request['offset'] == 0
+    assert request['metadata_filter'] is None
+
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'query': 'x' * 1001},
+    {'query': 'tariff', 'filters': ['bill']},
+    {'query': 'tariff', 'filters': {'author': 'Hamilton'}},
+    {'query': 'tariff', 'filters': {'year': {'from': 1790}}},
+    {'query': 'tariff', 'page_size': 0},
+    {'query': 'tariff', 'page_size': 'ten'},
+    {'query': 'tariff', 'mode': 'fuzzy'},
+    {'query': 'tariff', 'cursor': 'not-a-cursor'},
+])
+def test_parse_search_request_rejects(body):
+    with pytest.raises(ValueError):
+        parse_search_request(body)
+
+
+def test_build_search_filter():
+    assert build_search_filter({}) is None
+    assert build_search_filter({'entity_type': 'bill'}) == {'equals': {'key': 'entity_type', 'value': 'bill'}}
+    assert build_search_filter({'newspaper_title': 'Aurora'}) == {
+        'stringContains': {'key': 'newspaper_title', 'value': 'Aurora'}}
+    assert build_search_filter({'congress': [5, '6'], 'year_from': 1798, 'year_to': 1799}) == {'andAll': [
+        {'in': {'key': 'congress', 'value': ['5', '6']}},
+        {'in': {'key': 'year', 'value': ['1798', '1799']}},
+    ]}
+    assert build_search_filter({'year_to': 1800}) == {'equals': {'key': 'year', 'value': '1800'}}
+
+
+@pytest.mark.parametrize('filters', [
+    {'year_from': 1800, 'year_to': 1790},
+    {'year_from': 1700, 'year_to': 1700 + SEARCH_MAX_YEAR_RANGE},
+    {'year_from': 'early'},
+])
+def test_build_search_filter_rejects_year_ranges(filters):
+    with pytest.raises(ValueError):
+        build_search_filter(filters)
+
+
+def test_cursors_page_through_the_same_query():
+    body = {'query': 'embargo', 'filters': {'entity_type': 'bill'}, 'page_size': 10}
+    request = parse_search_request(body)
+    ranked = documents(25)
+
+    pages = []
+    while True:
+        page = search_page(request, ranked)
+        pages.append(page)
+        if page['next_cursor'] is None:
+            break
+        # The cursor survives normalization of the query text
+        request = parse_search_request({**body, 'query': 'Embargo ', 'cursor': page['next_cursor']})
+
+    assert [len(page['documents']) for page in pages] == [10, 10, 5]
+    assert [document['id'] for page in pages for document in page['documents']] == [d['id'] for d in ranked]
+    assert pages[0]['total'] == 25
+    assert pages[0]['facets']['year'] == [{'value': '1790', 'count': 9}, {'value': '1791', 'count': 8},
+                                          {'value': '1792', 'count': 8}]
+
+
+def test_cursors_belong_to_their_query():
+    body = {'query': 'embargo', 'page_size': 10}
+    cursor = search_page(parse_search_request(body), documents(25))['next_cursor']
+    for other in ({**body, 'query': 'tariff'}, {**body, 'filters': {'entity_type': 'bill'}},
+                  {**body, 'mode': 'keyword'}):
+        with pytest.raises(ValueError):
+            parse_search_request({**other, 'cursor': cursor})
+
+
+def test_group_documents_keeps_the_best_chunk():
+    results = [
+        chunk('bills/congress_5/hr_1.txt', 0.4, 'weaker', entity_type='bill', congress=5, bill_title='Alien Act'),
+        chunk('newspapers/batch/page_1.txt', 0.6, 'page', entity_type='newspaper', year='1798'),
+        chunk('bills/congress_5/hr_1.txt', 0.9, 'stronger', entity_type='bill', congress=5, bill_title='Alien Act'),
+    ]
+    grouped = group_documents(results, BUCKET)
+    assert [document['title'] for document in grouped] == ['Alien Act', '']
+    assert grouped[0]['score'] == 0.9
+    assert grouped[0]['snippet'] == 'stronger'
+    assert grouped[0]['chunks'] == 2
+    assert grouped[0]['metadata'] == {'entity_type': 'bill', 'congress': '5'}
+
+
+def test_fuse_documents_ranks_by_both_lists():
+    semantic = [{'id': 'a', 'url': '', 'snippet': 'a', 'score': 0.9},
+                {'id': 'b', 'url': '', 'snippet': '', 'score': 0.8}]
+    keyword = [{'id': 'b', 'url': '', 'snippet': 'b', 'score': 12.0},
+               {'id': 'c', 'url': '', 'snippet': 'c', 'score': 3.0}]
+    fused = fuse_documents([semantic, keyword])
+    assert [document['id'] for document in fused] == ['b', 'a', 'c']
+    assert fused[0]['snippet'] == 'b'
@@ -0,0 +1,66 @@
+"""
+Unit tests for semantic_cache: partitioning and nearest-neighbour lookup
+"""
+
+import math
+
+from semantic_cache import SemanticCache, partition_key, quantize, question_entities
+
+
+def unit(*values):
+    norm = math.sqrt(sum(value * value for value in values))
+    return quantize([value / norm for value in values])
+
+
+def partition(question, persona='general', metadata_filter=None, corpus_version=1):
+    return partition_key(persona, 'en', metadata_filter, question, corpus_version)
+
+
+def test_question_entities_skips_question_words():
+    assert question_entities("How did Hamilton's report differ?") == ['hamilton']
+    assert question_entities('What was HR 1 in the 6th Congress') == []
+    assert question_entities('Tell me about McCulloch') == ['mcculloch']
+
+
+def test_different_people_never_share_a_partition():
+    assert (partition('How did Hamilton view the national bank?')
+            != partition('How did Jefferson view the national bank?'))
+
+
+def test_rephrasing_shares_a_partition():
+    assert partition('What did Hamilton think of the bank?') == partition('Hamilton - views on the bank?')
+
+
+def test_numbers_persona_filter_and_version_split_partitions():
+    question = 'What was HR 1 in the 6th Congress'
+    assert partition(question) != partition('What was HR 2 in the 6th Congress')
+    assert partition(question) != partition(question, persona='student')
+    assert partition(question) != partition(question, metadata_filter={'equals': {'key': 'congress', 'value': '6'}})
+    assert partition(question) != partition(question, corpus_version=2)
+
+
+def test_lookup_hits_only_above_threshold_and_in_partition():
+    cache = SemanticCache(threshold=0.9)
+    cache.add('p', unit(1, 0, 0), {'answer': 'cached'})
+
+    answer, similarity = cache.lookup('p', unit(1, 0.1, 0))
+    assert answer == {'answer': 'cached'}
+    assert similarity > 0.9
+
+    assert cache.lookup('p', unit(1, 1, 0))[0] is None
+    assert cache.lookup('other', unit(1, 0, 0)) == (None, 0.0)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_eviction_per_partition_and_globally():
+    cache = SemanticCache(threshold=0.9, max_entries=3, max_per_partition=2)
+    for index in range(3):
+        cache.add('a', unit(1, index, 0), {'answer': index})
+    assert cache.stats()['entries'] == 2
+    assert cache.lookup('a', unit(1, 0, 0))[0] is None
+
+    cache.add('b', unit(0, 0, 1), {'answer': 'b1'})
+    cache.add('b', unit(0, 1, 1), {'answer': 'b2'})
+    stats = cache.stats()
+    assert stats['entries'] == 3
+    assert stats['partitions'] == 2
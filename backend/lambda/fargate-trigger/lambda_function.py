@@ -1,6 +1,9 @@
 import json
 import boto3
 import os
+from structured_log import get_logger
+
+log = get_logger('fargate-trigger')
 
 ecs_client = boto3.client('ecs')
 
@@ -8,6 +11,7 @@ def lambda_handler(event, context):
     """
     Triggers Fargate task to collect bills from Congress API
     """
+    log.bind(context)
     try:
         # Parse request
         body = json.loads(event.get('body', '{}'))
@@ -84,7 +88,7 @@ def lambda_handler(event, context):
         }
         
     except Exception as e:
-        print(f"Error starting Fargate task: {str(e)}")
+        log.error("Error starting Fargate task: %s", e, exc_info=True)
         return {
             'statusCode': 500,
             'headers': {
@@ -1,27 +1,45 @@
 """
 Knowledge Base Sync Trigger Lambda
 Automatically triggers Bedrock Knowledge Base sync after Neptune loading
+
+Also the single completion path for every ingestion, however it was started
+(this Lambda, the collector or the console): a schedule invokes it with
+{"action": "check_ingestion"}, and when a newer COMPLETE ingestion job is found
+it bumps the corpus version in the answer cache table. Chat handlers key their
+caches on that version and reload the document and keyword indexes when it changes.
 """
 
-import json
 import os
+from datetime import timezone
+
 import boto3
+from botocore.exceptions import ClientError
+from structured_log import get_logger
+
+log = get_logger('kb-sync-trigger')
 
 bedrock_agent = boto3.client('bedrock-agent')
 
 KB_ID = os.environ['KNOWLEDGE_BASE_ID']
-DS_ID = os.environ['DATA_SOURCE_ID']
+DS_ID = os.environ.get('DATA_SOURCE_ID', '')
+
+# Answer cache table holding the "__corpus_version__" item (bumped after each completed ingestion)
+ANSWER_CACHE_TABLE = os.environ.get('ANSWER_CACHE_TABLE', '')
+CORPUS_VERSION_KEY = '__corpus_version__'
 
 
 def lambda_handler(event, context):
     """
     Trigger Knowledge Base ingestion job to extract entities from Neptune
     
-    Input: Result from neptune-loader (optional)
+    Input: Result from neptune-loader (optional), or {"action": "check_ingestion"}
     Output: Ingestion job details
     """
-    print(f"Event: {json.dumps(event)}")
-    print(f"Triggering KB sync for KB: {KB_ID}, DS: {DS_ID}")
+    log.bind(context)
+    log.debug("Event", event=event)
+    if isinstance(event, dict) and event.get('action') == 'check_ingestion':
+        return check_ingestion()
+    log.info("Triggering KB sync", knowledge_base_id=KB_ID, data_source_id=DS_ID)
     
     try:
         response = bedrock_agent.start_ingestion_job(
@@ -33,8 +51,7 @@ def lambda_handler(event, context):
         job_id = job['ingestionJobId']
         status = job['status']
         
-        print(f"✅ Ingestion job started: {job_id}")
-        print(f"Status: {status}")
+        log.info("Ingestion job started", ingestion_job_id=job_id, status=status)
         
         return {
             'statusCode': 200,
@@ -46,12 +63,72 @@ def lambda_handler(event, context):
         }
         
     except Exception as e:
-        print(f"❌ Error starting ingestion job: {e}")
-        import traceback
-        traceback.print_exc()
+        log.error("Error starting ingestion job: %s", e, exc_info=True)
         
         return {
             'statusCode': 500,
             'error': str(e),
             'message': 'Failed to start Knowledge Base sync'
         }
+
+
+def latest_completed_ingestion() -> str:
+    """
+    When the most recent COMPLETE ingestion job of any of the KB's data sources
+    finished (ISO 8601, UTC), or None if no job has completed
+    """
+    latest = None
+    data_sources = bedrock_agent.list_data_sources(knowledgeBaseId=KB_ID, maxResults=10)
+    for data_source in data_sources.get('dataSourceSummaries', []):
+        jobs = bedrock_agent.list_ingestion_jobs(
+            knowledgeBaseId=KB_ID,
+            dataSourceId=data_source['dataSourceId'],
+            filters=[{'attribute': 'STATUS', 'operator': 'EQ', 'values': ['COMPLETE']}],
+            sortBy={'attribute': 'STARTED_AT', 'order': 'DESCENDING'},
+            maxResults=1
+        ).get('ingestionJobSummaries', [])
+        if jobs:
+            completed_at = jobs[0]['updatedAt'].astimezone(timezone.utc).isoformat()
+            latest = max(latest or completed_at, completed_at)
+    return latest
+
+
+def bump_corpus_version(completed_at: str):
+    """
+    Bump the corpus version once per completed ingestion
+    The completion time is stored on the version item and the update is conditional
+    on it being newer, so repeated checks of the same ingestion are no-ops.
+    Returns the new version, or None if this ingestion was already counted.
+    """
+    table = boto3.resource('dynamodb').Table(ANSWER_CACHE_TABLE)
+    try:
+        response = table.update_item(
+            Key={'cache_key': CORPUS_VERSION_KEY},
+            UpdateExpression='SET ingested_at = :completed ADD version :one',
+            ConditionExpression='attribute_not_exists(ingested_at) OR ingested_at < :completed',
+            ExpressionAttributeValues={':completed': completed_at, ':one': 1},
+            ReturnValues='UPDATED_NEW'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return None
+        raise
+    return int(response['Attributes']['version'])
+
+
+def check_ingestion():
+    """
+    Bump the corpus version if an ingestion completed since the last check
+    """
+    if not ANSWER_CACHE_TABLE:
+        return {'statusCode': 200, 'message': 'ANSWER_CACHE_TABLE not set, nothing to invalidate'}
+    
+    try:
+        completed_at = latest_completed_ingestion()
+        version = bump_corpus_version(completed_at) if completed_at else None
+        if version is not None:
+            log.info("Corpus version bumped (chat caches invalidated)", version=version, ingested_at=completed_at)
+        return {'statusCode': 200, 'ingested_at': completed_at, 'corpus_version_bumped': version is not None}
+    except Exception as e:
+        log.error("Error checking ingestion jobs: %s", e, exc_info=True)
+        return {'statusCode': 500, 'error': str(e), 'message': 'Failed to check ingestion jobs'}
@@ -1,22 +1,114 @@
 """
 Knowledge Base Custom Transformation Lambda
-Transforms bill documents and adds metadata to each chunk for precise filtering
+Transforms bill and newspaper documents and adds metadata to each chunk for precise filtering
 
 This Lambda runs DURING chunking and adds structured metadata to each chunk:
-- Extracts bill metadata from S3 object metadata
+- Copies the document's unified bill/newspaper metadata from S3 object metadata
 - Attaches metadata to every chunk for exact filtering
 - Enables precise bill retrieval using metadata filters
+- Tags each chunk with person, place and year entities (see entity_extractor.py in the shared layer)
 
 Input: Document chunks from Knowledge Base
 Output: Chunks with structured metadata attached
+
+NOTE: The collector now writes Bedrock-native <key>.metadata.json sidecars next to
+every bill and newspaper, so the Knowledge Base attaches the unified metadata to
+each chunk on its own. This Lambda is optional for document-level fields; it is
+still what adds the per-chunk persons/places/years entity tags.
 """
 
 import json
-import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
 import boto3
+from botocore.config import Config
+
+from entity_extractor import extract_entities
+from structured_log import get_logger
+
+logger = get_logger('kb-transformation')
+
+# Concurrency configuration
+MAX_WORKERS = int(os.environ.get('MAX_WORKERS', '16'))
+# Stop scheduling new work when less than this much Lambda time remains
+TIME_BUFFER_MS = int(os.environ.get('TIME_BUFFER_MS', '5000'))
+
+# Warm-container cache of original-file metadata
+METADATA_CACHE_SIZE = int(os.environ.get('METADATA_CACHE_SIZE', '2048'))
+METADATA_CACHE_TTL_SECONDS = int(os.environ.get('METADATA_CACHE_TTL_SECONDS', '3600'))
+
+# Marker written into every enriched chunk; bump to force a rewrite of old chunks
+ENRICHMENT_VERSION = '3'
+
+# Unified metadata schema written by the collector (S3 object metadata and sidecars)
+DOCUMENT_METADATA_FIELDS = (
+    'entity_type', 'source', 'year',
+    'congress', 'bill_type', 'bill_number', 'bill_id', 'bill_title',
+    'introduced_date', 'latest_action_date', 'bill_url',
+    'newspaper_title', 'issue_date', 'place_of_publication', 'pdf_url', 'edition_notes',
+)
+
+# Reused across warm invocations; connection pool sized to the worker count
+s3_client = boto3.client(
+    's3',
+    config=Config(
+        max_pool_connections=MAX_WORKERS,
+        retries={'max_attempts': 3, 'mode': 'standard'}
+    )
+)
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+
+class MetadataCache:
+    """
+    Thread-safe LRU cache with a TTL, kept at module level so it survives
+    across warm invocations. Tracks hits and misses for hit-rate logging.
+    """
+    
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def put(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+metadata_cache = MetadataCache(METADATA_CACHE_SIZE, METADATA_CACHE_TTL_SECONDS)
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
 
 def lambda_handler(event, context):
     """
@@ -46,146 +138,251 @@ def lambda_handler(event, context):
             }
         ]
     }
+    
+    Metadata for all original files is prefetched concurrently, then every chunk
+    is rewritten concurrently. Work is only scheduled while the invocation has
+    more than TIME_BUFFER_MS remaining, so the Lambda always returns in budget.
+    
+    Original-file metadata is served from a warm-container LRU cache when possible,
+    and chunks that already carry the current metadata are not written again.
     """
+    input_files = event.get('inputFiles', [])
+    
+    logger.bind(context)
     try:
-        logger.info(f"Transformation event received")
-        logger.info(f"Processing {len(event.get('inputFiles', []))} input files")
+        logger.info("Transformation event received", input_files=len(input_files))
         
-        # Get S3 client to read original file metadata and chunk content
-        s3_client = boto3.client('s3')
+        start_time = time.time()
+        bucket_name = event.get('bucketName', '')
         
-        # Process each input file
-        for input_file in event.get('inputFiles', []):
-            # Get original file location to extract S3 metadata
+        # Step 1: Prefetch original file metadata for all input files concurrently
+        original_uris = []
+        for input_file in input_files:
             original_location = input_file.get('originalFileLocation', {})
             if original_location.get('type') == 'S3':
-                original_s3_uri = original_location.get('s3_location', {}).get('uri', '')
-                logger.info(f"Original file: {original_s3_uri}")
-                
-                # Parse S3 URI to get bucket and key
-                if original_s3_uri.startswith('s3://'):
-                    parts = original_s3_uri[5:].split('/', 1)
-                    if len(parts) == 2:
-                        source_bucket, source_key = parts
-                        
-                        # Get S3 metadata from original file
-                        try:
-                            response = s3_client.head_object(Bucket=source_bucket, Key=source_key)
-                            file_metadata = response.get('Metadata', {})
-                            
-                            # Extract bill information from S3 metadata
-                            bill_id = file_metadata.get('bill_id', 'unknown')
-                            congress = file_metadata.get('congress', 'unknown')
-                            bill_type = file_metadata.get('bill_type', 'unknown')
-                            bill_number = file_metadata.get('bill_number', 'unknown')
-                            title = file_metadata.get('title', 'N/A')
-                            introduced_date = file_metadata.get('introduced_date', 'N/A')
-                            latest_action = file_metadata.get('latest_action', 'N/A')
-                            latest_action_date = file_metadata.get('latest_action_date', 'N/A')
-                            
-                            logger.info(f"Extracted metadata - Bill ID: {bill_id}, Congress: {congress}, Type: {bill_type}, Number: {bill_number}")
-                            
-                            # Process each content batch (chunk)
-                            for batch in input_file.get('contentBatches', []):
-                                chunk_key = batch.get('key', '')
-                                if chunk_key:
-                                    # Read the chunk content from transformation bucket
-                                    try:
-                                        chunk_response = s3_client.get_object(
-                                            Bucket=event.get('bucketName', ''),
-                                            Key=chunk_key
-                                        )
-                                        chunk_content = json.loads(chunk_response['Body'].read().decode('utf-8'))
-                                        
-                                        # Handle the actual JSON structure: {"fileContents": [{"contentBody": "...", "contentMetadata": {}}]}
-                                        if 'fileContents' in chunk_content:
-                                            for file_content in chunk_content['fileContents']:
-                                                if 'contentMetadata' not in file_content:
-                                                    file_content['contentMetadata'] = {}
-                                                
-                                                # Add our structured metadata to each file content
-                                                file_content['contentMetadata'].update({
-                                                    # Core identifiers for filtering
-                                                    "bill_id": bill_id,
-                                                    "congress": congress,
-                                                    "bill_type": bill_type.upper(),
-                                                    "bill_number": bill_number,
-                                                    "entity_type": "bill",
-                                                    
-                                                    # Additional metadata for enriched responses
-                                                    "title": title,
-                                                    "introduced_date": introduced_date,
-                                                    "latest_action": latest_action,
-                                                    "latest_action_date": latest_action_date,
-                                                })
-                                        else:
-                                            # Fallback: add metadata to root level if structure is different
-                                            if 'contentMetadata' not in chunk_content:
-                                                chunk_content['contentMetadata'] = {}
-                                            
-                                            chunk_content['contentMetadata'].update({
-                                                "bill_id": bill_id,
-                                                "congress": congress,
-                                                "bill_type": bill_type.upper(),
-                                                "bill_number": bill_number,
-                                                "entity_type": "bill",
-                                                "title": title,
-                                                "introduced_date": introduced_date,
-                                                "latest_action": latest_action,
-                                                "latest_action_date": latest_action_date,
-                                            })
-                                        
-                                        # Write the updated chunk back to S3
-                                        s3_client.put_object(
-                                            Bucket=event.get('bucketName', ''),
-                                            Key=chunk_key,
-                                            Body=json.dumps(chunk_content),
-                                            ContentType='application/json'
-                                        )
-                                        
-                                        logger.info(f"Updated chunk {chunk_key} with metadata")
-                                        
-                                    except Exception as e:
-                                        logger.error(f"Error processing chunk {chunk_key}: {str(e)}")
-                                        
-                        except Exception as e:
-                            logger.error(f"Error reading original file metadata: {str(e)}")
-        
-        logger.info("Transformation completed successfully")
-        
-        # Return the correct format as per AWS documentation
-        # Knowledge Base expects: {"outputFiles": [...]}
-        output_files = []
-        
-        for input_file in event.get('inputFiles', []):
-            output_file = {
-                "originalFileLocation": input_file.get("originalFileLocation", {}),
-                "fileMetadata": input_file.get("fileMetadata", {}),
-                "contentBatches": input_file.get("contentBatches", [])
-            }
-            output_files.append(output_file)
+                uri = original_location.get('s3_location', {}).get('uri', '')
+                if uri and uri not in original_uris:
+                    original_uris.append(uri)
+        
+        metadata_by_uri = {}
+        uncached_uris = []
+        for uri in original_uris:
+            cached = metadata_cache.get(uri)
+            if cached is not None:
+                metadata_by_uri[uri] = cached
+            else:
+                uncached_uris.append(uri)
+        
+        metadata_futures = {uri: executor.submit(fetch_original_metadata, uri) for uri in uncached_uris}
+        done, not_done = wait(list(metadata_futures.values()), timeout=seconds_remaining(context))
+        for uri, future in metadata_futures.items():
+            if future in done and future.result() is not None:
+                metadata_by_uri[uri] = future.result()
+                metadata_cache.put(uri, future.result())
+        for future in not_done:
+            future.cancel()
+        
+        cache_stats = metadata_cache.stats()
+        logger.info(
+            "Prefetched original file metadata",
+            prefetched=len(metadata_by_uri), original_files=len(original_uris),
+            from_cache=len(original_uris) - len(uncached_uris), cache=cache_stats
+        )
         
-        response = {
-            "outputFiles": output_files
-        }
+        # Step 2: Rewrite every chunk concurrently
+        chunk_jobs = []
+        for input_file in input_files:
+            uri = input_file.get('originalFileLocation', {}).get('s3_location', {}).get('uri', '')
+            chunk_metadata = metadata_by_uri.get(uri)
+            if chunk_metadata is None:
+                continue
+            for batch in input_file.get('contentBatches', []):
+                chunk_key = batch.get('key', '')
+                if chunk_key:
+                    chunk_jobs.append((chunk_key, chunk_metadata))
         
-        logger.info(f"Returning correct format with {len(output_files)} output files")
-        return response
+        counts = process_chunks(bucket_name, chunk_jobs, context)
+        
+        elapsed_ms = (time.time() - start_time) * 1000
+        logger.info("Transformation completed", chunks=counts, elapsed_ms=round(elapsed_ms))
         
     except Exception as e:
-        logger.error(f"Transformation error: {str(e)}", exc_info=True)
-        logger.error(f"Returning original files due to error")
-        
-        # Return error response in correct format
-        output_files = []
-        for input_file in event.get('inputFiles', []):
-            output_file = {
-                "originalFileLocation": input_file.get("originalFileLocation", {}),
-                "fileMetadata": input_file.get("fileMetadata", {}),
-                "contentBatches": input_file.get("contentBatches", [])
-            }
-            output_files.append(output_file)
+        logger.error("Transformation error, returning original files: %s", e, exc_info=True)
+    
+    # Return the correct format as per AWS documentation
+    # Knowledge Base expects: {"outputFiles": [...]}
+    output_files = build_output_files(input_files)
+    logger.info("Returning output files", output_files=len(output_files))
+    return {
+        "outputFiles": output_files
+    }
+
+
+def seconds_remaining(context) -> float:
+    """
+    Seconds left before the time buffer is reached, or None when running
+    without a Lambda context (local testing)
+    """
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return None
+    return max(0.0, (context.get_remaining_time_in_millis() - TIME_BUFFER_MS) / 1000.0)
+
+
+def parse_s3_uri(uri: str):
+    """
+    Split s3://bucket/key into (bucket, key), or (None, None) if malformed
+    """
+    if not uri.startswith('s3://'):
+        return None, None
+    parts = uri[5:].split('/', 1)
+    if len(parts) != 2:
+        return None, None
+    return parts[0], parts[1]
+
+
+def fetch_original_metadata(original_s3_uri: str) -> dict:
+    """
+    Read S3 metadata from the original document and build chunk metadata
+    Returns None if the original file cannot be read
+    """
+    source_bucket, source_key = parse_s3_uri(original_s3_uri)
+    if not source_bucket:
+        return None
+    
+    try:
+        response = s3_client.head_object(Bucket=source_bucket, Key=source_key)
+        file_metadata = response.get('Metadata', {})
+    except Exception as e:
+        logger.error("Error reading original file metadata for %s: %s", original_s3_uri, e)
+        return None
+    
+    chunk_metadata = build_chunk_metadata(file_metadata)
+    logger.debug("Extracted metadata", metadata=chunk_metadata)
+    return chunk_metadata
+
+
+def build_chunk_metadata(file_metadata: dict) -> dict:
+    """
+    Build the structured metadata attached to every chunk from S3 object metadata
+    The collector writes the unified bill/newspaper schema to the object, so its
+    fields are copied as they are; nothing is defaulted, so a newspaper never
+    picks up bill fields and the values always match the metadata sidecar.
+    """
+    return {
+        **{key: value for key, value in file_metadata.items() if key in DOCUMENT_METADATA_FIELDS},
+        
+        # Marks the chunk as enriched so retried ingestions can skip the rewrite
+        "enrichment_version": ENRICHMENT_VERSION,
+    }
+
+
+def is_enriched(content_metadata: dict, chunk_metadata: dict) -> bool:
+    """
+    Check whether a chunk already carries exactly this metadata
+    """
+    if content_metadata.get('enrichment_version') != ENRICHMENT_VERSION:
+        return False
+    return all(content_metadata.get(key) == value for key, value in chunk_metadata.items())
+
+
+def transform_chunk(bucket_name: str, chunk_key: str, chunk_metadata: dict) -> str:
+    """
+    Read a chunk from the transformation bucket, attach metadata and write it back
+    Chunks that already carry the metadata are left untouched (no put_object)
+    
+    Returns: 'updated', 'unchanged' or 'failed'
+    """
+    try:
+        chunk_response = s3_client.get_object(Bucket=bucket_name, Key=chunk_key)
+        chunk_content = json.loads(chunk_response['Body'].read().decode('utf-8'))
         
-        return {
-            "outputFiles": output_files
-        }
+        # Handle the actual JSON structure: {"fileContents": [{"contentBody": "...", "contentMetadata": {}}]}
+        if 'fileContents' in chunk_content:
+            targets = chunk_content['fileContents']
+        else:
+            # Fallback: add metadata to root level if structure is different
+            targets = [chunk_content]
+        
+        # Per-chunk metadata: document fields plus filterable persons/places/years
+        target_metadata = [
+            {**chunk_metadata, **extract_entities(target.get('contentBody', ''))}
+            for target in targets
+        ]
+        
+        if all(
+            is_enriched(target.get('contentMetadata', {}), metadata)
+            for target, metadata in zip(targets, target_metadata)
+        ):
+            return 'unchanged'
+        
+        for target, metadata in zip(targets, target_metadata):
+            target.setdefault('contentMetadata', {}).update(metadata)
+        
+        # Write the updated chunk back to S3
+        s3_client.put_object(
+            Bucket=bucket_name,
+            Key=chunk_key,
+            Body=json.dumps(chunk_content),
+            ContentType='application/json'
+        )
+        return 'updated'
+        
+    except Exception as e:
+        logger.error("Error processing chunk %s: %s", chunk_key, e)
+        return 'failed'
+
+
+def process_chunks(bucket_name: str, chunk_jobs: list, context) -> dict:
+    """
+    Rewrite chunks on the shared executor, keeping at most MAX_WORKERS in flight
+    New chunks are only scheduled while there is time left in the invocation
+    
+    Returns: counts of updated, unchanged, failed and skipped chunks
+    """
+    counts = {'updated': 0, 'unchanged': 0, 'failed': 0, 'skipped': 0}
+    pending = set()
+    jobs = iter(chunk_jobs)
+    submitted = 0
+    
+    while True:
+        # Keep the pool full while there is budget left
+        remaining = seconds_remaining(context)
+        while len(pending) < MAX_WORKERS and (remaining is None or remaining > 0):
+            job = next(jobs, None)
+            if job is None:
+                break
+            chunk_key, chunk_metadata = job
+            pending.add(executor.submit(transform_chunk, bucket_name, chunk_key, chunk_metadata))
+            submitted += 1
+        
+        if not pending:
+            break
+        
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            counts[future.result()] += 1
+        
+        if not done and remaining is not None:
+            # Out of time with writes still in flight; they finish in the background
+            logger.warning("Time budget reached with %d chunk writes in flight", len(pending))
+            break
+    
+    counts['skipped'] = len(chunk_jobs) - submitted
+    if counts['skipped']:
+        logger.warning("Skipped %d chunks to stay within the Lambda time budget", counts['skipped'])
+    return counts
+
+
+def build_output_files(input_files: list) -> list:
+    """
+    Build the outputFiles list returned to the Knowledge Base
+    Chunks are rewritten in place, so the content batches are returned unchanged
+    """
+    output_files = []
+    for input_file in input_files:
+        output_files.append({
+            "originalFileLocation": input_file.get("originalFileLocation", {}),
+            "fileMetadata": input_file.get("fileMetadata", {}),
+            "contentBatches": input_file.get("contentBatches", [])
+        })
+    return output_files
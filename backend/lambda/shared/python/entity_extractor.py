@@ -0,0 +1,372 @@
+"""
+Ingest-time Entity Extraction
+Tags chunks with person, place and year entities using a precompiled gazetteer
+
+The gazetteer is compiled once per container into an Aho-Corasick automaton, so
+every chunk is scanned in a single linear pass regardless of how many names are
+in the gazetteer. Matches must fall on word boundaries and start with a capital
+letter in the original text, which keeps common words ("providence", "concord")
+from being tagged as places.
+
+Output is plain string lists, usable as filterable Knowledge Base metadata:
+    {"persons": ["George Washington"], "places": ["Philadelphia"], "years": ["1793"]}
+"""
+
+import re
+from collections import Counter
+
+# Maximum entities of each type attached to a chunk (most frequent first)
+MAX_ENTITIES_PER_TYPE = 10
+
+# ========================================
+# Gazetteer: canonical name -> aliases
+# ========================================
+PERSONS = {
+    "George Washington": ["george washington", "president washington", "general washington", "gen washington"],
+    "John Adams": ["john adams", "president adams"],
+    "Thomas Jefferson": ["thomas jefferson", "president jefferson", "mr jefferson"],
+    "James Madison": ["james madison", "president madison", "mr madison"],
+    "James Monroe": ["james monroe", "president monroe", "mr monroe"],
+    "John Quincy Adams": ["john quincy adams", "j q adams"],
+    "Alexander Hamilton": ["alexander hamilton", "col hamilton", "colonel hamilton", "mr hamilton"],
+    "Benjamin Franklin": ["benjamin franklin", "dr franklin", "doctor franklin"],
+    "John Jay": ["john jay", "mr jay", "chief justice jay"],
+    "Aaron Burr": ["aaron burr", "col burr", "colonel burr"],
+    "John Marshall": ["john marshall", "chief justice marshall"],
+    "Samuel Adams": ["samuel adams"],
+    "John Hancock": ["john hancock", "governor hancock"],
+    "Patrick Henry": ["patrick henry"],
+    "Albert Gallatin": ["albert gallatin", "mr gallatin"],
+    "Timothy Pickering": ["timothy pickering", "col pickering", "colonel pickering"],
+    "Elbridge Gerry": ["elbridge gerry", "mr gerry"],
+    "Rufus King": ["rufus king"],
+    "Gouverneur Morris": ["gouverneur morris"],
+    "Robert Morris": ["robert morris"],
+    "Henry Knox": ["henry knox", "general knox", "gen knox"],
+    "Edmund Randolph": ["edmund randolph"],
+    "John Randolph": ["john randolph"],
+    "Charles Cotesworth Pinckney": ["charles cotesworth pinckney", "c c pinckney", "general pinckney"],
+    "Thomas Pinckney": ["thomas pinckney"],
+    "George Clinton": ["george clinton", "governor clinton"],
+    "DeWitt Clinton": ["dewitt clinton", "de witt clinton"],
+    "Henry Clay": ["henry clay", "mr clay"],
+    "John C. Calhoun": ["john c calhoun", "mr calhoun"],
+    "Daniel Webster": ["daniel webster"],
+    "Andrew Jackson": ["andrew jackson", "general jackson", "gen jackson"],
+    "James Wilson": ["james wilson"],
+    "Roger Sherman": ["roger sherman"],
+    "John Dickinson": ["john dickinson"],
+    "Fisher Ames": ["fisher ames"],
+    "Oliver Ellsworth": ["oliver ellsworth"],
+    "Richard Henry Lee": ["richard henry lee"],
+    "Henry Lee": ["henry lee", "light horse harry lee"],
+    "Thomas Paine": ["thomas paine", "tom paine"],
+    "Benjamin Rush": ["benjamin rush", "dr rush"],
+    "Noah Webster": ["noah webster"],
+    "Meriwether Lewis": ["meriwether lewis", "captain lewis", "capt lewis"],
+    "William Clark": ["william clark", "captain clark", "capt clark"],
+    "Zebulon Pike": ["zebulon pike", "zebulon m pike"],
+    "William Henry Harrison": ["william henry harrison", "general harrison", "gov harrison", "governor harrison"],
+    "Anthony Wayne": ["anthony wayne", "general wayne", "gen wayne"],
+    "Arthur St. Clair": ["arthur st clair", "general st clair", "gen st clair", "governor st clair"],
+    "Nathanael Greene": ["nathanael greene", "nathaniel greene", "general greene"],
+    "Horatio Gates": ["horatio gates", "general gates"],
+    "Benedict Arnold": ["benedict arnold"],
+    "Paul Revere": ["paul revere"],
+    "John Paul Jones": ["john paul jones", "paul jones"],
+    "Stephen Decatur": ["stephen decatur", "commodore decatur", "captain decatur"],
+    "Oliver Hazard Perry": ["oliver hazard perry", "commodore perry"],
+    "Isaac Hull": ["isaac hull", "captain hull", "commodore hull"],
+    "William Hull": ["william hull", "general hull", "gen hull"],
+    "James Wilkinson": ["james wilkinson", "general wilkinson", "gen wilkinson"],
+    "Edmond-Charles Genet": ["citizen genet", "edmond genet", "edmund genet", "mr genet"],
+    "William Blount": ["william blount"],
+    "Matthew Lyon": ["matthew lyon"],
+    "Tecumseh": ["tecumseh"],
+    "Napoleon Bonaparte": ["napoleon bonaparte", "bonaparte", "buonaparte", "napoleon"],
+    "Marquis de Lafayette": ["lafayette", "la fayette", "marquis de lafayette", "marquis de la fayette"],
+    "Toussaint Louverture": ["toussaint louverture", "toussaint l ouverture", "toussaint"],
+    "King George III": ["king george", "george the third", "george iii"],
+    "William Pitt": ["william pitt", "mr pitt"],
+    "Lord Nelson": ["lord nelson", "admiral nelson"],
+}
+
+PLACES = {
+    # Original states
+    "New Hampshire": ["new hampshire", "new-hampshire"],
+    "Massachusetts": ["massachusetts", "massachusetts bay"],
+    "Rhode Island": ["rhode island", "rhode-island"],
+    "Connecticut": ["connecticut"],
+    "New York": ["new york", "new-york"],
+    "New Jersey": ["new jersey", "new-jersey"],
+    "Pennsylvania": ["pennsylvania"],
+    "Delaware": ["delaware"],
+    "Maryland": ["maryland"],
+    "Virginia": ["virginia"],
+    "North Carolina": ["north carolina", "north-carolina"],
+    "South Carolina": ["south carolina", "south-carolina"],
+    "Georgia": ["georgia"],
+    # States admitted through 1821
+    "Vermont": ["vermont"],
+    "Kentucky": ["kentucky"],
+    "Tennessee": ["tennessee"],
+    "Ohio": ["ohio", "state of ohio"],
+    "Louisiana": ["louisiana"],
+    "Indiana": ["indiana", "indiana territory"],
+    "Mississippi": ["mississippi territory", "state of mississippi"],
+    "Illinois": ["illinois", "illinois territory"],
+    "Alabama": ["alabama", "alabama territory"],
+    "Maine": ["maine", "district of maine"],
+    "Missouri": ["missouri territory", "state of missouri"],
+    # Territories
+    "Northwest Territory": ["northwest territory", "north western territory", "territory northwest of the river ohio"],
+    "Southwest Territory": ["southwest territory", "territory south of the river ohio"],
+    "Michigan Territory": ["michigan", "michigan territory"],
+    "Orleans Territory": ["territory of orleans", "orleans territory"],
+    # Cities and towns
+    "Washington, D.C.": ["city of washington", "washington city", "district of columbia"],
+    "Philadelphia": ["philadelphia"],
+    "Boston": ["boston"],
+    "Baltimore": ["baltimore"],
+    "Charleston": ["charleston", "charlestown"],
+    "Richmond": ["richmond"],
+    "Georgetown": ["georgetown", "george town"],
+    "Alexandria": ["alexandria"],
+    "Annapolis": ["annapolis"],
+    "Albany": ["albany"],
+    "Hartford": ["hartford"],
+    "New Haven": ["new haven", "new-haven"],
+    "Providence": ["providence"],
+    "Newport": ["newport"],
+    "Portsmouth": ["portsmouth"],
+    "Salem": ["salem"],
+    "Newburyport": ["newburyport", "newbury port"],
+    "Savannah": ["savannah"],
+    "Norfolk": ["norfolk"],
+    "Wilmington": ["wilmington"],
+    "Trenton": ["trenton"],
+    "Lancaster": ["lancaster"],
+    "Pittsburgh": ["pittsburgh", "pittsburg"],
+    "New Orleans": ["new orleans", "new-orleans"],
+    "Natchez": ["natchez"],
+    "Lexington": ["lexington"],
+    "Louisville": ["louisville"],
+    "Cincinnati": ["cincinnati"],
+    "Detroit": ["detroit"],
+    "St. Louis": ["st louis", "saint louis"],
+    "Worcester": ["worcester"],
+    "Concord": ["concord"],
+    "Portland": ["portland"],
+    "Burlington": ["burlington"],
+    "Knoxville": ["knoxville"],
+    "Nashville": ["nashville"],
+    "Frankfort": ["frankfort"],
+    "Augusta": ["augusta"],
+    "Petersburg": ["petersburg"],
+    "Fredericksburg": ["fredericksburg"],
+    "Williamsburg": ["williamsburg"],
+    "Harrisburg": ["harrisburg"],
+    "New London": ["new london", "new-london"],
+    # Foreign places frequently in the news
+    "Great Britain": ["great britain", "great-britain", "england"],
+    "London": ["london"],
+    "France": ["france", "french republic"],
+    "Paris": ["paris"],
+    "Spain": ["spain"],
+    "Canada": ["canada", "upper canada", "lower canada"],
+    "Quebec": ["quebec"],
+    "Halifax": ["halifax"],
+    "Havana": ["havana", "havanna"],
+    "Santo Domingo": ["st domingo", "saint domingo", "hispaniola"],
+    "Jamaica": ["jamaica"],
+    "Algiers": ["algiers"],
+    "Tripoli": ["tripoli"],
+}
+
+# Written-out years, e.g. "one thousand seven hundred and ninety-one"
+_UNITS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14,
+    "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19,
+}
+_TENS = {
+    "twenty": 20, "thirty": 30, "forty": 40, "fourty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+}
+
+YEAR_PATTERN = re.compile(r'\b(1[78]\d\d)\b')
+WORD_YEAR_PATTERN = re.compile(
+    r'\bone\s+thousand\s+(seven|eight)\s+hundred(?:\s+and)?\s+([a-z]+)(?:[\s-]+([a-z]+))?',
+    re.IGNORECASE
+)
+# Words that turn a written-out number into an amount rather than a year
+AMOUNT_WORDS = {'dollars', 'dollar', 'cents', 'pounds', 'shillings', 'acres', 'men', 'tons', 'miles', 'barrels', 'gallons'}
+NEXT_WORD_PATTERN = re.compile(r'[\s,]*([a-z]+)', re.IGNORECASE)
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher over normalized text (lowercase alphanumerics and
+    single spaces). Built once; each search is linear in the text length.
+    """
+
+    def __init__(self, patterns: dict):
+        """
+        patterns: normalized pattern -> (entity_type, canonical name)
+        """
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for pattern, value in patterns.items():
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = next_state
+            self.output[state].append((len(pattern), value))
+
+        # Breadth-first construction of failure links
+        queue = list(self.goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def search(self, text: str):
+        """
+        Yield (start, end, value) for every pattern occurrence in normalized text
+        """
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, value in output[state]:
+                yield index - length + 1, index + 1, value
+
+
+def _normalize_alias(alias: str) -> str:
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', alias.lower()).split())
+
+
+def _compile_gazetteer() -> AhoCorasick:
+    patterns = {}
+    for entity_type, gazetteer in (('persons', PERSONS), ('places', PLACES)):
+        for canonical, aliases in gazetteer.items():
+            for alias in aliases:
+                patterns[_normalize_alias(alias)] = (entity_type, canonical)
+    return AhoCorasick(patterns)
+
+
+# Compiled once per container
+MATCHER = _compile_gazetteer()
+
+
+def _normalize_text(text: str):
+    """
+    Lowercase, map non-alphanumerics to single spaces, and keep the original
+    index of every normalized character (for boundary and capitalization checks)
+    """
+    chars = []
+    positions = []
+    last_space = True
+    for index, char in enumerate(text):
+        if char.isalnum():
+            chars.append(char.lower())
+            positions.append(index)
+            last_space = False
+        elif not last_space:
+            chars.append(' ')
+            positions.append(index)
+            last_space = True
+    return ''.join(chars), positions
+
+
+def _word_year(match, text: str) -> str:
+    """
+    Convert a written-out year match to digits, e.g. "one thousand seven hundred and ninety-one" -> "1791"
+    Returns None for amounts ("one thousand seven hundred and fifty dollars")
+    """
+    base = 1700 if match.group(1).lower() == 'seven' else 1800
+    first = match.group(2).lower()
+    second = (match.group(3) or '').lower()
+    end = match.end()
+
+    if first in _TENS:
+        if _UNITS.get(second, 10) < 10:
+            year = base + _TENS[first] + _UNITS[second]
+        else:
+            year = base + _TENS[first]
+            end = match.end(2)
+    elif first in _UNITS:
+        year = base + _UNITS[first]
+        end = match.end(2)
+    else:
+        return None
+
+    next_word = NEXT_WORD_PATTERN.match(text, end)
+    if next_word and next_word.group(1).lower() in AMOUNT_WORDS:
+        return None
+    return str(year)
+
+
+def extract_entities(text: str) -> dict:
+    """
+    Extract person, place and year entities from a chunk of text
+
+    Returns: {"persons": [...], "places": [...], "years": [...]}, most frequent first
+    """
+    counts = {'persons': Counter(), 'places': Counter(), 'years': Counter()}
+    if not text:
+        return {key: [] for key in counts}
+
+    normalized, positions = _normalize_text(text)
+    length = len(normalized)
+
+    # Keep only the longest match at each start ("john quincy adams" over "john adams")
+    best = {}
+    for start, end, value in MATCHER.search(normalized):
+        if start > 0 and normalized[start - 1] != ' ':
+            continue
+        if end < length and normalized[end] != ' ':
+            continue
+        if not text[positions[start]].isupper():
+            continue
+        if start not in best or end > best[start][0]:
+            best[start] = (end, value)
+
+    covered_until = -1
+    for start in sorted(best):
+        end, (entity_type, canonical) = best[start]
+        if start < covered_until:
+            continue
+        counts[entity_type][canonical] += 1
+        covered_until = end
+
+    for match in YEAR_PATTERN.finditer(text):
+        counts['years'][match.group(1)] += 1
+    for match in WORD_YEAR_PATTERN.finditer(text):
+        year = _word_year(match, text)
+        if year:
+            counts['years'][year] += 1
+
+    return {
+        entity_type: [name for name, _ in counter.most_common(MAX_ENTITIES_PER_TYPE)]
+        for entity_type, counter in counts.items()
+    }
@@ -0,0 +1,121 @@
+"""
+Structured Logging for the Lambda Functions
+Shipped to every function in the shared Lambda layer (lambda/shared, mounted
+at /opt/python). Each log call prints one JSON line:
+
+    {"level": "INFO", "service": "chat-handler", "request_id": "...", "message": "...", ...fields}
+
+- Levels: LOG_LEVEL (DEBUG, INFO, WARNING, ERROR); calls below it return
+  before formatting anything, so message %-arguments and fields are never
+  rendered and callable field values are never called
+- Request-ID correlation: bind(context) at the start of each invocation
+- Sampling: LOG_DEBUG_SAMPLE_RATE of invocations log at DEBUG regardless of
+  LOG_LEVEL, so full payload dumps stay available without paying for them
+  on every request
+- Truncation: long strings and lists in fields are cut to LOG_MAX_STRING_CHARS
+  and LOG_MAX_LIST_ITEMS
+"""
+
+import json
+import os
+import random
+import sys
+import traceback
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '0'))
+LOG_MAX_STRING_CHARS = int(os.environ.get('LOG_MAX_STRING_CHARS', '1000'))
+LOG_MAX_LIST_ITEMS = int(os.environ.get('LOG_MAX_LIST_ITEMS', '10'))
+MAX_DEPTH = 8
+
+
+def truncate(value, depth: int = 0):
+    """
+    Copy of a payload with long strings and lists cut down, ready for json.dumps
+    """
+    if isinstance(value, str):
+        if len(value) > LOG_MAX_STRING_CHARS:
+            return f"{value[:LOG_MAX_STRING_CHARS]}...[+{len(value) - LOG_MAX_STRING_CHARS} chars]"
+        return value
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if depth >= MAX_DEPTH:
+        return truncate(repr(value), depth)
+    if isinstance(value, dict):
+        return {str(key): truncate(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value)
+        truncated = [truncate(item, depth + 1) for item in items[:LOG_MAX_LIST_ITEMS]]
+        if len(items) > LOG_MAX_LIST_ITEMS:
+            truncated.append(f"...[+{len(items) - LOG_MAX_LIST_ITEMS} items]")
+        return truncated
+    return truncate(str(value), depth)
+
+
+class StructuredLogger:
+    """
+    JSON-lines logger with levels, request IDs, debug sampling and lazy formatting
+    """
+
+    def __init__(self, service: str, level: str = LOG_LEVEL, debug_sample_rate: float = LOG_DEBUG_SAMPLE_RATE):
+        self.service = service
+        self.base_level = LEVELS.get(level, LEVELS['INFO'])
+        self.debug_sample_rate = debug_sample_rate
+        self.level = self.base_level
+        self.request_id = None
+
+    def bind(self, context=None, request_id: str = None):
+        """
+        Start an invocation: set the request ID and decide whether it is sampled for DEBUG
+        """
+        self.request_id = request_id or getattr(context, 'aws_request_id', None)
+        sampled = self.debug_sample_rate > 0 and random.random() < self.debug_sample_rate
+        self.level = LEVELS['DEBUG'] if sampled else self.base_level
+
+    def is_enabled(self, level: str) -> bool:
+        return LEVELS[level] >= self.level
+
+    def debug(self, message: str, *args, **fields):
+        if LEVELS['DEBUG'] >= self.level:
+            self._log('DEBUG', message, args, fields)
+
+    def info(self, message: str, *args, **fields):
+        if LEVELS['INFO'] >= self.level:
+            self._log('INFO', message, args, fields)
+
+    def warning(self, message: str, *args, **fields):
+        if LEVELS['WARNING'] >= self.level:
+            self._log('WARNING', message, args, fields)
+
+    def error(self, message: str, *args, exc_info: bool = False, **fields):
+        if LEVELS['ERROR'] >= self.level:
+            self._log('ERROR', message, args, fields, traceback.format_exc() if exc_info else None)
+
+    def _log(self, level: str, message: str, args: tuple, fields: dict, exception: str = None):
+        if args:
+            try:
+                message = message % args
+            except (TypeError, ValueError):
+                message = f"{message} {args}"
+        record = {'level': level, 'service': self.service, 'request_id': self.request_id, 'message': message}
+        for name, value in fields.items():
+            record[name] = truncate(value() if callable(value) else value)
+        if exception:
+            # Tracebacks are kept whole
+            record['exception'] = exception
+        # One write per record so lines from concurrent threads never interleave
+        sys.stdout.write(json.dumps(record, default=str, ensure_ascii=False) + '\n')
+
+
+_loggers = {}
+
+
+def get_logger(service: str) -> StructuredLogger:
+    """
+    The container's logger for a service (one per Lambda function)
+    """
+    if service not in _loggers:
+        _loggers[service] = StructuredLogger(service)
+    return _loggers[service]
@@ -8,6 +8,9 @@ import * as logs from "aws-cdk-lib/aws-logs";
 import * as ecs from "aws-cdk-lib/aws-ecs";
 import * as ecr from "aws-cdk-lib/aws-ecr";
 import * as ec2 from "aws-cdk-lib/aws-ec2";
+import * as dynamodb from "aws-cdk-lib/aws-dynamodb";
+import * as events from "aws-cdk-lib/aws-events";
+import * as targets from "aws-cdk-lib/aws-events-targets";
 import * as bedrock from "aws-cdk-lib/aws-bedrock";
 import * as codebuild from "aws-cdk-lib/aws-codebuild";
 import * as amplify from "aws-cdk-lib/aws-amplify";
@@ -144,6 +147,29 @@ export class ChroniclingAmericaStack extends cdk.Stack {
         },
       })
     );
+
+    // ========================================
+    // DynamoDB Table for Chat Answer Cache
+    // ========================================
+    // Items are keyed by a hash of (question, persona, language, filter, corpus version).
+    // The "__corpus_version__" item is bumped after each completed KB ingestion.
+    const answerCacheTable = new dynamodb.Table(this, "AnswerCacheTable", {
+      tableName: `${projectName}-answer-cache`,
+      partitionKey: { name: "cache_key", type: dynamodb.AttributeType.STRING },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      timeToLiveAttribute: "expires_at",
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
+    // DynamoDB Table for streaming chat output (polled by the frontend)
+    const chatStreamTable = new dynamodb.Table(this, "ChatStreamTable", {
+      tableName: `${projectName}-chat-streams`,
+      partitionKey: { name: "stream_id", type: dynamodb.AttributeType.STRING },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      timeToLiveAttribute: "expires_at",
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
     const vpc = new ec2.Vpc(this, "VPC", {
       maxAzs: 2,
       natGateways: 0, // Use public subnets only for cost savings
@@ -291,6 +317,13 @@ export class ChroniclingAmericaStack extends cdk.Stack {
         // Use Bedrock Data Automation instead of Textract
         USE_BEDROCK_PARSING: "true",
         BILLS_PREFIX: "bills/", // Store raw bills here instead of extracted/
+        // Write <key>.metadata.json sidecars so KB ingestion gets metadata without the transformation Lambda
+        WRITE_METADATA_SIDECARS: "true",
+        // Compact S3 key -> public URL/title/date/type index the chat handler cites sources from
+        DOCUMENT_INDEX_KEY: "indexes/document_metadata.json.gz",
+        // BM25 positional inverted index over every document, rebuilt when new documents were collected
+        KEYWORD_INDEX_KEY: "indexes/keyword_index.bin",
+        KEYWORD_INDEX_SEGMENT_MB: "256", // Postings buffered in memory before a sorted run is spilled to disk
       },
     });
 
@@ -478,6 +511,7 @@ Focus on delivering precise historical information with proper citations from th
           "bedrock:StartIngestionJob",
           "bedrock:GetIngestionJob",
           "bedrock:ListIngestionJobs",
+          "bedrock:ListDataSources", // Ingestion check looks at every data source
         ],
         resources: ["*"],
       })
@@ -491,6 +525,7 @@ Focus on delivering precise historical information with proper citations from th
           "bedrock:InvokeModel",
           "bedrock:Retrieve",
           "bedrock:RetrieveAndGenerate",
+          "bedrock:InvokeModelWithResponseStream", // For streaming chat responses
           "bedrock:GetInferenceProfile",
           "bedrock:ListInferenceProfiles",
           "bedrock:Rerank",  // For reranker model
@@ -514,10 +549,40 @@ Focus on delivering precise historical information with proper citations from th
     // Grant transformation lambda access to transformation bucket
     transformationBucket.grantReadWrite(lambdaRole);
 
+    // Grant chat handler access to the answer cache
+    answerCacheTable.grantReadWriteData(lambdaRole);
+
+    // Grant chat handler access to the streaming output table
+    chatStreamTable.grantReadWriteData(lambdaRole);
+
+    // Grant chat handler permission to invoke itself asynchronously (streaming worker)
+    // and the batch worker (which also invokes itself to continue long batches)
+    lambdaRole.addToPolicy(
+      new iam.PolicyStatement({
+        effect: iam.Effect.ALLOW,
+        actions: ["lambda:InvokeFunction"],
+        resources: [
+          `arn:aws:lambda:${this.region}:${this.account}:function:${projectName}-chat-handler`,
+          `arn:aws:lambda:${this.region}:${this.account}:function:${projectName}-chat-batch-worker`,
+        ],
+      })
+    );
+
+    // Grant chat handler and batch worker write access to batch jobs
+    dataBucket.grantPut(lambdaRole, "batches/*");
+
     // ========================================
     // Lambda Functions (Only 3 needed!)
     // ========================================
 
+    // Shared Python modules (structured logging) for every function, mounted at /opt/python
+    const sharedPythonLayer = new lambda.LayerVersion(this, "SharedPythonLayer", {
+      layerVersionName: `${projectName}-shared-python`,
+      code: lambda.Code.fromAsset(path.join(__dirname, "../lambda/shared")),
+      compatibleRuntimes: [lambda.Runtime.PYTHON_3_11],
+      description: "Shared Python modules for the Lambda functions",
+    });
+
     // 1. Fargate Trigger Lambda
     const fargateTriggerLogGroup = new logs.LogGroup(
       this,
@@ -550,6 +615,7 @@ Focus on delivering precise historical information with proper citations from th
         code: lambda.Code.fromAsset(
           path.join(__dirname, "../lambda/fargate-trigger")
         ),
+        layers: [sharedPythonLayer],
         timeout: cdk.Duration.seconds(30),
         memorySize: 256,
         role: lambdaRole,
@@ -593,17 +659,32 @@ Focus on delivering precise historical information with proper citations from th
         code: lambda.Code.fromAsset(
           path.join(__dirname, "../lambda/kb-sync-trigger")
         ),
+        layers: [sharedPythonLayer],
         timeout: cdk.Duration.minutes(2),
         memorySize: 256,
         role: lambdaRole,
         environment: {
           KNOWLEDGE_BASE_ID: knowledgeBaseId,
           // DATA_SOURCE_ID will be queried at runtime from Knowledge Base
+          // Corpus version is bumped here after every completed ingestion, whoever started it
+          ANSWER_CACHE_TABLE: answerCacheTable.tableName,
         },
         logGroup: kbSyncTriggerLogGroup,
       }
     );
 
+    // Check for completed ingestion jobs every 5 minutes; a newly completed one
+    // invalidates the chat caches and makes chat handlers reload their indexes
+    new events.Rule(this, "IngestionCompletionCheckRule", {
+      ruleName: `${projectName}-ingestion-completion-check`,
+      schedule: events.Schedule.rate(cdk.Duration.minutes(5)),
+      targets: [
+        new targets.LambdaFunction(kbSyncTriggerFunction, {
+          event: events.RuleTargetInput.fromObject({ action: "check_ingestion" }),
+        }),
+      ],
+    });
+
     // Note: S3 event notification removed to avoid triggering KB sync for each file
     // KB sync should be triggered manually after all files are collected
     // Or triggered by the Fargate task when collection is complete
@@ -636,9 +717,16 @@ Focus on delivering precise historical information with proper citations from th
         code: lambda.Code.fromAsset(
           path.join(__dirname, "../lambda/kb-transformation")
         ),
+        layers: [sharedPythonLayer],
         timeout: cdk.Duration.seconds(60),
         memorySize: 512,
         role: lambdaRole,
+        environment: {
+          MAX_WORKERS: "16", // Concurrent S3 chunk rewrites (also sizes the connection pool)
+          TIME_BUFFER_MS: "5000", // Stop scheduling work with this much time left
+          METADATA_CACHE_SIZE: "2048", // Original-file metadata kept across warm invocations
+          METADATA_CACHE_TTL_SECONDS: "3600",
+        },
         logGroup: kbTransformationLogGroup,
       }
     );
@@ -662,6 +750,46 @@ Focus on delivering precise historical information with proper citations from th
       removalPolicy: cdk.RemovalPolicy.DESTROY,
     });
 
+    // Shared by the chat handler and the batch worker (same code)
+    const chatEnvironment: { [key: string]: string } = {
+      KNOWLEDGE_BASE_ID: knowledgeBaseId, // Will be updated by CLI
+      MODEL_ID: bedrockModelId,
+      DATA_BUCKET_NAME: dataBucket.bucketName, // For direct S3 access
+      DIRECT_FETCH_ENABLED: "true", // Exact bill lookups read the bill object instead of vector search
+      DIRECT_FETCH_MAX_TOKENS: "12000",
+      RETRIEVAL_MODE: "two_step", // retrieve + local pruning + generate; "retrieve_and_generate" for the KB-only path
+      CONTEXT_MAX_TOKENS: "6000",
+      CONTEXT_MAX_CHUNKS: "12",
+      RETRIEVAL_CACHE_MAX_ENTRIES: "256", // Per-container LRU of retrieve results
+      FEDERATED_RETRIEVAL_ENABLED: "true", // Parallel bill/newspaper searches fused with reciprocal-rank fusion
+      FEDERATED_RESULTS_PER_SEARCH: "25",
+      PROMPT_CACHE_ENABLED: "true", // Bedrock prompt caching on models that support it; neither default model does
+      ADAPTIVE_QUERY_POLICY_ENABLED: "true", // Per-query model tier, output tokens and retrieval depth
+      FAST_MODEL_ID: "anthropic.claude-3-haiku-20240307-v1:0", // Model for simple questions
+      DEADLINE_SAFETY_MS: "1500", // Budget kept back from API Gateway's 29s limit for the response
+      HEDGING_ENABLED: "true", // Race a slow answer against the fast model with a reduced context
+      HEDGE_AFTER_FRACTION: "0.5", // Share of the request budget before the hedge starts
+      THROTTLE_MAX_RETRIES: "3", // Jittered Bedrock throttling retries within the deadline
+      REQUEST_METRICS_ENABLED: "true", // Phase timings as Server-Timing header and EMF metrics
+      METRICS_NAMESPACE: "ChroniclingAmerica/Chat", // CloudWatch namespace for the EMF metrics
+      LOG_LEVEL: "INFO", // Structured log level (DEBUG dumps events and Knowledge Base responses)
+      LOG_DEBUG_SAMPLE_RATE: "0.01", // Share of requests logged at DEBUG regardless of LOG_LEVEL
+      SOURCE_PAGE_CHARS: "4000", // Page size for GET /sources/{id}
+      SOURCE_CACHE_MAX_AGE_SECONDS: "3600", // Browser cache lifetime of source pages
+      DOCUMENT_INDEX_KEY: "indexes/document_metadata.json.gz", // Collector's document-metadata index for citations
+      KEYWORD_INDEX_KEY: "indexes/keyword_index.bin", // Collector's BM25 index, memory-mapped from /tmp
+      HYBRID_KEYWORD_RESULTS: "5", // Keyword passages fused into chat retrieval (0 = vector search only)
+      SEARCH_DEFAULT_MODE: "hybrid", // POST /search mode when the request does not set one
+      ANSWER_CACHE_TABLE: answerCacheTable.tableName,
+      ANSWER_CACHE_TTL_SECONDS: "86400",
+      ADMISSION_TABLE: answerCacheTable.tableName, // Shared token bucket item for admission control
+      ADMISSION_CAPACITY: "20", // Burst of Bedrock generations admitted across all containers
+      ADMISSION_REFILL_PER_SECOND: "4", // Sustained generations per second; excess requests get 429 + Retry-After
+      SEMANTIC_CACHE_THRESHOLD: "0.92", // Cosine similarity needed to reuse a near-duplicate answer
+      STREAM_TABLE: chatStreamTable.tableName,
+      BATCH_BUCKET_NAME: dataBucket.bucketName, // batches/{jobId}/ request, status and results.jsonl
+    };
+
     const chatHandlerFunction = new lambda.Function(
       this,
       "ChatHandlerFunction",
@@ -672,24 +800,56 @@ Focus on delivering precise historical information with proper citations from th
         code: lambda.Code.fromAsset(
           path.join(__dirname, "../lambda/chat-handler")
         ),
+        layers: [sharedPythonLayer],
         timeout: cdk.Duration.seconds(30),
         memorySize: 1024,
+        ephemeralStorageSize: cdk.Size.gibibytes(4), // /tmp holds the memory-mapped keyword index
         role: lambdaRole,
         environment: {
-          KNOWLEDGE_BASE_ID: knowledgeBaseId, // Will be updated by CLI
-          MODEL_ID: bedrockModelId,
-          DATA_BUCKET_NAME: dataBucket.bucketName, // For direct S3 access
+          ...chatEnvironment,
+          BATCH_WORKER_FUNCTION: `${projectName}-chat-batch-worker`, // Answers POST /chat/batch jobs
         },
         logGroup: chatHandlerLogGroup,
       }
     );
 
+    // 5. Batch Chat Worker Lambda: the chat handler's code with a 15-minute timeout,
+    // invoked asynchronously for POST /chat/batch (and by itself to continue long batches)
+    const chatBatchWorkerLogGroup = new logs.LogGroup(this, "ChatBatchWorkerLogGroup", {
+      logGroupName: `/aws/lambda/${projectName}-chat-batch-worker`,
+      retention: logs.RetentionDays.ONE_WEEK,
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
+    new lambda.Function(this, "ChatBatchWorkerFunction", {
+      functionName: `${projectName}-chat-batch-worker`,
+      runtime: lambda.Runtime.PYTHON_3_11,
+      handler: "lambda_function.lambda_handler",
+      code: lambda.Code.fromAsset(
+        path.join(__dirname, "../lambda/chat-handler")
+      ),
+      layers: [sharedPythonLayer],
+      timeout: cdk.Duration.minutes(15),
+      memorySize: 1024,
+      ephemeralStorageSize: cdk.Size.gibibytes(4), // /tmp holds the memory-mapped keyword index
+      role: lambdaRole,
+      environment: {
+        ...chatEnvironment,
+        BATCH_CONCURRENCY: "4", // Questions answered in parallel per batch
+        BATCH_CONTINUE_MARGIN_MS: "180000", // Hand over to a new invocation with this much time left
+        BATCH_QUESTION_MAX_MS: "120000", // Longest a batch question may take; under the margin above
+      },
+      logGroup: chatBatchWorkerLogGroup,
+    });
+
     // ========================================
     // API Gateway for Chat UI
     // ========================================
     const api = new apigateway.RestApi(this, "ChatAPI", {
       restApiName: `${projectName}-chat-api`,
       description: "API for historical Congress bills chat interface",
+      // gzip responses of 1 KB or more for clients sending Accept-Encoding
+      minCompressionSize: cdk.Size.kibibytes(1),
       defaultCorsPreflightOptions: {
         allowOrigins: apigateway.Cors.ALL_ORIGINS,
         allowMethods: apigateway.Cors.ALL_METHODS,
@@ -704,6 +864,27 @@ Focus on delivering precise historical information with proper citations from th
     const chatResource = api.root.addResource("chat");
     chatResource.addMethod("POST", chatIntegration);
 
+    // Streaming chat poll endpoint: GET /chat/stream/{streamId}?cursor=N&source_cursor=M
+    const chatStreamResource = chatResource
+      .addResource("stream")
+      .addResource("{streamId}");
+    chatStreamResource.addMethod("GET", chatIntegration);
+
+    // Batch chat: POST /chat/batch starts a job, GET /chat/batch/{jobId} reports progress and results
+    const chatBatchResource = chatResource.addResource("batch");
+    chatBatchResource.addMethod("POST", chatIntegration);
+    chatBatchResource.addResource("{jobId}").addMethod("GET", chatIntegration);
+
+    // Retrieval-only search with facets and cursor pagination: POST /search
+    const searchResource = api.root.addResource("search");
+    searchResource.addMethod("POST", chatIntegration);
+
+    // Cited document text: GET /sources/{sourceId}?pages=N-M
+    const sourceResource = api.root
+      .addResource("sources")
+      .addResource("{sourceId}");
+    sourceResource.addMethod("GET", chatIntegration);
+
     // Health endpoint
     const healthResource = api.root.addResource("health");
     healthResource.addMethod("GET", chatIntegration);
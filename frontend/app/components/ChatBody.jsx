@@ -4,6 +4,7 @@ import { useState, useRef, useEffect } from "react"
 import { Send as SendIcon } from "@mui/icons-material"
 import Image from "next/image"
 import UserReply from "./UserReply"
+import { streamChatMessage } from "../config/chatService"
 
 function ChatBody({ currentLanguage }) {
   const [messages, setMessages] = useState([
@@ -103,35 +104,35 @@ function ChatBody({ currentLanguage }) {
     setIsLoading(true)
     setIsTyping(true)
 
+    // Streamed tokens update a single bot message in place
+    const botMessageId = `bot-${Date.now()}`
+    const upsertBotMessage = (content, sources) => {
+      setIsTyping(false)
+      setMessages(prev => {
+        const botMessage = { id: botMessageId, type: "bot", content, sources }
+        return prev.some(m => m.id === botMessageId)
+          ? prev.map(m => (m.id === botMessageId ? botMessage : m))
+          : [...prev, botMessage]
+      })
+    }
+
     try {
       // Replace with your actual API endpoint
       const apiUrl = process.env.NEXT_PUBLIC_API_BASE_URL || process.env.NEXT_PUBLIC_CHAT_ENDPOINT
-      const chatEndpoint = `${apiUrl}chat`
       
-      const response = await fetch(chatEndpoint, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
+      const data = await streamChatMessage({
+        apiUrl,
+        message: messageToSend,
+        persona: selectedPersona,
+        language: currentLanguage,
+        onUpdate: ({ text, sources }) => {
+          if (text) {
+            upsertBotMessage(text, sources)
+          }
         },
-        body: JSON.stringify({
-          message: messageToSend,
-          persona: selectedPersona,
-          language: currentLanguage,
-        }),
       })
-
-      if (!response.ok) {
-        throw new Error("Failed to get response")
-      }
-
-      const data = await response.json()
       
-      setIsTyping(false)
-      setMessages(prev => [...prev, { 
-        type: "bot", 
-        content: data.message || "I'm sorry, I couldn't process your request.",
-        sources: data.sources || []
-      }])
+      upsertBotMessage(data.message || "I'm sorry, I couldn't process your request.", data.sources || [])
     } catch (error) {
       setIsTyping(false)
       setMessages(prev => [...prev, { 
@@ -13,7 +13,8 @@ export const sendChatMessage = async (message, persona = 'general') => {
       }),
     })
 
-    if (!response.ok) {
+    // 429: admission control turned the request away; the body says when to retry
+    if (!response.ok && response.status !== 429) {
       throw new Error(`HTTP error! status: ${response.status}`)
     }
 
@@ -25,6 +26,91 @@ export const sendChatMessage = async (message, persona = 'general') => {
   }
 }
 
+// How often to poll a streaming chat for new tokens, and when to give up
+const STREAM_POLL_INTERVAL_MS = 250
+const STREAM_MAX_DURATION_MS = 60000
+
+/**
+ * Send a chat message in streaming mode.
+ * The backend returns the full answer for cached questions; otherwise it returns a
+ * stream_id and we poll for new tokens and citations, calling onUpdate as they arrive.
+ * Time to first token is measured on the client and reported next to the server metrics.
+ */
+export const streamChatMessage = async ({ apiUrl, message, persona = 'general', language = 'en', onUpdate }) => {
+  const startedAt = performance.now()
+  try {
+    const response = await fetch(`${apiUrl}chat`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({
+        message: message,
+        persona: persona,
+        language: language,
+        stream: true
+      }),
+    })
+
+    if (!response.ok && response.status !== 429) {
+      throw new Error(`HTTP error! status: ${response.status}`)
+    }
+
+    const data = await response.json()
+
+    // Cached answers (and busy responses from admission control) come back complete
+    if (!data.stream_id) {
+      onUpdate?.({ text: data.message, sources: data.sources || [], done: true })
+      return data
+    }
+
+    let text = ''
+    let sources = []
+    let cursor = 0
+    let sourceCursor = 0
+    let firstTokenMs = null
+
+    while (performance.now() - startedAt < STREAM_MAX_DURATION_MS) {
+      await new Promise(resolve => setTimeout(resolve, STREAM_POLL_INTERVAL_MS))
+
+      const pollResponse = await fetch(`${apiUrl}${data.poll_path}?cursor=${cursor}&source_cursor=${sourceCursor}`)
+      if (!pollResponse.ok) {
+        throw new Error(`HTTP error! status: ${pollResponse.status}`)
+      }
+
+      const page = await pollResponse.json()
+      cursor = page.cursor
+      sourceCursor = page.source_cursor
+      sources = sources.concat(page.sources || [])
+      if (page.text) {
+        text += page.text
+        if (firstTokenMs === null) {
+          firstTokenMs = performance.now() - startedAt
+        }
+      }
+
+      if (page.done) {
+        // The server may replace the streamed text (e.g. when no sources were found)
+        const finalText = page.answer ?? text
+        const metrics = {
+          ...page.metrics,
+          client_time_to_first_token_ms: firstTokenMs,
+          client_total_ms: performance.now() - startedAt,
+        }
+        onUpdate?.({ text: finalText, sources, done: true, metrics })
+        return { message: finalText, answer: finalText, sources, metrics, error: page.error }
+      }
+
+      onUpdate?.({ text, sources, done: false })
+    }
+
+    throw new Error('Streaming response timed out')
+  } catch (error) {
+    console.error('Error streaming chat message:', error)
+    throw error
+  }
+}
+
 export const checkHealth = async () => {
   try {
     const response = await fetch(`${API_BASE_URL}/health`, {